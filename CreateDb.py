@@ -1,3 +1,5 @@
+from flask_migrate import stamp
+
 from app import create_app, db
 from app.models import FoodEntry, User
 
@@ -5,4 +7,8 @@ app = create_app()
 
 with app.app_context():
     db.create_all()
+
+    # The tables already match the latest migration, record that so that
+    # later "flask db upgrade" runs only apply newer migrations
+    stamp()
     print("Database tables created")
@@ -3,21 +3,30 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 
+from app.config import load_config
+from app.database import configure_sqlite, engine_options
+
 # Initialize extensions
 db = SQLAlchemy()
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'main.login'
 
-def create_app():
-    # Create and configure the app
+def create_app(config=None):
+    # Create and configure the app from the environment
     app = Flask(__name__)
-    app.config['SECRET_KEY'] = 'your_secret_key'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///site.db'
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(load_config())
+
+    # Overrides, e.g. a separate database for benchmarks
+    if config:
+        app.config.update(config)
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
 
     # Initialize extensions with the app
     db.init_app(app)
+    with app.app_context():
+        configure_sqlite(db.engine, app.config)
     migrate.init_app(app, db)
     login_manager.init_app(app)
 
@@ -25,10 +34,33 @@ def create_app():
     from app.routes import bp  # Import the Blueprint
     app.register_blueprint(bp)
 
+    # Record request latency, SQL usage and optional profiles
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    # Long-lived, versioned static file URLs
+    from app.http_cache import init_static_caching
+    init_static_caching(app)
+
+    # Password hashing backend and its worker pool
+    from app.security import init_security
+    init_security(app)
+
+    # Background job runner, started by the first request of each process
+    from app.jobs import init_jobs
+    init_jobs(app)
+
+    # Keep the daily totals in step with the food entries
+    from app import totals  # noqa: F401
+
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+
     # Define the user loader for Flask-Login
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
+        from app.identity import load_cached_user
+        return load_cached_user(int(user_id))
 
     return app
\ No newline at end of file
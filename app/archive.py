@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, delete, insert, literal, select
+
+from app.models import FoodEntry, FoodEntryArchive, User
+
+# Entries moved per transaction, below SQLite's bound parameter limit
+ARCHIVE_BATCH_SIZE = 500
+
+# Columns copied from food_entry to food_entry_archive
+ENTRY_COLUMNS = ('user_id', 'date', 'name', 'calories', 'protein', 'fat', 'carbs')
+
+
+def archive_cutoff(days, today=None):
+    """
+    Return the oldest day kept in food_entry when entries older than days are archived.
+
+    :param days: Age in days of the oldest entries kept.
+    :param today: Date counted from; defaults to the current UTC date, which food
+        entries are logged under.
+    """
+    return (today or datetime.utcnow().date()) - timedelta(days=days)
+
+
+def archive_food_entries(session, cutoff, batch_size=ARCHIVE_BATCH_SIZE, progress=None):
+    """
+    Move food entries dated before cutoff from food_entry to food_entry_archive.
+
+    Works through one user at a time along the (user_id, date) index. Each batch is
+    copied with INSERT ... SELECT and deleted in the same transaction, so an entry is
+    always in exactly one of the tables. daily_totals is left as it is and keeps the
+    per-day sums of the archived entries for the history pages.
+
+    :param session: Database session; committed after every batch.
+    :param cutoff: Entries dated before this day are archived.
+    :param batch_size: Entries moved per transaction.
+    :param progress: Optional callable run with (users done, users, entries archived) after each user.
+    :return: Number of entries archived.
+    """
+    entries = FoodEntry.__table__
+    archive = FoodEntryArchive.__table__
+    user_ids = session.execute(select(User.id).order_by(User.id)).scalars().all()
+
+    archived = 0
+    for done, user_id in enumerate(user_ids, start=1):
+        while True:
+            ids = session.execute(
+                select(entries.c.id)
+                .where(entries.c.user_id == user_id, entries.c.date < cutoff)
+                .limit(batch_size)
+            ).scalars().all()
+            if not ids:
+                break
+
+            copied = select(*(entries.c[name] for name in ENTRY_COLUMNS), literal(datetime.utcnow(), DateTime))
+            session.execute(insert(archive).from_select(
+                [*ENTRY_COLUMNS, 'archived_at'], copied.where(entries.c.id.in_(ids)).order_by(entries.c.id)))
+            # A Core delete, so the session hook does not subtract the entries from daily_totals
+            session.execute(delete(entries).where(entries.c.id.in_(ids)))
+            session.commit()
+            archived += len(ids)
+
+        if progress is not None:
+            progress(done, len(user_ids), archived)
+    return archived
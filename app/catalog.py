@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+
+from app.cache import LRUCache
+from app.data_utils import FOOD_DATA_PATH, file_digest, load_food_table
+
+logger = logging.getLogger(__name__)
+
+
+class FoodCatalog:
+    """
+    Process-wide cache of the Fineli food data.
+
+    The data is loaded on first use, from the snapshot when it matches the workbook
+    and from the workbook itself otherwise, and the result is shared by every request
+    handled by the process. Each access compares the workbook's modification time with
+    the one seen at load time; when it differs the file is hashed and the data is
+    only reloaded if the contents actually changed.
+    """
+
+    def __init__(self, file_path=FOOD_DATA_PATH, loader=load_food_table):
+        self.file_path = file_path
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._data = None
+        self._mtime = None
+        self._digest = None
+        self._reload_callbacks = []
+
+        # Counters exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.last_load_seconds = None
+        self.total_load_seconds = 0.0
+        self.loaded_at = None
+
+    @property
+    def version(self):
+        """Short identifier of the currently loaded data, or None before the first load."""
+        return self._digest[:16] if self._digest else None
+
+    def get(self):
+        """
+        Return the cached food data, loading or reloading it if needed.
+
+        :return: FoodTable as returned by the loader.
+        """
+        mtime = os.stat(self.file_path).st_mtime_ns
+
+        with self._lock:
+            if self._data is not None and mtime == self._mtime:
+                self.hits += 1
+                return self._data
+
+            digest = file_digest(self.file_path)
+            if self._data is not None and digest == self._digest:
+                # File was touched but its contents are unchanged
+                self._mtime = mtime
+                self.hits += 1
+                return self._data
+
+            self.misses += 1
+            self._load(mtime, digest)
+            return self._data
+
+    def _load(self, mtime, digest):
+        start = time.perf_counter()
+        data = self._loader(self.file_path, digest)
+        data.build_indexes()
+        elapsed = time.perf_counter() - start
+
+        self._data = data
+        self._mtime = mtime
+        self._digest = digest
+        data.version = self.version
+        self.loads += 1
+        self.last_load_seconds = elapsed
+        self.total_load_seconds += elapsed
+        self.loaded_at = time.time()
+        self._notify_reload()
+        logger.info('Loaded food catalog from %s in %.3f s (version %s)', data.source, elapsed, self.version)
+
+    def on_reload(self, callback):
+        """
+        Register a callable to run whenever the data is replaced or dropped.
+
+        Used to clear caches of results computed from the previous data.
+        """
+        self._reload_callbacks.append(callback)
+
+    def _notify_reload(self):
+        for callback in self._reload_callbacks:
+            callback()
+
+    def invalidate(self):
+        """Drop the cached data so that the next access reloads it."""
+        with self._lock:
+            self._data = None
+            self._mtime = None
+            self._digest = None
+            self._notify_reload()
+
+    def stats(self):
+        """Return load timing and cache counters as a dictionary."""
+        with self._lock:
+            return {
+                'file_path': self.file_path,
+                'version': self.version,
+                'loaded': self._data is not None,
+                'source': self._data.source if self._data is not None else None,
+                'hits': self.hits,
+                'misses': self.misses,
+                'loads': self.loads,
+                'last_load_seconds': self.last_load_seconds,
+                'total_load_seconds': self.total_load_seconds,
+                'loaded_at': self.loaded_at,
+            }
+
+
+# Shared instance used by the request handlers
+food_catalog = FoodCatalog()
+
+# Limits of the high-protein result cache: number of queries and bytes of row numbers
+QUERY_CACHE_SIZE = 256
+QUERY_CACHE_BYTES = 16 * 1024 * 1024
+
+# Row numbers matching recent high-protein queries. Keys include the catalog
+# version, and the cache is emptied whenever the catalog is reloaded.
+query_cache = LRUCache(QUERY_CACHE_SIZE, maxbytes=QUERY_CACHE_BYTES, sizeof=lambda rows: rows.nbytes)
+food_catalog.on_reload(query_cache.clear)
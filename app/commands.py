@@ -0,0 +1,150 @@
+import time
+
+import click
+
+from app import db
+from app.data_utils import FOOD_DATA_PATH, SNAPSHOT_DIR, build_snapshot
+
+
+@click.command('build-snapshot')
+@click.option('--source', default=FOOD_DATA_PATH, show_default=True, help='Fineli workbook to convert.')
+@click.option('--output', default=SNAPSHOT_DIR, show_default=True, help='Directory to write the snapshot to.')
+@click.option('--background', is_flag=True, help='Queue a job for the server to run instead.')
+def build_snapshot_command(source, output, background):
+    """Convert the Fineli workbook into a memory-mappable columnar snapshot."""
+    if background:
+        _queue_job('rebuild_snapshot', {'source': source, 'output': output})
+        return
+
+    start = time.perf_counter()
+    table = build_snapshot(source, output)
+    click.echo(f'Wrote {len(table)} foods to {output} in {time.perf_counter() - start:.2f} s')
+
+
+@click.command('recompute-totals')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s totals.')
+@click.option('--background', is_flag=True, help='Queue a job for the server to run instead.')
+def recompute_totals_command(user_id, background):
+    """Rebuild the daily totals table from the logged food entries."""
+    from app.totals import recompute_daily_totals
+
+    if background:
+        _queue_job('recompute_totals', {'user_id': user_id})
+        return
+
+    start = time.perf_counter()
+    rows = recompute_daily_totals(db.session, user_id)
+    db.session.commit()
+    click.echo(f'Rebuilt {rows} daily totals in {time.perf_counter() - start:.2f} s')
+
+
+@click.command('archive-entries')
+@click.option('--days', type=int, default=None, help='Archive entries older than this, ARCHIVE_AFTER_DAYS by default.')
+@click.option('--background', is_flag=True, help='Queue a job for the server to run instead.')
+def archive_entries_command(days, background):
+    """Move old food entries to the archive table, keeping their daily totals."""
+    from flask import current_app
+
+    from app.archive import archive_cutoff, archive_food_entries
+
+    if background:
+        _queue_job('archive_entries', {'days': days})
+        return
+
+    cutoff = archive_cutoff(days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS'])
+    start = time.perf_counter()
+    entries = archive_food_entries(db.session, cutoff)
+    click.echo(f'Archived {entries} entries dated before {cutoff} in {time.perf_counter() - start:.2f} s')
+
+
+@click.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a hot query would scan a whole table instead of using an index."""
+    from app.query_plans import check_query_plans
+
+    with db.engine.connect() as connection:
+        if connection.dialect.name != 'sqlite':
+            click.echo(f'Query plan checks only support SQLite, not {connection.dialect.name}.')
+            return
+        results = check_query_plans(connection)
+
+    failed = False
+    for description, plan, scanned in results:
+        status = 'FULL SCAN of ' + ', '.join(scanned) if scanned else 'ok'
+        click.echo(f'{description}: {status}')
+        for step in plan:
+            click.echo(f'    {step}')
+        failed = failed or bool(scanned)
+
+    if failed:
+        raise click.ClickException('Some hot queries no longer use an index.')
+
+
+@click.command('memory-report')
+@click.argument('master_pid', type=int)
+def memory_report_command(master_pid):
+    """Show the resident and proportional memory of a server master and its workers."""
+    from app.memory import memory_report
+
+    def mb(value):
+        return f'{value / 1024 / 1024:>12.1f}' if value is not None else f'{"n/a":>12}'
+
+    click.echo(f'{"role":<8}{"pid":>8}{"RSS MB":>12}{"PSS MB":>12}{"shared MB":>12}{"private MB":>12}')
+    total_rss = total_pss = 0
+    for process in memory_report(master_pid):
+        shared = process.get('shared_clean', 0) + process.get('shared_dirty', 0) if 'pss' in process else None
+        private = process.get('private_clean', 0) + process.get('private_dirty', 0) if 'pss' in process else None
+        click.echo(f'{process["role"]:<8}{process["pid"]:>8}{mb(process.get("rss"))}{mb(process.get("pss"))}'
+                   f'{mb(shared)}{mb(private)}')
+        total_rss += process.get('rss', 0)
+        total_pss += process.get('pss', 0)
+    click.echo(f'{"total":<16}{mb(total_rss)}{mb(total_pss)}')
+
+
+def _queue_job(job_type, params):
+    from app.jobs import job_runner
+
+    job = job_runner.submit(job_type, params)
+    click.echo(f'Queued job {job.id} ({job_type}); a server or "flask run-jobs" will run it')
+
+
+@click.command('run-jobs')
+@click.option('--workers', type=int, default=None, help='Jobs to run at once, JOB_WORKERS by default.')
+def run_jobs_command(workers):
+    """Run queued background jobs until interrupted."""
+    from app.jobs import job_runner
+
+    job_runner.start(workers or job_runner.workers or 1)
+    click.echo(f'Running jobs as {job_runner.owner}, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+@click.command('list-jobs')
+@click.option('--status', default=None, help='Only list jobs in this state, e.g. queued or failed.')
+@click.option('--limit', type=int, default=20, show_default=True)
+def list_jobs_command(status, limit):
+    """Show the most recent background jobs."""
+    from app.models import Job
+
+    query = Job.query.order_by(Job.id.desc())
+    if status:
+        query = query.filter_by(status=status)
+    click.echo(f'{"id":>6}  {"type":<18}{"status":<11}{"progress":>9}  {"attempts":<9}message')
+    for job in query.limit(limit):
+        message = job.error if job.status == 'failed' else job.message
+        click.echo(f'{job.id:>6}  {job.type:<18}{job.status:<11}{job.progress:>9.0%}  '
+                   f'{job.attempts}/{job.max_attempts:<7}{message or ""}')
+
+
+def register_commands(app):
+    app.cli.add_command(build_snapshot_command)
+    app.cli.add_command(recompute_totals_command)
+    app.cli.add_command(archive_entries_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(memory_report_command)
+    app.cli.add_command(run_jobs_command)
+    app.cli.add_command(list_jobs_command)
@@ -0,0 +1,78 @@
+import os
+
+
+def _env_bool(environ, name, default):
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_int(environ, name, default):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def _env_list(environ, name, default):
+    value = environ.get(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def load_config(environ=None):
+    """
+    Read the app configuration from environment variables.
+
+    :param environ: Mapping to read from, os.environ by default.
+    :return: Dictionary of Flask config keys.
+    """
+    environ = os.environ if environ is None else environ
+    return {
+        'SECRET_KEY': environ.get('SECRET_KEY', 'your_secret_key'),
+        'SQLALCHEMY_DATABASE_URI': environ.get('DATABASE_URL', 'sqlite:///site.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Browser cache lifetime of static files, whose URLs change with the file
+        'SEND_FILE_MAX_AGE_DEFAULT': _env_int(environ, 'STATIC_MAX_AGE', 86400),
+
+        # Applied to every new SQLite connection
+        'SQLITE_JOURNAL_MODE': environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+        'SQLITE_SYNCHRONOUS': environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'SQLITE_BUSY_TIMEOUT_MS': _env_int(environ, 'SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'SQLITE_MMAP_SIZE': _env_int(environ, 'SQLITE_MMAP_SIZE', 256 * 1024 * 1024),
+        # Negative values are in KiB, as in PRAGMA cache_size
+        'SQLITE_CACHE_SIZE': _env_int(environ, 'SQLITE_CACHE_SIZE', -64000),
+
+        # Connection pool; unset values keep SQLAlchemy's defaults
+        'DB_POOL_SIZE': _env_int(environ, 'DB_POOL_SIZE', None),
+        'DB_MAX_OVERFLOW': _env_int(environ, 'DB_MAX_OVERFLOW', None),
+        'DB_POOL_TIMEOUT': _env_int(environ, 'DB_POOL_TIMEOUT', None),
+        'DB_POOL_RECYCLE': _env_int(environ, 'DB_POOL_RECYCLE', None),
+        'DB_POOL_PRE_PING': _env_bool(environ, 'DB_POOL_PRE_PING', True),
+
+        # Password hashing cost and the worker pool the hashes run on
+        'PASSWORD_HASH_METHOD': environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+        'PASSWORD_HASH_WORKERS': _env_int(environ, 'PASSWORD_HASH_WORKERS', None),
+        'PASSWORD_HASH_MAX_PENDING': _env_int(environ, 'PASSWORD_HASH_MAX_PENDING', None),
+        'PASSWORD_HASH_TIMEOUT': float(environ.get('PASSWORD_HASH_TIMEOUT', 10.0)),
+
+        # Background jobs: worker threads per process (0 leaves them to "flask run-jobs"),
+        # how often idle runners look for queued jobs, and retries with their first delay
+        'JOB_WORKERS': _env_int(environ, 'JOB_WORKERS', 1),
+        'JOB_POLL_SECONDS': float(environ.get('JOB_POLL_SECONDS', 2.0)),
+        'JOB_MAX_ATTEMPTS': _env_int(environ, 'JOB_MAX_ATTEMPTS', 3),
+        'JOB_RETRY_DELAY': float(environ.get('JOB_RETRY_DELAY', 10.0)),
+        # Food entries older than this many days are moved to the archive table
+        'ARCHIVE_AFTER_DAYS': _env_int(environ, 'ARCHIVE_AFTER_DAYS', 90),
+        # Uploads larger than this are imported by a background job
+        'IMPORT_BACKGROUND_BYTES': _env_int(environ, 'IMPORT_BACKGROUND_BYTES', 1024 * 1024),
+
+        # cProfile output for requests slower than PROFILE_MIN_SECONDS, instance/profiles by default
+        'PROFILE_REQUESTS': _env_bool(environ, 'PROFILE_REQUESTS', False),
+        'PROFILE_MIN_SECONDS': float(environ.get('PROFILE_MIN_SECONDS', 0.0)),
+        'PROFILE_DIR': environ.get('PROFILE_DIR') or None,
+        # Clients allowed to read /metrics and the maintenance job status: these addresses,
+        # or any client sending "Authorization: Bearer <OPS_TOKEN>" when a token is set
+        'OPS_ALLOWED_IPS': _env_list(environ, 'OPS_ALLOWED_IPS', ['127.0.0.1', '::1']),
+        'OPS_TOKEN': environ.get('OPS_TOKEN') or None,
+    }
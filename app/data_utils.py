@@ -1,9 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
 import pandas as pd
 
-def load_food_data():
-    # Path to the Excel file
-    file_path = 'app/data/resultset.xlsx'
+from app.nutrient_query import NutrientQueryEngine
+from app.planner import MealPlanner
+from app.search import NameSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Path to the Fineli export shipped with the app
+FOOD_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'resultset.xlsx')
+
+# Directory holding the columnar snapshot built from the export
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'snapshot')
+
+# Bumped whenever the snapshot layout changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT = 3
 
+# Fineli nutrient columns kept besides the energy, as (column name, Fineli header, unit).
+# Energy is converted from kJ to the Calories column separately.
+FINELI_NUTRIENTS = [
+    ('Protein', 'proteiini (g)', 'g'),
+    ('Fat', 'rasva (g)', 'g'),
+    ('Carbs', 'hiilihydraatti imeytyvä (g)', 'g'),
+    ('Alcohol', 'alkoholi (g)', 'g'),
+    ('OrganicAcids', 'orgaaniset hapot (g)', 'g'),
+    ('SugarAlcohols', 'sokerialkoholi (g)', 'g'),
+    ('Sugars', 'sokerit (g)', 'g'),
+    ('Fructose', 'fruktoosi (g)', 'g'),
+    ('Galactose', 'galaktoosi (g)', 'g'),
+    ('Glucose', 'glukoosi (g)', 'g'),
+    ('Lactose', 'laktoosi (g)', 'g'),
+    ('Maltose', 'maltoosi (g)', 'g'),
+    ('Sucrose', 'sakkaroosi (g)', 'g'),
+    ('Starch', 'tärkkelys (g)', 'g'),
+    ('Fiber', 'kuitu, kokonais- (g)', 'g'),
+    ('InsolubleFiber', 'kuitu veteen liukenematon (g)', 'g'),
+    ('SolublePolysaccharides', 'polysakkaridi, vesiliukoinen ei-selluloosa (g)', 'g'),
+    ('FattyAcids', 'rasvahapot yhteensä (g)', 'g'),
+    ('PolyunsaturatedFat', 'rasvahapot monityydyttymättömät (g)', 'g'),
+    ('MonounsaturatedFat', 'rasvahapot yksittäistyydyttymättömät cis (g)', 'g'),
+    ('SaturatedFat', 'rasvahapot tyydyttyneet (g)', 'g'),
+    ('TransFat', 'rasvahapot trans (g)', 'g'),
+    ('Omega3', 'rasvahapot n-3 monityydyttymättömät (g)', 'g'),
+    ('Omega6', 'rasvahapot n-6 monityydyttymättömät (g)', 'g'),
+    ('LinoleicAcid', 'rasvahappo 18:2 cis,cis n-6 (linolihappo) (mg)', 'mg'),
+    ('AlphaLinolenicAcid', 'rasvahappo 18:3 n-3 (alfalinoleenihappo) (mg)', 'mg'),
+    ('Epa', 'rasvahappo 20:5 n-3 (EPA) (mg)', 'mg'),
+    ('Dha', 'rasvahappo 22:6 n-3 (DHA) (mg)', 'mg'),
+    ('Cholesterol', 'kolesteroli (GC) (mg)', 'mg'),
+    ('Sterols', 'sterolit (mg)', 'mg'),
+    ('Calcium', 'kalsium (mg)', 'mg'),
+    ('Iron', 'rauta (mg)', 'mg'),
+    ('Iodine', 'jodidi (jodi) (µg)', 'µg'),
+    ('Potassium', 'kalium (mg)', 'mg'),
+    ('Magnesium', 'magnesium (mg)', 'mg'),
+    ('Sodium', 'natrium (mg)', 'mg'),
+    ('Salt', 'suola (mg)', 'mg'),
+    ('Phosphorus', 'fosfori (mg)', 'mg'),
+    ('Selenium', 'seleeni (µg)', 'µg'),
+    ('Zinc', 'sinkki (mg)', 'mg'),
+    ('Tryptophan', 'tryptofaani (mg)', 'mg'),
+    ('Folate', 'folaatti, kokonais- (µg)', 'µg'),
+    ('NiacinEquivalents', 'niasiiniekvivalentti NE (mg)', 'mg'),
+    ('Niacin', 'niasiini (nikotiinihappo + nikotiiniamidi) (mg)', 'mg'),
+    ('VitaminB6', 'pyridoksiini vitameerit (vetykloridi) (B6) (mg)', 'mg'),
+    ('Riboflavin', 'riboflaviini (B2) (mg)', 'mg'),
+    ('Thiamin', 'tiamiini (B1) (mg)', 'mg'),
+    ('VitaminA', 'A-vitamiini RAE (µg)', 'µg'),
+    ('Carotenoids', 'karotenoidit (µg)', 'µg'),
+    ('VitaminB12', 'B12-vitamiini (kobalamiini) (µg)', 'µg'),
+    ('VitaminC', 'C-vitamiini (mg)', 'mg'),
+    ('VitaminD', 'D-vitamiini (µg)', 'µg'),
+    ('VitaminE', 'E-vitamiini alfatokoferoli (mg)', 'mg'),
+    ('VitaminK', 'K-vitamiini (µg)', 'µg'),
+]
+
+# Numeric columns produced by load_food_data(), starting with the calories and macros
+NUMERIC_COLUMNS = ['Calories'] + [name for name, _, _ in FINELI_NUTRIENTS]
+
+# Unit of every numeric column, per 100 g of food
+COLUMN_UNITS = {'Calories': 'kcal', **{name: unit for name, _, unit in FINELI_NUTRIENTS}}
+
+
+def load_food_data(file_path=FOOD_DATA_PATH):
     # Load the data into a DataFrame
     df = pd.read_excel(file_path, engine='openpyxl')
 
@@ -11,15 +97,308 @@ def load_food_data():
     df['Calories'] = df['energia, laskennallinen (kJ)'] * 0.239006
 
     # Select needed columns and rename for consistency
-    df = df[['name', 'Calories', 'proteiini (g)']]
-    df.columns = ['Name', 'Calories', 'Protein']
+    df = df[['id', 'name', 'Calories'] + [header for _, header, _ in FINELI_NUTRIENTS]]
+    df.columns = ['Id', 'Name'] + NUMERIC_COLUMNS
 
-    # Convert 'Calories' and 'Protein' to numeric
-    df['Calories'] = pd.to_numeric(df['Calories'], errors='coerce')
-    df['Protein'] = pd.to_numeric(df['Protein'], errors='coerce')
+    # Convert the nutrient columns to numeric, values such as '< 0.1' become NaN
+    for column in NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
 
     return df
 
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 digest of a file without reading it into memory at once.
+
+    :param file_path: Path of the file to hash.
+    :param chunk_size: Number of bytes read per iteration.
+    :return: Hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FoodTable:
+    """
+    Column-oriented view of the food data: the Fineli ids and food names plus one
+    NumPy array per numeric column. The columns are views into a single
+    column-major (foods x nutrients) matrix. Arrays opened from a snapshot are
+    read-only memory maps, so the pages are shared between every process that
+    opens the same snapshot.
+    """
+
+    def __init__(self, ids, names, columns, source='xlsx', matrix=None):
+        """
+        :param ids: Fineli food ids.
+        :param names: Food names.
+        :param columns: Dictionary of column name to values, or the list of column names when matrix is given.
+        :param source: Where the data was loaded from, 'xlsx' or 'snapshot'.
+        :param matrix: Optional (foods x columns) array holding the values.
+        """
+        self.ids = ids
+        self.names = names
+        self.source = source
+
+        if matrix is None:
+            matrix = np.asfortranarray(np.column_stack([np.asarray(values, dtype=np.float64)
+                                                        for values in columns.values()]))
+        self.matrix = matrix
+        self.columns = {name: matrix[:, i] for i, name in enumerate(columns)}
+
+        # Set by the catalog to identify the workbook the table was loaded from
+        self.version = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build a table from a DataFrame returned by load_food_data()."""
+        ids = df['Id'].to_numpy(dtype=np.int64)
+        names = df['Name'].astype(str).to_numpy(dtype=str)
+        matrix = np.asfortranarray(df[NUMERIC_COLUMNS].to_numpy(dtype=np.float64))
+        return cls(ids, names, NUMERIC_COLUMNS, matrix=matrix)
+
+    def to_frame(self):
+        """Return the table as a DataFrame with the same layout as load_food_data()."""
+        data = {'Id': self.ids, 'Name': self.names}
+        data.update(self.columns)
+        return pd.DataFrame(data)
+
+    def build_indexes(self):
+        """Build the lookup structures used by the request handlers."""
+        # Dense Fineli id -> row array, ids are small positive integers
+        ids = np.asarray(self.ids)
+        self.id_to_row = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+        self.id_to_row[ids] = np.arange(len(ids), dtype=np.int32)
+
+        self.protein_index = ProteinRatioIndex(self)
+        self.search_index = NameSearchIndex(self.names)
+        self.meal_planner = MealPlanner(self)
+        self.nutrient_query = NutrientQueryEngine(self)
+
+    def row_for_id(self, food_id):
+        """Return the row of a Fineli food id, or None if the id is unknown."""
+        if not 0 <= food_id < len(self.id_to_row):
+            return None
+        row = int(self.id_to_row[food_id])
+        return row if row >= 0 else None
+
+    def per_100g(self, row):
+        """
+        Return the calories and macros of a food per 100 g.
+
+        Values Fineli does not report, or reports as a trace amount, count as zero.
+
+        :param row: Row number of the food.
+        :return: Dictionary with calories, protein, fat and carbs.
+        """
+        values = {}
+        for key, column in (('calories', 'Calories'), ('protein', 'Protein'), ('fat', 'Fat'), ('carbs', 'Carbs')):
+            value = float(self.columns[column][row])
+            values[key] = 0.0 if np.isnan(value) else value
+        return values
+
+
+class ProteinRatioIndex:
+    """
+    Foods with known protein and calorie values, pre-sorted by protein-to-calorie
+    ratio (highest first) and by name. Built once per catalog load so that a
+    threshold query is a binary search plus a slice.
+    """
+
+    SORT_KEYS = ('protein_to_calories', 'name')
+
+    def __init__(self, table):
+        self.table = table
+        calories = np.asarray(table.columns['Calories'], dtype=np.float64)
+        protein = np.asarray(table.columns['Protein'], dtype=np.float64)
+
+        # Ratio per row, NaN where it cannot be computed
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = protein / calories
+        self.ratio = ratio
+
+        rows = np.flatnonzero(~np.isnan(ratio))
+
+        # Row numbers ordered by ratio, highest first, and the matching ratios
+        self.by_ratio = rows[np.argsort(-ratio[rows], kind='stable')]
+        self._sorted_neg_ratio = -ratio[self.by_ratio]
+
+        # Position of every row in by_ratio, used to filter the name ordering
+        self._ratio_rank = np.full(len(table), len(self.by_ratio), dtype=np.int64)
+        self._ratio_rank[self.by_ratio] = np.arange(len(self.by_ratio))
+
+        names = [str(name) for name in table.names]
+        self.by_name = np.array(sorted(rows.tolist(), key=names.__getitem__), dtype=np.int64)
+        self._name_rank = np.full(len(table), len(self.by_name), dtype=np.int64)
+        self._name_rank[self.by_name] = np.arange(len(self.by_name))
+
+    def count_at_least(self, min_protein_ratio):
+        """Return the number of foods whose ratio is at least min_protein_ratio."""
+        # No ratio compares as at least NaN, as with a plain filter
+        if np.isnan(min_protein_ratio):
+            return 0
+        return int(np.searchsorted(self._sorted_neg_ratio, -min_protein_ratio, side='right'))
+
+    def query(self, min_protein_ratio=0.1, sort_by='protein_to_calories'):
+        """
+        Find the rows whose protein-to-calorie ratio is at least min_protein_ratio.
+
+        :param min_protein_ratio: Minimum ratio of protein to calories.
+        :param sort_by: 'protein_to_calories' (highest first) or 'name'.
+        :return: Array of row numbers in the requested order.
+        """
+        count = self.count_at_least(min_protein_ratio)
+        if sort_by == 'name':
+            return self.by_name[self._ratio_rank[self.by_name] < count]
+        return self.by_ratio[:count]
+
+    def keyset_start(self, rows, after, sort_by='protein_to_calories'):
+        """
+        Find where a page following a given row starts, for keyset pagination.
+
+        :param rows: Row numbers in the order returned by query().
+        :param after: Last row of the previous page.
+        :param sort_by: Ordering rows were queried with.
+        :return: Position in rows of the first row that sorts after the given one.
+        """
+        ranks = self._name_rank if sort_by == 'name' else self._ratio_rank
+        return int(np.searchsorted(ranks[rows], ranks[after], side='right'))
+
+    def records(self, rows):
+        """
+        Convert rows to the dictionaries used by the templates.
+
+        :param rows: Row numbers, as returned by query().
+        :return: List of dictionaries with Name, Calories, Protein and Protein_to_Calories.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        names = self.table.names
+        calories = np.round(np.asarray(self.table.columns['Calories'])[rows], 2).tolist()
+        protein = np.round(np.asarray(self.table.columns['Protein'])[rows], 2).tolist()
+        ratio = np.round(self.ratio[rows], 2).tolist()
+        return [
+            {'Name': str(names[row]), 'Calories': calories[i], 'Protein': protein[i], 'Protein_to_Calories': ratio[i]}
+            for i, row in enumerate(rows.tolist())
+        ]
+
+    def iter_records(self, rows, chunk_size=500, expressions=()):
+        """
+        Yield the dictionaries for rows a chunk at a time, so they are never all in memory.
+
+        :param expressions: Nutrient query expressions whose values are added to each dictionary by label.
+        """
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            records = self.records(chunk)
+            if expressions:
+                for record, values in zip(records, self.table.nutrient_query.records(chunk, expressions)):
+                    record.update(values)
+            yield from records
+
+
+def write_snapshot(table, source_digest, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Write a table to disk as .npy files for the ids, the names and the nutrient matrix, plus a metadata file.
+
+    The snapshot is built in a temporary directory next to the target and swapped
+    into place, so readers never see a half-written snapshot.
+
+    :param table: FoodTable to write.
+    :param source_digest: SHA-256 digest of the workbook the table was built from.
+    :param snapshot_dir: Target directory.
+    """
+    tmp_dir = f'{snapshot_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    np.save(os.path.join(tmp_dir, 'ids.npy'), np.asarray(table.ids, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, 'names.npy'), np.asarray(table.names, dtype=str))
+    # Column-major, so every nutrient column is contiguous when memory-mapped
+    np.save(os.path.join(tmp_dir, 'nutrients.npy'), np.asfortranarray(table.matrix, dtype=np.float64))
+
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'source_sha256': source_digest,
+        'rows': len(table),
+        'columns': list(table.columns),
+        'built_at': time.time(),
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+    old_dir = f'{snapshot_dir}.old-{os.getpid()}'
+    if os.path.exists(snapshot_dir):
+        os.rename(snapshot_dir, old_dir)
+    os.rename(tmp_dir, snapshot_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def read_snapshot(source_digest, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Open a snapshot as memory-mapped arrays.
+
+    :param source_digest: Digest of the current workbook; the snapshot is rejected if it was built from another one.
+    :param snapshot_dir: Directory written by write_snapshot().
+    :return: FoodTable, or None if the snapshot is missing or stale.
+    """
+    try:
+        with open(os.path.join(snapshot_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if meta.get('format') != SNAPSHOT_FORMAT or meta.get('source_sha256') != source_digest:
+        return None
+    if meta.get('columns') != NUMERIC_COLUMNS:
+        return None
+
+    ids = np.load(os.path.join(snapshot_dir, 'ids.npy'), mmap_mode='r')
+    names = np.load(os.path.join(snapshot_dir, 'names.npy'), mmap_mode='r')
+    matrix = np.load(os.path.join(snapshot_dir, 'nutrients.npy'), mmap_mode='r')
+    if len(ids) != meta['rows'] or len(names) != meta['rows'] or matrix.shape != (meta['rows'], len(meta['columns'])):
+        return None
+
+    return FoodTable(ids, names, meta['columns'], source='snapshot', matrix=matrix)
+
+
+def build_snapshot(file_path=FOOD_DATA_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Parse the workbook and write it out as a snapshot.
+
+    :return: The FoodTable that was written.
+    """
+    table = FoodTable.from_frame(load_food_data(file_path))
+    write_snapshot(table, file_digest(file_path), snapshot_dir)
+    return table
+
+
+def load_food_table(file_path=FOOD_DATA_PATH, source_digest=None, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Load the food data, preferring the snapshot and falling back to the workbook.
+
+    :param file_path: Path of the workbook.
+    :param source_digest: Digest of the workbook, computed if not given.
+    :param snapshot_dir: Directory of the snapshot.
+    :return: FoodTable.
+    """
+    if source_digest is None:
+        source_digest = file_digest(file_path)
+
+    table = read_snapshot(source_digest, snapshot_dir)
+    if table is not None:
+        return table
+
+    logger.warning('Food snapshot in %s is missing or stale, parsing %s instead. '
+                   'Run "flask build-snapshot" to rebuild it.', snapshot_dir, file_path)
+    return FoodTable.from_frame(load_food_data(file_path))
+
+
 def get_high_protein_options(df, min_protein_ratio=0.1):
     """
     Find food items with a high protein-to-calorie ratio.
@@ -0,0 +1,52 @@
+from sqlalchemy import event
+
+# Flask config keys mapped to the create_engine() pool arguments
+POOL_OPTIONS = {
+    'DB_POOL_SIZE': 'pool_size',
+    'DB_MAX_OVERFLOW': 'max_overflow',
+    'DB_POOL_TIMEOUT': 'pool_timeout',
+    'DB_POOL_RECYCLE': 'pool_recycle',
+    'DB_POOL_PRE_PING': 'pool_pre_ping',
+}
+
+
+def engine_options(config):
+    """
+    Build SQLALCHEMY_ENGINE_OPTIONS from the pool settings in the config.
+
+    Settings left as None are not passed, so SQLAlchemy picks the defaults for the
+    database in use.
+    """
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    for key, argument in POOL_OPTIONS.items():
+        if config.get(key) is not None:
+            options.setdefault(argument, config[key])
+    return options
+
+
+def configure_sqlite(engine, config):
+    """
+    Set the SQLite PRAGMAs from the config on every connection the engine opens.
+
+    WAL lets readers continue while a writer holds the database, and the busy
+    timeout makes writers wait for each other instead of failing straight away.
+    Does nothing for other databases.
+    """
+    if engine.dialect.name != 'sqlite':
+        return
+
+    pragmas = [
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS')),
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT_MS')),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE')),
+        ('cache_size', config.get('SQLITE_CACHE_SIZE')),
+    ]
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas if value is not None]
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
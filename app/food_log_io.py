@@ -0,0 +1,235 @@
+import csv
+import heapq
+import io
+import itertools
+import json
+import math
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import insert, select
+
+from app.models import FoodEntry, FoodEntryArchive
+from app.totals import MACROS, TOTAL_COLUMNS, apply_daily_deltas
+
+# Columns of the import and export files
+CSV_FIELDS = ['date', 'name', 'calories', 'protein', 'fat', 'carbs']
+
+# Rows sent to the database per INSERT and rows written per transaction
+BATCH_SIZE = 5000
+COMMIT_EVERY = 50000
+
+# Rows fetched per round trip when exporting
+EXPORT_CHUNK_SIZE = 1000
+
+# Stop collecting error messages after this many invalid rows
+MAX_REPORTED_ERRORS = 20
+
+# Longest JSON item, in characters, read before the file is rejected as malformed
+MAX_JSON_ITEM_CHARS = 1024 * 1024
+
+
+class ImportResult:
+    """Counts and error messages collected while importing a file."""
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'Row {line}: {message}')
+
+
+def iter_csv_rows(stream):
+    """
+    Read rows from a CSV file with a header line, one row at a time.
+
+    :param stream: Binary file object.
+    :return: Iterator of (line number, dictionary) tuples.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    missing = [field for field in CSV_FIELDS if field not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f'The CSV header is missing the columns: {", ".join(missing)}')
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_json_rows(stream, chunk_size=64 * 1024, max_item_chars=MAX_JSON_ITEM_CHARS):
+    """
+    Read objects from a JSON array or a JSON Lines file without loading the whole file.
+
+    :param stream: Binary file object.
+    :param chunk_size: Characters read at a time.
+    :param max_item_chars: Longest item kept in memory while waiting for it to be complete.
+    :return: Iterator of (item number, dictionary) tuples.
+    :raises ValueError: If the JSON is malformed or an item is longer than max_item_chars.
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    decoder = json.JSONDecoder()
+    buffer = ''
+    number = 0
+
+    for chunk in iter(lambda: text.read(chunk_size), ''):
+        buffer += chunk
+        pos = 0
+        while True:
+            # Skip whitespace and the brackets and commas around the objects
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+                pos += 1
+            if pos == len(buffer):
+                break
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Incomplete object at the end of the chunk, read more
+                break
+            number += 1
+            yield number, item
+        buffer = buffer[pos:]
+        # A broken item would otherwise be buffered until the end of the file
+        if len(buffer) > max_item_chars:
+            raise ValueError(f'Malformed JSON or an item longer than {max_item_chars} characters after item {number}.')
+
+    if buffer.strip():
+        raise ValueError(f'Malformed JSON after item {number}.')
+
+
+def parse_row(raw):
+    """
+    Validate one imported row.
+
+    :param raw: Dictionary read from the file.
+    :return: Dictionary with date, name and the macro totals.
+    :raises ValueError: If a field is missing or invalid.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('expected an object with the fields ' + ', '.join(CSV_FIELDS))
+
+    name = str(raw.get('name') or '').strip()
+    if not name:
+        raise ValueError('name is required')
+    if len(name) > 100:
+        raise ValueError('name is longer than 100 characters')
+
+    try:
+        day = date.fromisoformat(str(raw.get('date') or '').strip())
+    except ValueError:
+        raise ValueError('date must be in YYYY-MM-DD format')
+
+    row = {'date': day, 'name': name}
+    for field in MACROS:
+        try:
+            value = float(raw.get(field))
+        except (TypeError, ValueError):
+            raise ValueError(f'{field} must be a number')
+        if math.isnan(value) or math.isinf(value) or value < 0:
+            raise ValueError(f'{field} must be a non-negative number')
+        row[field] = value
+    return row
+
+
+def import_food_entries(session, user_id, rows, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, on_commit=None):
+    """
+    Insert parsed rows for a user in large batches.
+
+    Each batch is one multi-row INSERT, and its daily totals are updated in the same
+    transaction. The session is committed every commit_every rows and at the end.
+
+    :param session: Database session.
+    :param user_id: Owner of the imported entries.
+    :param rows: Iterator of (line number, raw dictionary) tuples.
+    :param batch_size: Rows per INSERT.
+    :param commit_every: Rows per transaction.
+    :param on_commit: Optional callable run with the ImportResult after every commit, e.g. to report progress.
+    :return: ImportResult.
+    """
+    result = ImportResult()
+    table = FoodEntry.__table__
+    batch = []
+    deltas = defaultdict(lambda: [0] * len(TOTAL_COLUMNS))
+    uncommitted = 0
+
+    def flush_batch():
+        session.execute(insert(table), batch)
+        apply_daily_deltas(session.connection(), deltas)
+        result.imported += len(batch)
+        batch.clear()
+        deltas.clear()
+
+    for line, raw in rows:
+        try:
+            row = parse_row(raw)
+        except ValueError as e:
+            result.add_error(line, str(e))
+            continue
+
+        row['user_id'] = user_id
+        batch.append(row)
+        delta = deltas[(user_id, row['date'])]
+        for i, field in enumerate(MACROS):
+            delta[i] += row[field]
+        delta[-1] += 1
+
+        if len(batch) >= batch_size:
+            flush_batch()
+            uncommitted += batch_size
+            if uncommitted >= commit_every:
+                session.commit()
+                uncommitted = 0
+                if on_commit is not None:
+                    on_commit(result)
+
+    if batch:
+        flush_batch()
+    session.commit()
+    if on_commit is not None:
+        on_commit(result)
+    return result
+
+
+def _export_rows(session, table, user_id, chunk_size):
+    statement = (
+        select(table.c.date, table.c.name, table.c.calories, table.c.protein, table.c.fat, table.c.carbs)
+        .where(table.c.user_id == user_id)
+        .order_by(table.c.date, table.c.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    return session.execute(statement)
+
+
+def iter_export_csv(session, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Generate a user's whole food log, including archived entries, as CSV, a chunk of rows at a time.
+
+    The archived and the current entries are each read with a streaming cursor in the
+    order of their (user_id, date) index and merged by date, so neither the result
+    sets nor the CSV text are held in memory.
+
+    :param session: Database session.
+    :param user_id: Owner of the entries.
+    :param chunk_size: Rows fetched and written per chunk.
+    :return: Iterator of CSV text chunks, starting with the header.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+
+    archived = _export_rows(session, FoodEntryArchive.__table__, user_id, chunk_size)
+    current = _export_rows(session, FoodEntry.__table__, user_id, chunk_size)
+    # SQLite sorts entries without a date first
+    rows = heapq.merge(archived, current, key=lambda row: row[0] or date.min)
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,157 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app import db
+from app.models import DailyTotals
+
+MACROS = ('calories', 'protein', 'fat', 'carbs')
+
+# Days covered by the named periods
+PERIODS = {'week': 7, 'month': 30, 'quarter': 91, 'year': 365}
+
+# Longest range a single request may ask for
+MAX_HISTORY_DAYS = 3 * 366
+
+# Days in the trailing window used for the rolling averages
+ROLLING_WINDOW = 7
+
+# Days a range may cover: the rolling window reaches back before the first day, and
+# the day loop steps one day past the last
+EARLIEST_DAY = date.min + timedelta(days=ROLLING_WINDOW - 1)
+LATEST_DAY = date.max - timedelta(days=1)
+
+
+def resolve_range(period='week', start=None, end=None, today=None):
+    """
+    Turn request parameters into an inclusive date range.
+
+    :param period: One of PERIODS, or 'custom' to use start and end.
+    :param start: First day as an ISO date string, for custom ranges.
+    :param end: Last day as an ISO date string; defaults to today.
+    :param today: Date used as "today", mainly for callers outside a request; defaults
+        to the current UTC date, which food entries are logged under.
+    :return: Tuple of (start, end) dates.
+    :raises ValueError: If the parameters do not describe a valid range.
+    """
+    today = today or datetime.utcnow().date()
+    end = date.fromisoformat(end) if end else today
+
+    if period == 'custom':
+        if not start:
+            raise ValueError('A custom range needs a start date.')
+        start = date.fromisoformat(start)
+    elif period in PERIODS:
+        if (end - date.min).days < PERIODS[period] - 1:
+            raise ValueError(f'The range must lie between {EARLIEST_DAY} and {LATEST_DAY}.')
+        start = end - timedelta(days=PERIODS[period] - 1)
+    else:
+        raise ValueError(f'Unknown period: {period}')
+
+    if start < EARLIEST_DAY or end > LATEST_DAY:
+        raise ValueError(f'The range must lie between {EARLIEST_DAY} and {LATEST_DAY}.')
+    if start > end:
+        raise ValueError('The start date must not be after the end date.')
+    if (end - start).days + 1 > MAX_HISTORY_DAYS:
+        raise ValueError(f'Ranges are limited to {MAX_HISTORY_DAYS} days.')
+    return start, end
+
+
+def daily_totals_query(user_id, start, end):
+    """
+    Per-day sums of a user's food entries, from the maintained daily totals.
+
+    daily_totals also covers archived entries, so history reaches back past the
+    archive horizon. The filter matches the table's (user_id, date) primary key,
+    so only the requested days are read.
+    """
+    return (
+        select(
+            DailyTotals.date,
+            DailyTotals.calories,
+            DailyTotals.protein,
+            DailyTotals.fat,
+            DailyTotals.carbs,
+            DailyTotals.entry_count,
+        )
+        # Days whose entries were all removed keep a row with a zero count
+        .where(DailyTotals.user_id == user_id, DailyTotals.date >= start, DailyTotals.date <= end,
+               DailyTotals.entry_count > 0)
+        .order_by(DailyTotals.date)
+    )
+
+
+def load_daily_totals(user_id, start, end):
+    """
+    Return a mapping of date to the day's totals for the days that have entries.
+
+    :return: Dictionary of date to a dictionary with the macro sums and 'entries'.
+    """
+    rows = db.session.execute(daily_totals_query(user_id, start, end))
+    return {
+        day: dict(zip(MACROS, (calories, protein, fat, carbs)), entries=count)
+        for day, calories, protein, fat, carbs, count in rows
+    }
+
+
+def build_history(user, start, end, window=ROLLING_WINDOW):
+    """
+    Build a day-by-day history for a user, including days without entries.
+
+    Rolling averages cover the trailing window of days ending on each day and only
+    count days that have entries, so a day the user did not log does not pull the
+    average down.
+
+    :param user: User whose entries and daily goals are used.
+    :param start: First day of the range.
+    :param end: Last day of the range.
+    :param window: Number of days in the rolling window.
+    :return: Dictionary with the goals, one row per day and averages for the range.
+    """
+    # Load extra days before the range so the first rolling windows are complete
+    totals = load_daily_totals(user.id, start - timedelta(days=window - 1), end)
+
+    goals = {
+        'calories': user.daily_calorie_goal,
+        'protein': user.daily_protein_goal,
+        'fat': user.daily_fat_goal,
+        'carbs': user.daily_carbs_goal,
+    }
+
+    days = []
+    day = start
+    while day <= end:
+        day_totals = totals.get(day)
+        window_totals = [
+            totals[window_day]
+            for window_day in (day - timedelta(days=offset) for offset in range(window))
+            if window_day in totals
+        ]
+
+        row = {'date': day.isoformat(), 'entries': day_totals['entries'] if day_totals else 0}
+        for name in MACROS:
+            value = round(day_totals[name], 2) if day_totals else 0
+            row[name] = value
+            row[f'{name}_left'] = round(goals[name] - value, 2)
+            row[f'{name}_rolling_avg'] = (
+                round(sum(item[name] for item in window_totals) / len(window_totals), 2)
+                if window_totals else None
+            )
+        days.append(row)
+        day += timedelta(days=1)
+
+    logged = [row for row in days if row['entries']]
+    averages = {
+        name: round(sum(row[name] for row in logged) / len(logged), 2) if logged else None
+        for name in MACROS
+    }
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'rolling_window': window,
+        'goals': goals,
+        'days_logged': len(logged),
+        'averages': averages,
+        'days': days,
+    }
@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+
+from flask import make_response, request
+
+# Seconds browsers may reuse catalog-derived pages before revalidating them
+CATALOG_MAX_AGE = 300
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag value from the things a response depends on.
+
+    :param parts: JSON-serialisable values, e.g. a data version and the normalized query.
+    :return: Hex digest to pass to Response.set_etag().
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def cache_headers(response, etag, max_age=0):
+    """
+    Mark a response as cacheable by the user's browser only, validated by its ETag.
+
+    The pages are behind a login, so shared caches must not keep them.
+    """
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    if not max_age:
+        response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def not_modified(etag, max_age=0):
+    """
+    Return a 304 response if the request's If-None-Match already has the ETag.
+
+    Call this before doing the work the page needs, so revalidations stay cheap.
+
+    :return: The 304 response, or None if the page has to be rendered.
+    """
+    if not request.if_none_match.contains(etag):
+        return None
+    return cache_headers(make_response('', 304), etag, max_age)
+
+
+def init_static_caching(app):
+    """
+    Let browsers keep static files for SEND_FILE_MAX_AGE_DEFAULT seconds.
+
+    url_for('static', ...) adds the file's modification time as a "v" query
+    parameter, so a changed file gets a new URL instead of a stale cached copy.
+    Flask already answers conditional requests for static files with 304.
+    """
+    versions = {}
+
+    @app.url_defaults
+    def _static_version(endpoint, values):
+        if endpoint != 'static' or 'v' in values or 'filename' not in values:
+            return
+        filename = values['filename']
+        if filename not in versions:
+            try:
+                versions[filename] = int(os.stat(os.path.join(app.static_folder, filename)).st_mtime)
+            except OSError:
+                return
+        values['v'] = versions[filename]
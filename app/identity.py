@@ -0,0 +1,144 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_login import UserMixin
+from sqlalchemy import delete, func, select
+
+from app import db
+from app.cache import LRUCache
+from app.models import User, UserChange
+
+# Users kept in memory and how long, in seconds, a cached user is trusted
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 300
+
+# How often, in seconds, each process reads the user change log. A change made in
+# another process is seen by this one at most this long after it was committed.
+USER_CACHE_SYNC_SECONDS = 1.0
+
+# Columns copied from the user row into the cached identity
+USER_FIELDS = ('id', 'username', 'email', 'daily_calorie_goal', 'daily_protein_goal',
+               'daily_fat_goal', 'daily_carbs_goal')
+
+user_cache = LRUCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+class CachedUser(UserMixin):
+    """
+    Read-only copy of a user row, used as current_user.
+
+    It is not attached to a database session, so code that changes the user must
+    load the User row, call record_user_change(), commit, and then call
+    invalidate_user().
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(**{name: getattr(user, name) for name in USER_FIELDS})
+
+    def __repr__(self):
+        return f'<CachedUser {self.id}>'
+
+
+class UserChangeFeed:
+    """
+    Drops cached users that were changed by another process.
+
+    Every change to a user row adds a UserChange row in the same transaction. Each
+    process remembers the last change it has seen and, at most once every
+    USER_CACHE_SYNC_SECONDS, reads the newer ones and invalidates those users. The
+    ids grow in commit order because SQLite runs one write transaction at a time.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._last_id = None
+        self._next_sync = 0.0
+
+    def sync(self, session):
+        """
+        Invalidate the users changed since the last sync, if it is due.
+
+        :param session: Database session to read the change log with.
+        """
+        now = time.monotonic()
+        if now < self._next_sync or not self._lock.acquire(blocking=False):
+            # Not due yet, or another thread of this process is reading the log
+            return
+        try:
+            if self._last_id is None:
+                # Nothing is cached from before the first sync
+                self._last_id = session.execute(select(func.max(UserChange.id))).scalar() or 0
+            else:
+                changes = session.execute(
+                    select(UserChange.id, UserChange.user_id).where(UserChange.id > self._last_id)
+                ).all()
+                for change_id, user_id in changes:
+                    self.cache.invalidate(user_id)
+                    self._last_id = max(self._last_id, change_id)
+            self._next_sync = now + USER_CACHE_SYNC_SECONDS
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        """Forget the position in the log, e.g. when switching to another database."""
+        with self._lock:
+            self._last_id = None
+            self._next_sync = 0.0
+
+
+user_changes = UserChangeFeed(user_cache)
+
+
+def load_cached_user(user_id):
+    """
+    Return the identity for a user id, from the cache or from the database.
+
+    :param user_id: User id as stored in the session.
+    :return: CachedUser, or None if the user does not exist.
+    """
+    user_changes.sync(db.session)
+    user = user_cache.get(user_id)
+    if user is None:
+        row = db.session.get(User, user_id)
+        if row is None:
+            return None
+        user = CachedUser.from_user(row)
+        user_cache.set(user_id, user)
+    return user
+
+
+def remember_user(user):
+    """Cache a user row that was just loaded, e.g. at login."""
+    user_cache.set(user.id, CachedUser.from_user(user))
+
+
+def record_user_change(session, user_id):
+    """
+    Log a change to a user row so that every process drops its cached copy.
+
+    Entries older than USER_CACHE_TTL are deleted on the way, as any copy cached
+    before them has expired.
+
+    :param session: Database session; the caller commits along with the change.
+    :param user_id: Id of the changed user.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=USER_CACHE_TTL)
+    session.execute(delete(UserChange).where(UserChange.changed_at < cutoff))
+    session.add(UserChange(user_id=user_id))
+
+
+def invalidate_user(user_id):
+    """Drop this process's cached copy of a user after the row changed and was committed."""
+    user_cache.invalidate(user_id)
+
+
+def reset_user_cache():
+    """Empty the cache and the change log position, e.g. for a new test database."""
+    user_cache.clear()
+    user_changes.reset()
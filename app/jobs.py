@@ -0,0 +1,434 @@
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app import db
+from app.metrics import registry
+from app.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job states; a failed job that still has attempts left goes back to QUEUED
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+# Least number of seconds between two progress writes of a running job
+PROGRESS_INTERVAL = 1.0
+
+# Histogram buckets in seconds for job durations
+JOB_DURATION_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+job_duration = registry.histogram(
+    'job_duration_seconds', 'Time spent running background jobs, by type and outcome.',
+    ('type', 'status'), JOB_DURATION_BUCKETS)
+
+# Job type to handler, and to the cleanup of jobs that failed for good, filled in by job_handler()
+_handlers = {}
+_cleanups = {}
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that running the job again would not fix."""
+
+
+def job_handler(job_type, cleanup=None):
+    """
+    Register a function as the handler of a job type.
+
+    The handler is called with a JobContext and the job's parameters as keyword
+    arguments, inside an app context, and returns a JSON-serializable result.
+    Exceptions are retried until the job runs out of attempts, except JobFailed.
+
+    :param cleanup: Called with the job's parameters once the job has failed for
+        good, also when the process running it exited before the handler finished.
+    """
+    def register(func):
+        _handlers[job_type] = func
+        if cleanup is not None:
+            _cleanups[job_type] = cleanup
+        return func
+    return register
+
+
+def _clean_up(job_id, job_type, params):
+    cleanup = _cleanups.get(job_type)
+    if cleanup is None:
+        return
+    try:
+        cleanup(**params)
+    except Exception:
+        logger.exception('Could not clean up after job %s (%s)', job_id, job_type)
+
+
+def run_in_process(func, *args):
+    """
+    Run a CPU-bound function in a fresh process and return its result.
+
+    Keeps pure-Python work such as parsing a workbook from holding the GIL of the
+    process that serves requests. The function and its arguments must be picklable.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(func, *args).result()
+
+
+class JobContext:
+    """Handed to a job's handler to report progress."""
+
+    def __init__(self, job_id, attempt):
+        self.job_id = job_id
+        self.attempt = attempt
+        self._last_write = 0.0
+
+    def progress(self, fraction=None, message=None, force=False):
+        """
+        Record how far the job has come, at most once per PROGRESS_INTERVAL.
+
+        Written on a connection of its own so it is visible at once. With SQLite, call
+        it between the handler's transactions: a write transaction the handler keeps
+        open would block it.
+
+        :param fraction: Share of the work done, from 0 to 1.
+        :param message: Short description of the current step.
+        :param force: Write even if the last write was less than PROGRESS_INTERVAL ago.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+
+        values = {'updated_at': datetime.utcnow()}
+        if fraction is not None:
+            values['progress'] = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            values['message'] = message[:200]
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == self.job_id).values(**values))
+
+
+class JobRunner:
+    """
+    Runs queued jobs on a thread pool in the current process, with no broker.
+
+    The job table is the queue. A dispatcher thread polls it for due jobs and claims
+    each one with a conditional UPDATE, so any number of processes can share the
+    table and every job runs once. Jobs that raise are queued again with an
+    exponential backoff until they run out of attempts. Jobs left running by a
+    process that exited on this host are picked up again when a runner starts.
+
+    Every web worker runs the jobs it can claim. Set JOB_WORKERS to 0 to keep
+    jobs out of the web workers and run them with "flask run-jobs" instead.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.workers = 1
+        self.poll_interval = 2.0
+        self.max_attempts = 3
+        self.retry_delay = 10.0
+        self.owner = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._slots = None
+        self._executor = None
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config['JOB_WORKERS']
+        self.poll_interval = app.config['JOB_POLL_SECONDS']
+        self.max_attempts = app.config['JOB_MAX_ATTEMPTS']
+        self.retry_delay = app.config['JOB_RETRY_DELAY']
+
+    @property
+    def running(self):
+        """True if this process runs jobs."""
+        return self._pid == os.getpid()
+
+    def start(self, workers=None):
+        """
+        Start the dispatcher and the worker threads of this process, once.
+
+        Called again after a fork, the child starts its own threads.
+
+        :param workers: Worker threads, JOB_WORKERS by default; 0 runs no jobs.
+        """
+        if self.running:
+            return
+        with self._lock:
+            workers = self.workers if workers is None else workers
+            if self.running or not workers or self.app is None:
+                return
+            self._pid = os.getpid()
+            self.owner = f'{socket.gethostname()}:{self._pid}'
+            self._slots = threading.Semaphore(workers)
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+            self._wake = threading.Event()
+            threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True).start()
+            logger.info('Job runner %s started with %d workers', self.owner, workers)
+
+    def submit(self, job_type, params=None, user_id=None, max_attempts=None):
+        """
+        Queue a job. Commits the session.
+
+        :param job_type: Name of a registered handler.
+        :param params: Keyword arguments for the handler, JSON-serializable.
+        :param user_id: User the job belongs to, None for maintenance jobs.
+        :param max_attempts: Times to try the job, JOB_MAX_ATTEMPTS by default.
+        :return: The new Job.
+        :raises ValueError: If no handler is registered for the type.
+        """
+        if job_type not in _handlers:
+            raise ValueError(f'Unknown job type "{job_type}".')
+
+        now = datetime.utcnow()
+        job = Job(type=job_type, status=QUEUED, params=json.dumps(params or {}), user_id=user_id,
+                  max_attempts=max_attempts or self.max_attempts, progress=0.0, attempts=0,
+                  created_at=now, run_after=now)
+        db.session.add(job)
+        db.session.commit()
+
+        # Processes that do not run jobs, e.g. CLI commands, leave them to a runner's next poll
+        if self.running:
+            self._wake.set()
+        return job
+
+    def _dispatch(self):
+        with self.app.app_context():
+            try:
+                self._requeue_orphans()
+            except Exception:
+                logger.exception('Could not recover interrupted jobs')
+
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    while self._slots.acquire(blocking=False):
+                        try:
+                            claimed = self._claim()
+                        except Exception:
+                            # The slot is only handed on with a claimed job
+                            self._slots.release()
+                            raise
+                        if claimed is None:
+                            self._slots.release()
+                            break
+                        self._executor.submit(self._run, *claimed)
+            except Exception:
+                logger.exception('Job dispatcher failed, retrying in %.0f s', self.poll_interval)
+
+    def _claim(self):
+        # Several processes may see the same job, the status check lets only one of them have it
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            select(Job.id).where(Job.status == QUEUED, Job.run_after <= now)
+            .order_by(Job.run_after, Job.id).limit(10)
+        ).scalars().all()
+        for job_id in candidates:
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, owner=self.owner, attempts=Job.attempts + 1,
+                        started_at=now, updated_at=now)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                job = db.session.get(Job, job_id)
+                return job.id, job.type, json.loads(job.params), job.attempts, job.max_attempts
+        db.session.commit()
+        return None
+
+    def _run(self, job_id, job_type, params, attempt, max_attempts):
+        start = time.perf_counter()
+        status = FAILED
+        try:
+            with self.app.app_context():
+                try:
+                    handler = _handlers.get(job_type)
+                    if handler is None:
+                        raise JobFailed(f'Unknown job type "{job_type}".')
+                    result = handler(JobContext(job_id, attempt), **params)
+                except Exception as e:
+                    db.session.rollback()
+                    retry = attempt < max_attempts and not isinstance(e, JobFailed)
+                    logger.log(logging.WARNING if retry else logging.ERROR, 'Job %s (%s) failed on attempt %d',
+                               job_id, job_type, attempt, exc_info=not isinstance(e, JobFailed))
+                    self._failed(job_id, attempt, str(e) or type(e).__name__, retry)
+                    status = QUEUED if retry else FAILED
+                    if not retry:
+                        _clean_up(job_id, job_type, params)
+                else:
+                    self._finish(job_id, status=SUCCEEDED, result=json.dumps(result), error=None, progress=1.0)
+                    status = SUCCEEDED
+        except Exception:
+            logger.exception('Could not record the outcome of job %s', job_id)
+        finally:
+            job_duration.observe(time.perf_counter() - start, type=job_type, status=status)
+            self._slots.release()
+            self._wake.set()
+
+    def _failed(self, job_id, attempt, error, retry):
+        if retry:
+            delay = self.retry_delay * 2 ** (attempt - 1)
+            self._finish(job_id, status=QUEUED, error=error, owner=None, finished_at=None,
+                         run_after=datetime.utcnow() + timedelta(seconds=delay))
+        else:
+            self._finish(job_id, status=FAILED, error=error)
+
+    def _finish(self, job_id, **values):
+        now = datetime.utcnow()
+        values.setdefault('finished_at', now)
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == job_id).values(updated_at=now, **values))
+
+    def _requeue_orphans(self):
+        """Queue again the jobs that a process on this host was running when it exited."""
+        host = socket.gethostname()
+        rows = db.session.execute(
+            select(Job.id, Job.type, Job.params, Job.owner, Job.attempts, Job.max_attempts)
+            .where(Job.status == RUNNING)
+        ).all()
+        for job_id, job_type, params, owner, attempts, max_attempts in rows:
+            owner_host, _, pid = (owner or '').rpartition(':')
+            if owner_host != host or not pid.isdigit() or _process_alive(int(pid)):
+                continue
+            error = 'The process running the job exited.'
+            retry = attempts < max_attempts
+            logger.warning('Job %s was interrupted, %s', job_id, 'queued again' if retry else 'failed')
+            updated = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == RUNNING, Job.owner == owner)
+                .values(status=QUEUED if retry else FAILED, owner=None, error=error, updated_at=datetime.utcnow(),
+                        finished_at=None if retry else datetime.utcnow())).rowcount
+            db.session.commit()
+            if updated and not retry:
+                _clean_up(job_id, job_type, json.loads(params))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+job_runner = JobRunner()
+
+
+def job_status(job):
+    """Return a job's state as a JSON-serializable dictionary."""
+    return {
+        'id': job.id,
+        'type': job.type,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+def init_jobs(app):
+    """
+    Configure the shared job runner from the app config.
+
+    The runner starts with the first request a process handles, or when a job is
+    submitted, so importing the app in a server's master process starts no threads.
+    """
+    job_runner.init_app(app)
+    app.before_request(job_runner.start)
+
+
+def _build_snapshot(source, output):
+    from app.data_utils import build_snapshot
+
+    return len(build_snapshot(source, output))
+
+
+@job_handler('rebuild_snapshot')
+def rebuild_snapshot_job(context, source=None, output=None):
+    """Convert the Fineli workbook into the snapshot, in a separate process."""
+    from app.data_utils import FOOD_DATA_PATH, SNAPSHOT_DIR
+
+    context.progress(0.0, 'Parsing the workbook', force=True)
+    foods = run_in_process(_build_snapshot, source or FOOD_DATA_PATH, output or SNAPSHOT_DIR)
+    return {'foods': foods}
+
+
+@job_handler('recompute_totals')
+def recompute_totals_job(context, user_id=None):
+    """Rebuild the daily totals of one user, or of everyone."""
+    from app.totals import recompute_daily_totals
+
+    context.progress(0.0, 'Rebuilding daily totals', force=True)
+    rows = recompute_daily_totals(db.session, user_id)
+    db.session.commit()
+    return {'rows': rows}
+
+
+def _remove_upload(path, **params):
+    # The handler removes the file itself, unless the job failed before it ran
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@job_handler('import_food_log', cleanup=_remove_upload)
+def import_food_log_job(context, user_id, path, file_format):
+    """Import an uploaded food log file, which is deleted afterwards."""
+    from app.food_log_io import import_food_entries, iter_csv_rows, iter_json_rows
+
+    size = os.path.getsize(path) or 1
+    try:
+        with open(path, 'rb') as stream:
+            rows = iter_csv_rows(stream) if file_format == 'csv' else iter_json_rows(stream)
+
+            def committed(result):
+                # The reader closes the file once it has read all of it
+                done = 1.0 if stream.closed else stream.tell() / size
+                context.progress(done, f'Imported {result.imported} entries')
+
+            result = import_food_entries(db.session, user_id, rows, on_commit=committed)
+    except ValueError as e:
+        # Only batches committed before the error was found are kept
+        db.session.rollback()
+        raise JobFailed(f'Could not read the file: {e}')
+    finally:
+        os.remove(path)
+    return {'imported': result.imported, 'skipped': result.skipped, 'errors': result.errors}
+
+
+@job_handler('archive_entries')
+def archive_entries_job(context, days=None):
+    """Move food entries older than days, ARCHIVE_AFTER_DAYS by default, to the archive."""
+    from flask import current_app
+
+    from app.archive import archive_cutoff, archive_food_entries
+
+    cutoff = archive_cutoff(days if days is not None else current_app.config['ARCHIVE_AFTER_DAYS'])
+
+    def archived(done, users, entries):
+        context.progress(done / users, f'Archived {entries} entries before {cutoff}', force=done == users)
+
+    entries = archive_food_entries(db.session, cutoff, progress=archived)
+    return {'archived': entries, 'cutoff': cutoff.isoformat()}
@@ -0,0 +1,132 @@
+import math
+
+from sqlalchemy import insert, select
+
+from app.models import FoodEntry, SavedMeal, SavedMealItem
+from app.totals import MACROS, apply_daily_deltas
+
+# Ingredients a meal may have, and the number of empty ingredient rows on the form
+MAX_MEAL_ITEMS = 30
+FORM_ITEM_ROWS = 8
+
+# Form fields of each ingredient row, submitted once per row
+ITEM_FIELDS = ('item_name', 'item_food_id', 'item_grams', 'item_calories_per_100g',
+               'item_protein_per_100g', 'item_fat_per_100g', 'item_carbs_per_100g')
+
+
+def _number(text, description):
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        raise ValueError(f'{description} must be a number')
+    if math.isnan(value) or math.isinf(value) or value < 0:
+        raise ValueError(f'{description} must be a non-negative number')
+    return value
+
+
+def parse_meal_items(params, table):
+    """
+    Read the ingredient rows of the saved meal form.
+
+    Each row has a name, an amount in grams and the values per 100 g. A row picked
+    from the Fineli catalog also has a food id, and values left empty are taken
+    from the catalog. Rows left completely empty are skipped.
+
+    :param params: request.form with the ITEM_FIELDS lists.
+    :param table: FoodTable from the catalog.
+    :return: List of dictionaries with the SavedMealItem columns, totals for the amount.
+    :raises ValueError: If a row is incomplete or invalid, or there are no or too many rows.
+    """
+    columns = [params.getlist(field) for field in ITEM_FIELDS]
+    items = []
+    for number, values in enumerate(zip(*columns), start=1):
+        name, food_id, grams, *per_100g = (value.strip() for value in values)
+        if not any((name, grams, *per_100g)):
+            continue
+
+        row = None
+        if food_id:
+            try:
+                row = table.row_for_id(int(food_id))
+            except ValueError:
+                row = None
+            if row is None:
+                raise ValueError(f'Ingredient {number}: unknown catalog food')
+            catalog = table.per_100g(row)
+            name = name or str(table.names[row])
+            per_100g = [value or catalog[macro] for value, macro in zip(per_100g, MACROS)]
+
+        if not name:
+            raise ValueError(f'Ingredient {number}: name is required')
+        grams = _number(grams, f'Ingredient {number}: amount')
+        if grams == 0:
+            raise ValueError(f'Ingredient {number}: amount must be more than 0 g')
+
+        item = {
+            'position': len(items),
+            'food_id': int(table.ids[row]) if row is not None else None,
+            'name': name[:100],
+            'grams': grams,
+        }
+        for macro, value in zip(MACROS, per_100g):
+            item[macro] = _number(value, f'Ingredient {number}: {macro} per 100 g') / 100 * grams
+        items.append(item)
+
+    if not items:
+        raise ValueError('A meal needs at least one ingredient')
+    if len(items) > MAX_MEAL_ITEMS:
+        raise ValueError(f'A meal can have at most {MAX_MEAL_ITEMS} ingredients')
+    return items
+
+
+def save_meal(session, user_id, name, items):
+    """
+    Add a saved meal with its ingredients and precomputed totals.
+
+    :param session: Database session; the caller commits.
+    :param user_id: Owner of the meal.
+    :param name: Name of the meal, unique per user.
+    :param items: Ingredients as returned by parse_meal_items().
+    :return: The new SavedMeal.
+    """
+    meal = SavedMeal(user_id=user_id, name=name[:100], item_count=len(items),
+                     items=[SavedMealItem(**item) for item in items])
+    for macro in MACROS:
+        setattr(meal, macro, sum(item[macro] for item in items))
+    session.add(meal)
+    return meal
+
+
+def log_meal(session, meal, day, servings=1.0):
+    """
+    Log every ingredient of a saved meal as a food entry.
+
+    All entries go in with one multi-row INSERT, and the day's totals are updated from
+    the meal's precomputed totals in the same transaction, so logging a meal costs the
+    same round trips whatever its number of ingredients.
+
+    :param session: Database session; the caller commits.
+    :param meal: SavedMeal to log, owned by the user the entries are logged for.
+    :param day: Date of the entries.
+    :param servings: Multiplier for the saved amounts.
+    :return: Number of entries logged.
+    """
+    items = session.execute(
+        select(SavedMealItem.name, *(getattr(SavedMealItem, macro) for macro in MACROS))
+        .where(SavedMealItem.meal_id == meal.id)
+        .order_by(SavedMealItem.position)
+    ).all()
+    if not items:
+        return 0
+
+    entries = [
+        {'user_id': meal.user_id, 'date': day, 'name': name,
+         **{macro: value * servings for macro, value in zip(MACROS, values)}}
+        for name, *values in items
+    ]
+    session.execute(insert(FoodEntry.__table__), entries)
+
+    # Core inserts bypass the session hook that maintains the totals
+    delta = [getattr(meal, macro) * servings for macro in MACROS] + [len(entries)]
+    apply_daily_deltas(session.connection(), {(meal.user_id, day): delta})
+    return len(entries)
@@ -0,0 +1,76 @@
+import os
+
+# Fields of /proc/<pid>/smaps_rollup that are reported, all in kB
+SMAPS_FIELDS = {
+    'Rss': 'rss',
+    'Pss': 'pss',
+    'Shared_Clean': 'shared_clean',
+    'Shared_Dirty': 'shared_dirty',
+    'Private_Clean': 'private_clean',
+    'Private_Dirty': 'private_dirty',
+    'Swap': 'swap',
+}
+
+
+def process_memory(pid='self'):
+    """
+    Read a process's memory use from /proc, in bytes.
+
+    PSS (proportional set size) divides every shared page between the processes
+    sharing it, so summing it over a master and its workers gives their real total,
+    unlike RSS, which counts pages shared copy-on-write once per process.
+
+    :param pid: Process id, or 'self'.
+    :return: Dictionary with rss, pss, shared_clean, shared_dirty, private_clean,
+        private_dirty and swap; only rss when smaps_rollup is not available.
+    """
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', encoding='ascii') as f:
+            lines = f.readlines()
+    except OSError:
+        lines = []
+
+    memory = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in SMAPS_FIELDS:
+            memory[SMAPS_FIELDS[name]] = int(value.split()[0]) * 1024
+    if memory:
+        return memory
+
+    # Older kernels: only the resident size is cheap to get
+    with open(f'/proc/{pid}/status', encoding='ascii') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return {'rss': int(line.split()[1]) * 1024}
+    return {}
+
+
+def child_pids(pid):
+    """Return the ids of a process's direct children, e.g. the workers of a server master."""
+    children = []
+    task_dir = f'/proc/{pid}/task'
+    for task in os.listdir(task_dir):
+        try:
+            with open(os.path.join(task_dir, task, 'children'), encoding='ascii') as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return sorted(set(children))
+
+
+def memory_report(master_pid):
+    """
+    Memory use of a master process and each of its workers.
+
+    :param master_pid: Id of the server's master process.
+    :return: List of dictionaries with the role, pid and the values of process_memory().
+    """
+    report = [{'role': 'master', 'pid': master_pid, **process_memory(master_pid)}]
+    for pid in child_pids(master_pid):
+        try:
+            report.append({'role': 'worker', 'pid': pid, **process_memory(pid)})
+        except OSError:
+            # Worker exited while the report was being made
+            continue
+    return report
@@ -0,0 +1,377 @@
+import cProfile
+import functools
+import hmac
+import logging
+import os
+import threading
+import time
+
+from flask import abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds for request and query latencies
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Histogram buckets for the number of SQL statements a request runs
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                     for name, value in labels)
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing value per label combination."""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, per label combination."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[0][i] += 1
+                    break
+            counts[1] += value
+            counts[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: ([*counts[0]], counts[1], counts[2]) for key, counts in self._values.items()}
+        for key, (buckets, total, count) in sorted(values.items()):
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, buckets):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', labels + (('le', _format_value(bound)),), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class Registry:
+    """
+    Holds the metrics of this process and renders them in the Prometheus text format.
+
+    Values live in process memory, so with several worker processes every worker
+    reports its own numbers.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """
+        Add a callable that reports values owned by another component.
+
+        :param collector: Callable returning a list of (name, type, documentation, value) tuples.
+        """
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        for collector in self._collectors:
+            for name, metric_type, documentation, value in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                lines.append(f'{name} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, until the response starts.',
+    ('endpoint', 'method', 'status'))
+request_queries = registry.histogram(
+    'http_request_sql_queries', 'Number of SQL statements run while handling a request.',
+    ('endpoint',), QUERY_COUNT_BUCKETS)
+request_query_duration = registry.histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL statements while handling a request.',
+    ('endpoint',))
+request_exceptions = registry.counter(
+    'http_request_exceptions_total', 'Requests that ended with an unhandled exception.', ('endpoint',))
+query_duration = registry.histogram(
+    'sqlalchemy_query_duration_seconds', 'Duration of SQL statements by statement type.', ('statement',))
+query_errors = registry.counter(
+    'sqlalchemy_query_errors_total', 'SQL statements that raised an error, by statement type.', ('statement',))
+profiles_skipped = registry.counter(
+    'http_request_profiles_skipped_total', 'Requests not profiled because another request was being profiled.')
+
+
+def _statement_type(statement):
+    words = statement.split(None, 1)
+    return words[0].upper() if words else 'UNKNOWN'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    query_duration.observe(elapsed, statement=_statement_type(statement))
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_queries += 1
+        g.metrics_query_seconds += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(context):
+    starts = context.connection.info.get('query_start') if context.connection is not None else None
+    if starts:
+        starts.pop()
+    query_errors.inc(statement=_statement_type(context.statement or ''))
+
+
+def _catalog_metrics():
+    from app.catalog import food_catalog
+
+    stats = food_catalog.stats()
+    return [
+        ('food_catalog_hits_total', 'counter', 'Catalog accesses served from memory.', stats['hits']),
+        ('food_catalog_misses_total', 'counter', 'Catalog accesses that had to load the data.', stats['misses']),
+        ('food_catalog_loads_total', 'counter', 'Times the catalog data was loaded.', stats['loads']),
+        ('food_catalog_load_seconds_total', 'counter', 'Total time spent loading the catalog.',
+         stats['total_load_seconds']),
+        ('food_catalog_last_load_seconds', 'gauge', 'Duration of the most recent catalog load.',
+         stats['last_load_seconds'] or 0.0),
+        ('food_catalog_loaded_from_snapshot', 'gauge', '1 if the catalog was loaded from the snapshot.',
+         1 if stats['source'] == 'snapshot' else 0),
+    ]
+
+
+registry.register_collector(_catalog_metrics)
+
+
+def cache_collector(prefix, description, get_cache):
+    """
+    Build a collector reporting an LRUCache's counters under a metric name prefix.
+
+    :param prefix: Start of the metric names, e.g. "user_cache".
+    :param description: What the cache holds, used in the help texts.
+    :param get_cache: Callable returning the cache, so the module holding it is imported lazily.
+    """
+    def collect():
+        stats = get_cache().stats()
+        return [
+            (f'{prefix}_hits_total', 'counter', f'Lookups served from the {description}.', stats['hits']),
+            (f'{prefix}_misses_total', 'counter', f'Lookups missing from the {description}.', stats['misses']),
+            (f'{prefix}_evictions_total', 'counter', f'Entries evicted to keep the {description} in its limits.',
+             stats['evictions']),
+            (f'{prefix}_invalidations_total', 'counter', f'Entries dropped from the {description} as stale.',
+             stats['invalidations']),
+            (f'{prefix}_size', 'gauge', f'Entries currently held in the {description}.', stats['size']),
+            (f'{prefix}_bytes', 'gauge', f'Approximate memory used by the {description}.', stats['bytes']),
+            (f'{prefix}_hit_ratio', 'gauge', f'Share of lookups served from the {description}.',
+             stats['hit_rate'] or 0.0),
+        ]
+    return collect
+
+
+def _user_cache():
+    from app.identity import user_cache
+    return user_cache
+
+
+def _query_cache():
+    from app.catalog import query_cache
+    return query_cache
+
+
+def _process_memory_metrics():
+    from app.memory import process_memory
+
+    try:
+        memory = process_memory()
+    except OSError:
+        return []
+    metrics = [('process_resident_memory_bytes', 'gauge', 'Resident memory of this process.', memory.get('rss', 0))]
+    if 'pss' in memory:
+        metrics.append(('process_proportional_memory_bytes', 'gauge',
+                        'Proportional set size of this process, with shared pages split between their users.',
+                        memory['pss']))
+        metrics.append(('process_private_dirty_memory_bytes', 'gauge',
+                        'Memory written by this process that no other process shares.', memory['private_dirty']))
+    return metrics
+
+
+registry.register_collector(_process_memory_metrics)
+registry.register_collector(cache_collector('user_cache', 'identity cache', _user_cache))
+registry.register_collector(cache_collector('high_protein_cache', 'high-protein result cache', _query_cache))
+
+
+# cProfile hooks the whole interpreter, so only one request per process is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_query_seconds = 0.0
+
+    if current_app.config.get('PROFILE_REQUESTS'):
+        if not _profile_lock.acquire(blocking=False):
+            profiles_skipped.inc()
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiling tool, e.g. a debugger, is already active
+            _profile_lock.release()
+            profiles_skipped.inc()
+            return
+        g.profiler = profiler
+
+
+def _stop_profiler():
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+    return profiler
+
+
+def _finish_request(response):
+    if 'metrics_start' not in g:
+        return response
+
+    elapsed = time.perf_counter() - g.metrics_start
+    endpoint = request.endpoint or 'unmatched'
+    request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    request_queries.observe(g.metrics_queries, endpoint=endpoint)
+    request_query_duration.observe(g.metrics_query_seconds, endpoint=endpoint)
+
+    profiler = _stop_profiler()
+    if profiler is not None and elapsed >= current_app.config.get('PROFILE_MIN_SECONDS', 0.0):
+        _save_profile(profiler, endpoint, elapsed)
+
+    return response
+
+
+def _save_profile(profiler, endpoint, elapsed):
+    directory = current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+    os.makedirs(directory, exist_ok=True)
+    file_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{elapsed * 1000:.0f}ms-{os.getpid()}.prof'
+    path = os.path.join(directory, file_name)
+    profiler.dump_stats(path)
+    logger.info('Profiled %s %s in %.1f ms, saved to %s', request.method, request.path, elapsed * 1000, path)
+
+
+def _teardown_request(exc):
+    # Requests that never reached _finish_request must still let the next one be profiled
+    _stop_profiler()
+    if exc is not None:
+        request_exceptions.inc(endpoint=request.endpoint or 'unmatched')
+
+
+def ops_access_allowed():
+    """
+    Check whether the current request may read the operational endpoints.
+
+    Clients whose address is in OPS_ALLOWED_IPS are allowed, and so is any client
+    sending "Authorization: Bearer <OPS_TOKEN>" when a token is configured. Behind a
+    reverse proxy the address is the proxy's unless the app is wrapped in ProxyFix.
+    """
+    if request.remote_addr in current_app.config.get('OPS_ALLOWED_IPS', ()):
+        return True
+    token = current_app.config.get('OPS_TOKEN')
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return bool(token) and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode())
+
+
+def ops_required(view):
+    """Decorate a view so that only clients passing ops_access_allowed() can reach it."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ops_access_allowed():
+            abort(403)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_metrics(app):
+    """
+    Install the request hooks that record latency, SQL usage and optional profiles.
+
+    Profiling is off unless PROFILE_REQUESTS is set. Profiles are written as
+    cProfile .prof files to PROFILE_DIR, or instance/profiles by default, for
+    requests slower than PROFILE_MIN_SECONDS. Only one request per process is
+    profiled at a time; requests arriving meanwhile on other threads are counted
+    in http_request_profiles_skipped_total instead.
+    """
+    app.config.setdefault('PROFILE_REQUESTS', False)
+    app.config.setdefault('PROFILE_MIN_SECONDS', 0.0)
+    app.config.setdefault('PROFILE_DIR', None)
+    app.config.setdefault('OPS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+    app.config.setdefault('OPS_TOKEN', None)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
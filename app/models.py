@@ -1,6 +1,6 @@
 from app import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.security import password_hasher
 from datetime import datetime
 
 
@@ -22,14 +22,19 @@ class User(UserMixin, db.Model):
 
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
 
 
 class FoodEntry(db.Model):
+    # Every hot query filters on a user's entries for one day or a range of days
+    __table_args__ = (
+        db.Index('ix_food_entry_user_id_date', 'user_id', 'date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.Date, default=datetime.utcnow)
@@ -38,3 +43,116 @@ class FoodEntry(db.Model):
     protein = db.Column(db.Integer, nullable=False)
     fat = db.Column(db.Integer, nullable=False)
     carbs = db.Column(db.Integer, nullable=False)
+
+
+# Food entries older than ARCHIVE_AFTER_DAYS, moved out of food_entry by app.archive.
+# Their days stay in daily_totals, which history reads, and they are still exported.
+class FoodEntryArchive(db.Model):
+    __tablename__ = 'food_entry_archive'
+    __table_args__ = (
+        db.Index('ix_food_entry_archive_user_id_date', 'user_id', 'date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date)
+    name = db.Column(db.String(100), nullable=False)
+    calories = db.Column(db.Integer, nullable=False)
+    protein = db.Column(db.Integer, nullable=False)
+    fat = db.Column(db.Integer, nullable=False)
+    carbs = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+# Running per-user, per-day totals of the logged food entries. Kept in step with
+# FoodEntry by the session hook in app.totals so the dashboard reads a single row.
+class DailyTotals(db.Model):
+    __tablename__ = 'daily_totals'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    calories = db.Column(db.Float, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    fat = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# A named list of ingredients that is logged as a whole. The totals are summed from
+# the items when the meal is saved, so listing and logging meals need no arithmetic.
+class SavedMeal(db.Model):
+    __tablename__ = 'saved_meal'
+    # Also serves every lookup of a user's meals
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'name', name='uq_saved_meal_user_id_name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    calories = db.Column(db.Float, nullable=False, default=0)
+    protein = db.Column(db.Float, nullable=False, default=0)
+    fat = db.Column(db.Float, nullable=False, default=0)
+    carbs = db.Column(db.Float, nullable=False, default=0)
+    item_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    items = db.relationship('SavedMealItem', backref='meal', lazy=True, cascade='all, delete-orphan',
+                            order_by='SavedMealItem.position')
+
+
+# One ingredient of a saved meal, with its calories and macros for the saved amount
+class SavedMealItem(db.Model):
+    __tablename__ = 'saved_meal_item'
+    __table_args__ = (
+        db.Index('ix_saved_meal_item_meal_id_position', 'meal_id', 'position'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    meal_id = db.Column(db.Integer, db.ForeignKey('saved_meal.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    food_id = db.Column(db.Integer, nullable=True)  # Fineli food id, if picked from the catalog
+    name = db.Column(db.String(100), nullable=False)
+    grams = db.Column(db.Float, nullable=False)
+    calories = db.Column(db.Float, nullable=False)
+    protein = db.Column(db.Float, nullable=False)
+    fat = db.Column(db.Float, nullable=False)
+    carbs = db.Column(db.Float, nullable=False)
+
+
+# A unit of background work run by app.jobs. The table is the queue: runners claim
+# queued rows and write progress, results and errors back to them.
+class Job(db.Model):
+    __tablename__ = 'job'
+    # Runners look for the oldest queued job that is due
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    type = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # None for maintenance jobs
+    params = db.Column(db.Text, nullable=False, default='{}')   # JSON
+    result = db.Column(db.Text, nullable=True)                  # JSON
+    error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Float, nullable=False, default=0)  # 0 to 1
+    message = db.Column(db.String(200), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    owner = db.Column(db.String(100), nullable=True)  # host:pid of the process running the job
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+
+# Log of changes to user rows. Every worker process polls it to drop its cached
+# copies of the changed users, see app.identity.
+class UserChange(db.Model):
+    __tablename__ = 'user_change'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
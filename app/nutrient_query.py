@@ -0,0 +1,284 @@
+import re
+
+import numpy as np
+
+# Comparison operators accepted in predicates
+OPERATORS = {
+    '>=': np.greater_equal,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '<': np.less,
+    '=': np.equal,
+    '==': np.equal,
+    '!=': np.not_equal,
+}
+
+# Names accepted besides the snake_case form of every column name, e.g. saturated_fat
+ALIASES = {
+    'kcal': 'Calories',
+    'energy': 'Calories',
+    'carbohydrates': 'Carbs',
+    'fibre': 'Fiber',
+    'sugar': 'Sugars',
+    'vitamin_b1': 'Thiamin',
+    'vitamin_b2': 'Riboflavin',
+}
+
+# Limits on a single query, so a request cannot make the engine do unbounded work
+MAX_PREDICATES = 20
+MAX_SORT_KEYS = 5
+
+_NAME = r'([a-z][a-z0-9_]*)'
+_PREDICATE = re.compile(
+    rf'^{_NAME}(?:/{_NAME})?(>=|<=|==|!=|=|<|>)([-+]?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?)$')
+_SORT_KEY = re.compile(rf'^([-+]?){_NAME}(?:/{_NAME})?$')
+
+
+def snake_case(name):
+    """Turn a column name such as 'VitaminB12' into the query name 'vitamin_b12'."""
+    return re.sub(r'(?<=[a-z0-9])(?=[A-Z])', '_', name).lower()
+
+
+def _split(values):
+    """Split request values on commas and semicolons, dropping empty parts and all whitespace."""
+    parts = []
+    for value in values:
+        parts.extend(part for part in re.split(r'[,;\n]', re.sub(r'[ \t\r]', '', value.lower())) if part)
+    return parts
+
+
+class Expression:
+    """A nutrient column, or the ratio of two columns, per 100 g of food."""
+
+    def __init__(self, numerator, denominator=None):
+        self.numerator = numerator
+        self.denominator = denominator
+
+    @property
+    def label(self):
+        if self.denominator is None:
+            return snake_case(self.numerator)
+        return f'{snake_case(self.numerator)}/{snake_case(self.denominator)}'
+
+    def __eq__(self, other):
+        return isinstance(other, Expression) and self.label == other.label
+
+    def __hash__(self):
+        return hash(self.label)
+
+
+# Sort key for ordering by food name instead of a nutrient
+NAME = 'name'
+
+
+class NutrientQuery:
+    """
+    Parsed predicates and sort keys, as returned by NutrientQueryEngine.parse().
+
+    str() gives a normalized form, so equivalent queries share cache entries and ETags.
+    """
+
+    def __init__(self, predicates, sort):
+        self.predicates = predicates
+        self.sort = sort
+
+    @property
+    def expressions(self):
+        """Nutrient expressions used by the query, in order of first use."""
+        seen = {}
+        for expression, _, _ in self.predicates:
+            seen.setdefault(expression)
+        for key, _ in self.sort:
+            if key is not NAME:
+                seen.setdefault(key)
+        return list(seen)
+
+    def __str__(self):
+        where = ','.join(f'{expression.label}{op}{value!r}' for expression, op, value in self.predicates)
+        sort = ','.join(('-' if descending else '') + (key if key is NAME else key.label)
+                        for key, descending in self.sort)
+        return f'where={where}&sort={sort}'
+
+    def __eq__(self, other):
+        return isinstance(other, NutrientQuery) and str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+class NutrientQueryEngine:
+    """
+    Filters and sorts the whole catalog on any nutrient columns.
+
+    Predicates such as "fiber>=3" or "fat/kcal<=0.05" are each a single vectorized
+    comparison over a column of the table's nutrient matrix, combined into one
+    boolean mask. Results are ordered with np.lexsort on the sort keys; when only
+    the top k rows are wanted, np.argpartition on the first key narrows the rows
+    down before sorting. Built once per catalog load.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._columns = {}
+        for name in table.columns:
+            self._columns[snake_case(name)] = name
+        for alias, name in ALIASES.items():
+            if name in table.columns:
+                self._columns[alias] = name
+
+        # Position of every row in name order, used as a sort key
+        names = [str(name) for name in table.names]
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self.name_rank = np.empty(len(names), dtype=np.int64)
+        self.name_rank[order] = np.arange(len(names))
+
+    @property
+    def names(self):
+        """Query names mapped to the table columns they refer to."""
+        return dict(self._columns)
+
+    def _expression(self, numerator, denominator=None):
+        columns = []
+        for name in (numerator, denominator):
+            if name is None:
+                continue
+            if name not in self._columns:
+                raise ValueError(f'Unknown nutrient "{name}".')
+            columns.append(self._columns[name])
+        return Expression(*columns)
+
+    def parse(self, where=(), sort=()):
+        """
+        Parse predicates and sort keys from request values.
+
+        :param where: Strings of predicates separated by commas, e.g. ["fiber>=3, fat/kcal<=0.05"].
+        :param sort: Strings of sort keys separated by commas; a leading "-" sorts descending,
+            e.g. ["-protein/kcal, name"]. Defaults to sorting by name.
+        :return: NutrientQuery.
+        :raises ValueError: If a predicate, sort key or nutrient name is invalid.
+        """
+        predicates = []
+        for text in _split(where):
+            match = _PREDICATE.match(text)
+            if not match:
+                raise ValueError(f'Invalid condition "{text}", expected e.g. "fiber>=3" or "fat/kcal<=0.05".')
+            numerator, denominator, op, value = match.groups()
+            predicates.append((self._expression(numerator, denominator), op.replace('==', '='), float(value)))
+
+        keys = []
+        for text in _split(sort):
+            match = _SORT_KEY.match(text)
+            if not match:
+                raise ValueError(f'Invalid sort key "{text}", expected e.g. "-fiber" or "name".')
+            sign, numerator, denominator = match.groups()
+            key = NAME if numerator == NAME and denominator is None else self._expression(numerator, denominator)
+            keys.append((key, sign == '-'))
+
+        if len(predicates) > MAX_PREDICATES or len(keys) > MAX_SORT_KEYS:
+            raise ValueError(f'Queries are limited to {MAX_PREDICATES} conditions and {MAX_SORT_KEYS} sort keys.')
+        return NutrientQuery(predicates, keys or [(NAME, False)])
+
+    def parse_expressions(self, values):
+        """
+        Parse nutrient names or ratios separated by commas, e.g. ["sodium, fiber/kcal"].
+
+        :return: List of Expression.
+        :raises ValueError: If an entry is not a known nutrient or ratio.
+        """
+        expressions = []
+        for text in _split(values):
+            match = _SORT_KEY.match(text)
+            if not match or match.group(1):
+                raise ValueError(f'Invalid nutrient "{text}", expected e.g. "sodium" or "fiber/kcal".')
+            expressions.append(self._expression(match.group(2), match.group(3)))
+        return expressions
+
+    def values(self, expression, rows=None):
+        """
+        Return an expression's values, NaN where a value or a ratio is not available.
+
+        A ratio over zero is infinite, e.g. protein/calories for a food with protein
+        and no calories, as in the ProteinRatioIndex; only 0/0 has no ratio.
+
+        :param expression: Expression to evaluate.
+        :param rows: Row numbers to evaluate, all rows by default.
+        """
+        numerator = self.table.columns[expression.numerator]
+        if rows is not None:
+            numerator = numerator[rows]
+        if expression.denominator is None:
+            return numerator
+
+        denominator = self.table.columns[expression.denominator]
+        if rows is not None:
+            denominator = denominator[rows]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return numerator / denominator
+
+    def select(self, query, mask=None):
+        """
+        Find the rows matching all of the query's predicates.
+
+        :param query: NutrientQuery.
+        :param mask: Optional boolean array of rows to consider, e.g. a name search.
+        :return: Matching row numbers in table order.
+        """
+        result = np.ones(len(self.table), dtype=bool) if mask is None else np.array(mask, dtype=bool)
+        for expression, op, value in query.predicates:
+            values = self.values(expression)
+            result &= OPERATORS[op](values, value)
+            if op == '!=':
+                # NaN compares unequal to everything, but an unknown value is not a match
+                result &= ~np.isnan(values)
+        return np.flatnonzero(result)
+
+    def _sort_key(self, key, descending, rows):
+        values = self.name_rank[rows] if key is NAME else self.values(key, rows)
+        return -values if descending else values
+
+    def order(self, query, rows, limit=None):
+        """
+        Sort rows by the query's sort keys, with the food name as the final tie-break.
+
+        Rows without a value for a sort key come last.
+
+        :param query: NutrientQuery.
+        :param rows: Row numbers, as returned by select().
+        :param limit: Return only the first limit rows.
+        :return: Row numbers in order.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        keys = list(query.sort)
+        if all(key is not NAME for key, _ in keys):
+            keys.append((NAME, False))
+
+        if limit is not None and limit < len(rows):
+            # Keep the rows whose first key is within the top k, including ties
+            primary = self._sort_key(*keys[0], rows)
+            threshold = primary[np.argpartition(primary, limit - 1)[limit - 1]]
+            if not np.isnan(threshold):
+                rows = rows[primary <= threshold]
+
+        # np.lexsort sorts by the last key first
+        order = np.lexsort([self._sort_key(key, descending, rows) for key, descending in reversed(keys)])
+        rows = rows[order]
+        return rows if limit is None else rows[:limit]
+
+    def run(self, query, limit=None, mask=None):
+        """Select and order the rows for a query. See select() and order()."""
+        return self.order(query, self.select(query, mask), limit)
+
+    def records(self, rows, expressions):
+        """
+        Return the values of expressions for rows, rounded for display.
+
+        :param rows: Row numbers.
+        :param expressions: Expressions to include, e.g. NutrientQuery.expressions.
+        :return: List of dictionaries of expression label to value, None where not available.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {}
+        for expression in expressions:
+            values = np.round(np.asarray(self.values(expression, rows), dtype=np.float64), 2)
+            columns[expression.label] = [None if np.isnan(value) else value for value in values.tolist()]
+        return [{label: values[i] for label, values in columns.items()} for i in range(len(rows))]
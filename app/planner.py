@@ -0,0 +1,92 @@
+import numpy as np
+
+# Order of the macro columns in the nutrient matrix and in the remaining-macros vector
+MACROS = ('calories', 'protein', 'fat', 'carbs')
+MACRO_COLUMNS = ('Calories', 'Protein', 'Fat', 'Carbs')
+
+# Smallest remaining amount each macro is scaled by, so that a nearly closed gap
+# (e.g. 2 g of fat) does not dominate the fit
+SCALE_FLOOR = np.array([100.0, 10.0, 10.0, 10.0])
+
+# Portion limits in grams and the step suggested portions are rounded to
+MIN_GRAMS = 20.0
+MAX_GRAMS = 400.0
+GRAM_STEP = 5.0
+
+
+class MealPlanner:
+    """
+    Suggests foods and portion sizes that close the gap to the daily goals.
+
+    The catalog's calories and macros are kept as one (foods x 4) matrix per gram,
+    built once per catalog load. Each suggestion is a vectorized pass over the whole
+    matrix: for every food the portion that best fits the remaining macros is solved
+    in closed form, and the food leaving the smallest weighted squared error is
+    picked. The remaining macros are then reduced and the next food is chosen.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        matrix = np.column_stack([np.asarray(table.columns[name], dtype=np.float64) for name in MACRO_COLUMNS])
+
+        # Foods without an energy value cannot be planned with, trace amounts count as zero
+        self.rows = np.flatnonzero(~np.isnan(matrix[:, 0]) & (matrix[:, 0] > 0))
+        self.per_gram = np.nan_to_num(matrix[self.rows]) / 100.0
+
+    def suggest(self, remaining, count=3, exclude_rows=()):
+        """
+        Pick foods and portions that fill the remaining macros.
+
+        :param remaining: Dictionary with the calories, protein, fat and carbs left for the day.
+        :param count: Maximum number of foods to suggest.
+        :param exclude_rows: Catalog rows that must not be suggested.
+        :return: Tuple of the list of suggestions and the macros left after eating them.
+        """
+        target = np.array([max(float(remaining[name]), 0.0) for name in MACROS])
+        suggestions = []
+        if not target.any() or not len(self.rows):
+            return suggestions, dict(zip(MACROS, target.round(1).tolist()))
+
+        # Weight each macro by the size of its gap so all four count equally
+        weights = 1.0 / np.maximum(target, SCALE_FLOOR) ** 2
+        weighted = self.per_gram * weights
+
+        # Constant per food: sum_j w_j * m_ij^2
+        denominator = np.einsum('ij,ij->i', weighted, self.per_gram)
+        usable = denominator > 0
+        if len(exclude_rows):
+            usable &= ~np.isin(self.rows, np.asarray(exclude_rows))
+
+        for _ in range(count):
+            error_before = float(weights @ (target ** 2))
+
+            # Best portion for every food at once, clipped to a sensible serving size
+            with np.errstate(divide='ignore', invalid='ignore'):
+                grams = (weighted @ target) / denominator
+            grams = np.clip(np.round(np.nan_to_num(grams) / GRAM_STEP) * GRAM_STEP, MIN_GRAMS, MAX_GRAMS)
+
+            # Weighted squared error left after eating each food's portion
+            residual = target[np.newaxis, :] - grams[:, np.newaxis] * self.per_gram
+            errors = np.einsum('ij,j->i', residual ** 2, weights)
+            errors[~usable] = np.inf
+
+            best = int(np.argmin(errors))
+            if not np.isfinite(errors[best]) or errors[best] >= error_before:
+                break
+
+            portion = grams[best]
+            eaten = portion * self.per_gram[best]
+            row = int(self.rows[best])
+            suggestions.append({
+                'id': int(self.table.ids[row]),
+                'name': str(self.table.names[row]),
+                'grams': float(portion),
+                **dict(zip(MACROS, eaten.round(1).tolist())),
+            })
+
+            target = np.maximum(target - eaten, 0.0)
+            usable[best] = False
+            if not target.any():
+                break
+
+        return suggestions, dict(zip(MACROS, target.round(1).tolist()))
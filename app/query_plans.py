@@ -0,0 +1,96 @@
+import re
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from app.history import daily_totals_query
+from app.models import DailyTotals, FoodEntry, FoodEntryArchive, Job, SavedMeal, SavedMealItem, User, UserChange
+
+# A full pass over one of these tables is a regression; small lookup tables are not listed
+WATCHED_TABLES = ('food_entry', 'food_entry_archive', 'daily_totals', 'user', 'saved_meal', 'saved_meal_item', 'job',
+                  'user_change')
+
+# Matches plan steps such as "SCAN food_entry" or "SCAN TABLE food_entry USING INDEX ..."
+_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)')
+
+
+def hot_queries():
+    """
+    Statements issued on the request path, keyed by a short description.
+
+    The parameter values are placeholders; only the shape of each query matters
+    for the plan.
+    """
+    today = datetime.utcnow().date()
+    return {
+        'home/log_food: entries for a user and day':
+            select(FoodEntry).where(FoodEntry.user_id == 1, FoodEntry.date == today),
+        'home: daily totals for a user and day':
+            select(DailyTotals).where(DailyTotals.user_id == 1, DailyTotals.date == today),
+        'history: per-day totals for a date range':
+            daily_totals_query(1, today - timedelta(days=365), today),
+        'export: archived entries of a user':
+            select(FoodEntryArchive).where(FoodEntryArchive.user_id == 1)
+            .order_by(FoodEntryArchive.date, FoodEntryArchive.id),
+        'archive: old entries of a user':
+            select(FoodEntry.id).where(FoodEntry.user_id == 1, FoodEntry.date < today).limit(500),
+        'meals: saved meals of a user':
+            select(SavedMeal).where(SavedMeal.user_id == 1).order_by(SavedMeal.name),
+        'log_saved_meal: ingredients of a meal':
+            select(SavedMealItem).where(SavedMealItem.meal_id == 1).order_by(SavedMealItem.position),
+        'job runner: due queued jobs':
+            select(Job.id).where(Job.status == 'queued', Job.run_after <= today)
+            .order_by(Job.run_after, Job.id).limit(10),
+        'login: user by email':
+            select(User).where(User.email == 'user@example.com'),
+        'load_user: user by id':
+            select(User).where(User.id == 1),
+        'load_user: user changes since the last sync':
+            select(UserChange.id, UserChange.user_id).where(UserChange.id > 1),
+        'set_goals: expired user changes':
+            select(UserChange.id).where(UserChange.changed_at < today),
+    }
+
+
+def explain(connection, statement):
+    """
+    Return SQLite's EXPLAIN QUERY PLAN steps for a statement.
+
+    :param connection: SQLAlchemy connection to a SQLite database.
+    :param statement: Select statement to explain.
+    :return: List of the plan's detail strings.
+    """
+    compiled = statement.compile(dialect=connection.dialect)
+    params = compiled.construct_params()
+    values = tuple(_plain(params[name]) for name in compiled.positiontup)
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', values).fetchall()
+    return [row[-1] for row in rows]
+
+
+def _plain(value):
+    # The driver only sees the placeholder values, store dates the way SQLite does
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def full_scans(plan):
+    """Return the watched tables that a plan reads with a full table or index scan."""
+    scanned = []
+    for step in plan:
+        match = _SCAN.match(step)
+        if match and match.group(1) in WATCHED_TABLES:
+            scanned.append(match.group(1))
+    return scanned
+
+
+def check_query_plans(connection):
+    """
+    Explain every hot query and report the ones that scan a watched table.
+
+    :param connection: SQLAlchemy connection to a SQLite database.
+    :return: List of (description, plan, scanned tables) tuples, one per query.
+    """
+    results = []
+    for description, statement in hot_queries().items():
+        plan = explain(connection, statement)
+        results.append((description, plan, full_scans(plan)))
+    return results
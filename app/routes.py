@@ -1,14 +1,32 @@
-from flask import Blueprint, render_template, url_for, flash, redirect, request
+from flask import (Blueprint, Response, current_app, make_response, render_template, stream_template,
+                   stream_with_context, url_for, flash, redirect, request, jsonify)
 from flask_login import login_user, current_user, logout_user, login_required
+import math
+import os
+import uuid
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from app import db
-from app.models import User, FoodEntry
+from app.models import User, FoodEntry, DailyTotals, Job, SavedMeal
 from app.forms import RegistrationForm, LoginForm
-from app.data_utils import load_food_data, get_high_protein_options
+from app.catalog import food_catalog, query_cache
+from app.data_utils import COLUMN_UNITS, ProteinRatioIndex
+from app.metrics import ops_required, registry
+from app.identity import invalidate_user, record_user_change, remember_user
+from app.security import HashingBusy, password_hasher
+from app.http_cache import CATALOG_MAX_AGE, cache_headers, make_etag, not_modified
+from app.history import PERIODS, build_history, resolve_range
+from app.food_log_io import import_food_entries, iter_csv_rows, iter_export_csv, iter_json_rows
+from app.meals import FORM_ITEM_ROWS, log_meal, parse_meal_items, save_meal
+from app.jobs import FINISHED, job_runner, job_status
 
 # Define the Blueprint
 bp = Blueprint('main', __name__)
 
+# Page sizes for the paginated JSON API
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
 @bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
@@ -16,28 +34,39 @@ def register():
     form = RegistrationForm()
     if form.validate_on_submit():
         try:
-            existing_user = User.query.filter(
-                (User.username == form.username.data) | (User.email == form.email.data)).first()
-            if existing_user:
-                flash('A user with this username or email already exists. Please choose another.', 'danger')
-                return redirect(url_for('main.register'))
-
+            # A single insert; the unique constraints reject taken usernames and emails
             user = User(username=form.username.data, email=form.email.data)
             user.set_password(form.password.data)
             db.session.add(user)
             db.session.commit()
             flash('Your account has been created! You can now log in.', 'success')
             return redirect(url_for('main.login'))
-        except Exception as e:
+        except IntegrityError as e:
+            db.session.rollback()
+            _report_taken_fields(form, str(e.orig))
+            flash('A user with this username or email already exists. Please choose another.', 'danger')
+        except HashingBusy:
+            db.session.rollback()
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('register.html', title='Register', form=form), 503
+        except Exception:
             db.session.rollback()
             flash('An error occurred while creating your account. Please try again.', 'danger')
-            print(f"Error: {e}")
+            current_app.logger.exception('Could not create account for %s', form.username.data)
     else:
         if form.errors:
             flash('Registration form contains errors. Please check your inputs.', 'danger')
-            print(form.errors)
+            current_app.logger.info('Registration form errors: %s', form.errors)
     return render_template('register.html', title='Register', form=form)
 
+
+def _report_taken_fields(form, message):
+    """Attach an error to the fields named in a unique constraint violation."""
+    if 'username' in message:
+        form.username.errors.append('That username is taken. Please choose a different one.')
+    if 'email' in message:
+        form.email.errors.append('That email is taken. Please choose a different one.')
+
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -45,8 +74,21 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('login.html', title='Login', form=form), 503
+        if valid:
+            # Move old hashes to the configured method while the password is at hand
+            if password_hasher.needs_rehash(user.password_hash):
+                try:
+                    user.set_password(form.password.data)
+                    db.session.commit()
+                except HashingBusy:
+                    pass
             login_user(user, remember=True)
+            remember_user(user)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('main.home'))
         else:
@@ -65,28 +107,71 @@ def home():
     today = datetime.utcnow().date()
     user = current_user
 
-    food_entries_today = FoodEntry.query.filter_by(user_id=user.id, date=today).all()
-
-    total_calories = sum(entry.calories for entry in food_entries_today)
-    total_protein = sum(entry.protein for entry in food_entries_today)
-    total_fat = sum(entry.fat for entry in food_entries_today)
-    total_carbs = sum(entry.carbs for entry in food_entries_today)
+    # Any added entry changes the newest id or the count, so the page can be
+    # revalidated without loading the entries themselves
+    latest_id, entry_count = db.session.execute(
+        db.select(db.func.max(FoodEntry.id), db.func.count())
+        .where(FoodEntry.user_id == user.id, FoodEntry.date == today)
+    ).one()
+    left = _macros_left(user, today)
+    goals = (user.daily_calorie_goal, user.daily_protein_goal, user.daily_fat_goal, user.daily_carbs_goal)
+    etag = make_etag('home', user.id, user.username, today, latest_id, entry_count, goals, left)
+    response = not_modified(etag)
+    if response is not None:
+        return response
 
-    calories_left = user.daily_calorie_goal - total_calories
-    protein_left = user.daily_protein_goal - total_protein
-    fat_left = user.daily_fat_goal - total_fat
-    carbs_left = user.daily_carbs_goal - total_carbs
+    food_entries_today = FoodEntry.query.filter_by(user_id=user.id, date=today).all()
 
-    return render_template('home.html', today=today,
+    response = make_response(render_template('home.html', today=today,
                            calorie_goal=user.daily_calorie_goal,
-                           calories_left=calories_left,
+                           calories_left=left['calories'],
                            protein_goal=user.daily_protein_goal,
-                           protein_left=protein_left,
+                           protein_left=left['protein'],
                            fat_goal=user.daily_fat_goal,
-                           fat_left=fat_left,
+                           fat_left=left['fat'],
                            carbs_goal=user.daily_carbs_goal,
-                           carbs_left=carbs_left,
-                           food_entries=food_entries_today)
+                           carbs_left=left['carbs'],
+                           food_entries=food_entries_today))
+    return cache_headers(response, etag)
+
+
+def _macros_left(user, day):
+    """Return what is left of the user's goals for a day, from the maintained daily totals."""
+    totals = db.session.get(DailyTotals, (user.id, day))
+    return {
+        'calories': user.daily_calorie_goal - (totals.calories if totals else 0),
+        'protein': user.daily_protein_goal - (totals.protein if totals else 0),
+        'fat': user.daily_fat_goal - (totals.fat if totals else 0),
+        'carbs': user.daily_carbs_goal - (totals.carbs if totals else 0),
+    }
+
+
+def _meal_suggestions(params):
+    """Run the meal planner for the current user's remaining macros today."""
+    count = min(max(int(params.get('count', 3)), 1), 6)
+    left = _macros_left(current_user, datetime.utcnow().date())
+    suggestions, left_after = food_catalog.get().meal_planner.suggest(left, count)
+    return {'remaining': left, 'suggestions': suggestions, 'remaining_after': left_after}
+
+
+@bp.route('/suggest')
+@login_required
+def suggest_meal():
+    try:
+        plan = _meal_suggestions(request.args)
+    except ValueError:
+        flash('Invalid input. Please check your values.', 'danger')
+        plan = _meal_suggestions({})
+    return render_template('suggest.html', plan=plan)
+
+
+@bp.route('/api/suggest')
+@login_required
+def suggest_meal_api():
+    try:
+        return jsonify(_meal_suggestions(request.args))
+    except ValueError:
+        return jsonify(error='Invalid query parameters.'), 400
 
 @bp.route('/log_food', methods=['GET', 'POST'])
 @login_required
@@ -117,6 +202,12 @@ def log_food():
             total_fat = (fat_per_100g / 100) * amount
             total_carbs = (carbs_per_100g / 100) * amount
 
+            # float() accepts "nan" and "inf", and huge values can overflow to inf
+            values = (calories_per_100g, protein_per_100g, fat_per_100g, carbs_per_100g, amount,
+                      total_calories, total_protein, total_fat, total_carbs)
+            if not all(math.isfinite(value) and value >= 0 for value in values):
+                raise ValueError('values must be finite, non-negative numbers')
+
             entry = FoodEntry(
                 user_id=current_user.id,
                 name=name,
@@ -140,17 +231,108 @@ def log_food():
     return render_template('log_food.html', food_entries=food_entries_today)
 
 
+@bp.route('/log_food/catalog', methods=['POST'])
+@login_required
+def log_catalog_food():
+    # Log a Fineli food by id, the values per 100 g come from the catalog
+    try:
+        food_id = int(request.form.get('food_id', ''))
+        amount = float(request.form.get('amount', ''))
+    except ValueError:
+        flash('Please choose a food and enter a valid amount.', 'danger')
+        return redirect(url_for('main.log_food'))
+
+    table = food_catalog.get()
+    row = table.row_for_id(food_id)
+    if row is None or not math.isfinite(amount) or amount <= 0:
+        flash('Please choose a food and enter a valid amount.', 'danger')
+        return redirect(url_for('main.log_food'))
+
+    per_100g = table.per_100g(row)
+    entry = FoodEntry(
+        user_id=current_user.id,
+        name=str(table.names[row])[:100],
+        calories=per_100g['calories'] / 100 * amount,
+        protein=per_100g['protein'] / 100 * amount,
+        fat=per_100g['fat'] / 100 * amount,
+        carbs=per_100g['carbs'] / 100 * amount,
+        date=datetime.utcnow().date()
+    )
+    db.session.add(entry)
+    db.session.commit()
+    flash('Food item logged successfully', 'success')
+    return redirect(url_for('main.log_food'))
+
+
+@bp.route('/meals', methods=['GET', 'POST'])
+@login_required
+def meals():
+    if request.method == 'POST':
+        name = request.form.get('meal_name', '').strip()
+        try:
+            if not name:
+                raise ValueError('Please give the meal a name.')
+            items = parse_meal_items(request.form, food_catalog.get())
+            save_meal(db.session, current_user.id, name, items)
+            db.session.commit()
+            flash(f'Saved meal "{name}"', 'success')
+            return redirect(url_for('main.meals'))
+        except ValueError as e:
+            flash(str(e), 'danger')
+        except IntegrityError:
+            db.session.rollback()
+            flash(f'You already have a meal called "{name}". Please choose another name.', 'danger')
+
+    saved_meals = SavedMeal.query.filter_by(user_id=current_user.id).order_by(SavedMeal.name).all()
+    return render_template('meals.html', meals=saved_meals, item_rows=FORM_ITEM_ROWS)
+
+
+@bp.route('/meals/<int:meal_id>/log', methods=['POST'])
+@login_required
+def log_saved_meal(meal_id):
+    meal = SavedMeal.query.filter_by(id=meal_id, user_id=current_user.id).first_or_404()
+    try:
+        servings = float(request.form.get('servings') or 1)
+        if not 0 < servings <= 100:
+            raise ValueError
+    except ValueError:
+        flash('Please enter a valid number of servings.', 'danger')
+        return redirect(url_for('main.meals'))
+
+    # All of the meal's entries and the day's totals in one transaction
+    name = meal.name
+    count = log_meal(db.session, meal, datetime.utcnow().date(), servings)
+    db.session.commit()
+    flash(f'Logged {name} ({count} items)', 'success')
+    return redirect(url_for('main.home'))
+
+
+@bp.route('/meals/<int:meal_id>/delete', methods=['POST'])
+@login_required
+def delete_saved_meal(meal_id):
+    meal = SavedMeal.query.filter_by(id=meal_id, user_id=current_user.id).first_or_404()
+    name = meal.name
+    db.session.delete(meal)
+    db.session.commit()
+    flash(f'Deleted meal "{name}"', 'success')
+    return redirect(url_for('main.meals'))
+
+
 @bp.route('/set_goals', methods=['GET', 'POST'])
 @login_required
 def set_goals():
     if request.method == 'POST':
         try:
-            current_user.daily_calorie_goal = int(request.form['calorie_goal'])
-            current_user.daily_protein_goal = int(request.form['protein_goal'])
-            current_user.daily_fat_goal = int(request.form['fat_goal'])
-            current_user.daily_carbs_goal = int(request.form['carbs_goal'])
-
+            # current_user is a cached copy, so update the row itself
+            user = db.session.get(User, current_user.id)
+            user.daily_calorie_goal = int(request.form['calorie_goal'])
+            user.daily_protein_goal = int(request.form['protein_goal'])
+            user.daily_fat_goal = int(request.form['fat_goal'])
+            user.daily_carbs_goal = int(request.form['carbs_goal'])
+
+            record_user_change(db.session, user.id)
             db.session.commit()
+            invalidate_user(user.id)
             flash('Goals updated successfully', 'success')
         except ValueError:
             flash('Please enter valid numbers for all fields.', 'danger')
@@ -159,35 +341,352 @@ def set_goals():
     return render_template('set_goals.html')
 
 
-@bp.route('/high_protein', methods=['GET', 'POST'])
+@bp.route('/history')
 @login_required
-def high_protein():
-    df = load_food_data()
-    high_protein_options = []
+def history():
+    period = request.args.get('period', 'week')
+    try:
+        start, end = resolve_range(period, request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        flash(str(e), 'danger')
+        period = 'week'
+        start, end = resolve_range(period)
+
+    return render_template('history.html', period=period, periods=PERIODS,
+                           history=build_history(current_user, start, end))
+
+
+@bp.route('/api/history')
+@login_required
+def history_api():
+    try:
+        start, end = resolve_range(request.args.get('period', 'week'),
+                                   request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    return jsonify(build_history(current_user, start, end))
 
+
+@bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_food_log():
     if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Please choose a file to import.', 'danger')
+            return redirect(url_for('main.import_food_log'))
+
+        extension = upload.filename.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            rows = iter_csv_rows(upload.stream)
+        elif extension in ('json', 'jsonl'):
+            rows = iter_json_rows(upload.stream)
+        else:
+            flash('Only .csv, .json and .jsonl files can be imported.', 'danger')
+            return redirect(url_for('main.import_food_log'))
+
+        # Large files are imported in the background, the page follows the job's progress
+        if (request.content_length or 0) > current_app.config['IMPORT_BACKGROUND_BYTES']:
+            directory = os.path.join(current_app.instance_path, 'uploads')
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{uuid.uuid4().hex}.{extension}')
+            upload.save(path)
+            # A retry would import the rows committed by the failed attempt again
+            try:
+                job = job_runner.submit('import_food_log', {'user_id': current_user.id, 'path': path,
+                                                            'file_format': extension}, current_user.id, max_attempts=1)
+            except Exception:
+                os.remove(path)
+                raise
+            return redirect(url_for('main.job_page', job_id=job.id))
+
         try:
-            min_protein_ratio = float(request.form.get('min_protein_ratio', 0.1))
-            sort_by = request.form.get('sort_by', 'protein_to_calories')
-            search_term = request.form.get('search_term', '').lower()
+            result = import_food_entries(db.session, current_user.id, rows)
+        except ValueError as e:
+            # Only batches committed before the error was found are kept
+            db.session.rollback()
+            flash(f'Could not read the file: {e}', 'danger')
+            return redirect(url_for('main.import_food_log'))
+
+        return render_template('import.html', result=result)
+
+    return render_template('import.html', result=None)
+
+
+def _user_job(job_id):
+    """Return one of the current user's jobs, or abort with 404."""
+    return Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+
+
+@bp.route('/jobs/<int:job_id>')
+@login_required
+def job_page(job_id):
+    job = _user_job(job_id)
+    return render_template('job.html', job=job_status(job), finished=job.status in FINISHED)
+
+
+@bp.route('/api/jobs/<int:job_id>')
+@login_required
+def job_api(job_id):
+    return jsonify(job_status(_user_job(job_id)))
+
+
+@bp.route('/api/maintenance/jobs/<int:job_id>')
+@ops_required
+def maintenance_job_api(job_id):
+    # Maintenance jobs belong to no user, so they are reported to the operators only
+    return jsonify(job_status(Job.query.filter_by(id=job_id, user_id=None).first_or_404()))
+
+
+@bp.route('/export.csv')
+@login_required
+def export_food_log():
+    rows = iter_export_csv(db.session, current_user.id)
+    return Response(stream_with_context(rows), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=food_log.csv'})
+
+
+# Sort orders of the high-protein page as nutrient query sort keys
+HIGH_PROTEIN_SORTS = {'protein_to_calories': '-protein/calories', 'name': 'name'}
+
+
+def _high_protein_params(table, params):
+    """
+    Read and normalize the high-protein query parameters.
+
+    Extra nutrient conditions ("where", e.g. "fiber>=3, sodium<200") and sort keys
+    ("order", e.g. "-fiber, name") turn the query into a nutrient query that also
+    applies the protein ratio.
+
+    :param table: FoodTable from the catalog.
+    :param params: request.form or request.args.
+    :return: Tuple of the minimum ratio, the sort key, the lowercased search term and
+        the NutrientQuery, or None when there are no extra conditions or sort keys.
+    :raises ValueError: If the ratio is not a finite number or the nutrient query is invalid.
+    """
+    min_protein_ratio = float(params.get('min_protein_ratio', 0.1))
+    if not math.isfinite(min_protein_ratio):
+        raise ValueError('The minimum protein ratio must be a finite number')
+    sort_by = params.get('sort_by', 'protein_to_calories')
+    if sort_by not in ProteinRatioIndex.SORT_KEYS:
+        # Unknown orders share the default's cache entry and ETag
+        sort_by = 'protein_to_calories'
+    search_term = params.get('search_term', '').strip().lower()
+
+    query = None
+    where = params.getlist('where')
+    order = params.get('order', '').strip()
+    if any(value.strip() for value in where) or order:
+        query = table.nutrient_query.parse(
+            [f'protein/calories>={min_protein_ratio!r}'] + where,
+            [order or HIGH_PROTEIN_SORTS[sort_by]])
+    return min_protein_ratio, sort_by, search_term, query
+
+
+def query_high_protein(table, params):
+    """
+    Run a high-protein query from request parameters.
+
+    :param table: FoodTable from the catalog.
+    :param params: request.form or request.args.
+    :return: Tuple of the matching row numbers, in order, the sort key used and the NutrientQuery or None.
+    """
+    min_protein_ratio, sort_by, search_term, query = _high_protein_params(table, params)
+
+    # A handful of filter combinations make up most requests
+    key = (table.version, min_protein_ratio, sort_by, search_term, query)
+    rows = query_cache.get(key)
+    if rows is not None:
+        return rows, sort_by, query
+
+    if query is not None:
+        mask = table.search_index.mask(search_term) if search_term else None
+        rows = table.nutrient_query.run(query, mask=mask)
+    else:
+        # Rows meeting the ratio, already in the selected order
+        rows = table.protein_index.query(min_protein_ratio, sort_by)
+
+        # Filter by search term
+        if search_term:
+            rows = rows[table.search_index.mask(search_term)[rows]]
 
-            # Get high protein options
-            high_protein_options = get_high_protein_options(df, min_protein_ratio)
+    # Cached arrays are shared between requests
+    rows.setflags(write=False)
+    query_cache.set(key, rows)
+    return rows, sort_by, query
 
-            # Filter by search term
-            if search_term:
-                high_protein_options = [item for item in high_protein_options if search_term in item['Name'].lower()]
 
-            # Sort by selected criteria
-            if sort_by == 'protein_to_calories':
-                high_protein_options = sorted(high_protein_options, key=lambda x: x['Protein_to_Calories'],
-                                              reverse=True)
-            elif sort_by == 'name':
-                high_protein_options = sorted(high_protein_options, key=lambda x: x['Name'])
+def _extra_expressions(query):
+    """Nutrient expressions of a query that the high-protein table does not already show."""
+    if query is None:
+        return []
+    return [expression for expression in query.expressions if expression.label != 'protein/calories']
 
+
+@bp.route('/high_protein', methods=['GET', 'POST'])
+@login_required
+def high_protein():
+    # Queries are GET requests so results can be bookmarked and cached
+    if request.method == 'POST':
+        # Keep every value of repeated fields such as "where"
+        return redirect(url_for('main.high_protein', **request.form.to_dict(flat=False)))
+
+    table = food_catalog.get()
+    rows = []
+    query = None
+    etag = None
+
+    if 'min_protein_ratio' in request.args:
+        try:
+            params = _high_protein_params(table, request.args)
         except ValueError:
             flash('Invalid input. Please check your values.', 'danger')
+        else:
+            # The result only depends on the catalog data and the query
+            etag = make_etag('high_protein', table.version, params)
+            response = not_modified(etag, CATALOG_MAX_AGE)
+            if response is not None:
+                return response
+            rows, _, query = query_high_protein(table, request.args)
+
+    # Stream the page so the table is rendered a chunk of rows at a time
+    expressions = _extra_expressions(query)
+    response = Response(stream_template(
+        'high_protein.html', result_count=len(rows),
+        extra_columns=[expression.label for expression in expressions],
+        high_protein_options=table.protein_index.iter_records(rows, expressions=expressions)))
+    if etag:
+        cache_headers(response, etag, CATALOG_MAX_AGE)
+    return response
+
+
+@bp.route('/api/high_protein')
+@login_required
+def high_protein_api():
+    table = food_catalog.get()
+
+    try:
+        rows, sort_by, query = query_high_protein(table, request.args)
+        page_size = min(max(int(request.args.get('page_size', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        page = max(int(request.args.get('page', 1)), 1)
+        cursor = request.args.get('after')
+        if cursor:
+            version, _, after = cursor.partition(':')
+            after = int(after)
+    except ValueError:
+        return jsonify(error='Invalid query parameters.'), 400
+
+    if cursor:
+        # Row numbers are only meaningful for the catalog version they came from
+        if version != table.version or not 0 <= after < len(table):
+            return jsonify(error='Cursor is no longer valid, restart from the first page.'), 400
+        if query is not None:
+            return jsonify(error='Cursors only work without where and order, use page instead.'), 400
+        start = table.protein_index.keyset_start(rows, after, sort_by)
+    else:
+        start = (page - 1) * page_size
 
-    return render_template('high_protein.html', high_protein_options=high_protein_options)
+    page_rows = rows[start:start + page_size]
+    next_cursor = None
+    if start + page_size < len(rows) and query is None:
+        next_cursor = f'{table.version}:{int(page_rows[-1])}'
 
+    return jsonify(
+        items=list(table.protein_index.iter_records(page_rows, expressions=_extra_expressions(query))),
+        total=len(rows),
+        page_size=page_size,
+        next_cursor=next_cursor,
+        catalog_version=table.version,
+    )
 
+
+@bp.route('/api/foods/query')
+@login_required
+def nutrient_query_api():
+    table = food_catalog.get()
+    engine = table.nutrient_query
+
+    try:
+        query = engine.parse(request.args.getlist('where'), request.args.getlist('sort'))
+        fields = engine.parse_expressions(request.args.getlist('fields'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify(error='Invalid query parameters.'), 400
+    search_term = request.args.get('search_term', '').strip().lower()
+
+    etag = make_etag('foods_query', table.version, str(query), [field.label for field in fields], limit, search_term)
+    response = not_modified(etag, CATALOG_MAX_AGE)
+    if response is not None:
+        return response
+
+    matches = engine.select(query, table.search_index.mask(search_term) if search_term else None)
+    rows = engine.order(query, matches, limit)
+
+    expressions = query.expressions + [field for field in fields if field not in query.expressions]
+    items = [
+        {'id': int(table.ids[row]), 'name': str(table.names[row]), **values}
+        for row, values in zip(rows.tolist(), engine.records(rows, expressions))
+    ]
+    response = jsonify(items=items, total=len(matches), limit=limit, query=str(query),
+                       catalog_version=table.version)
+    return cache_headers(response, etag, CATALOG_MAX_AGE)
+
+
+@bp.route('/api/nutrients')
+@login_required
+def nutrients_api():
+    table = food_catalog.get()
+    return jsonify([
+        {'name': name, 'column': column, 'unit': COLUMN_UNITS.get(column)}
+        for name, column in table.nutrient_query.names.items()
+    ])
+
+
+@bp.route('/metrics')
+@ops_required
+def metrics():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/catalog/stats')
+@login_required
+def catalog_stats():
+    return jsonify(dict(food_catalog.stats(), query_cache=query_cache.stats()))
+
+
+@bp.route('/foods/autocomplete')
+@login_required
+def food_autocomplete():
+    term = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        return jsonify(error='Invalid query parameters.'), 400
+
+    if not term:
+        return jsonify([])
+
+    table = food_catalog.get()
+    columns = table.columns
+    suggestions = [
+        {
+            'id': int(table.ids[row]),
+            'name': str(table.names[row]),
+            'calories_per_100g': _rounded(columns['Calories'][row]),
+            'protein_per_100g': _rounded(columns['Protein'][row]),
+            'fat_per_100g': _rounded(columns['Fat'][row]),
+            'carbs_per_100g': _rounded(columns['Carbs'][row]),
+        }
+        for row in table.search_index.suggest(term, limit)
+    ]
+    return jsonify(suggestions)
+
+
+def _rounded(value):
+    # NaN is not valid JSON, report missing values as null
+    value = float(value)
+    return None if math.isnan(value) else round(value, 2)
@@ -0,0 +1,135 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+
+# Longest n-gram stored in the inverted index
+MAX_GRAM = 3
+
+_WORD_SPLIT = re.compile(r'[^\w]+')
+
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class NameSearchIndex:
+    """
+    Search structures over the food names, built once per catalog load.
+
+    Substring lookups use an inverted index of every 1-, 2- and 3-gram in the
+    lowercased names: a term of up to three characters is a single posting list,
+    longer terms intersect the posting lists of their trigrams and only the few
+    remaining candidates are checked. Prefix lookups bisect a sorted list of the
+    full names and of every word within them.
+    """
+
+    def __init__(self, names):
+        self.lower_names = [str(name).lower() for name in names]
+
+        postings = defaultdict(list)
+        word_entries = []
+        for row, name in enumerate(self.lower_names):
+            for size in range(1, MAX_GRAM + 1):
+                for gram in _grams(name, size):
+                    postings[gram].append(row)
+
+            for word in set(_WORD_SPLIT.split(name)):
+                if word and not name.startswith(word):
+                    word_entries.append((word, row))
+
+        # Rows were appended in ascending order, so every posting list is sorted
+        self._postings = {gram: np.array(rows, dtype=np.int32) for gram, rows in postings.items()}
+
+        name_entries = sorted((name, row) for row, name in enumerate(self.lower_names))
+        self._name_keys = [key for key, _ in name_entries]
+        self._name_rows = [row for _, row in name_entries]
+
+        word_entries.sort()
+        self._word_keys = [key for key, _ in word_entries]
+        self._word_rows = [row for _, row in word_entries]
+
+    def __len__(self):
+        return len(self.lower_names)
+
+    def contains(self, term):
+        """
+        Find the rows whose name contains term, ignoring case.
+
+        :param term: Text to search for.
+        :return: Sorted array of row numbers.
+        """
+        term = term.lower()
+        if not term:
+            return np.arange(len(self), dtype=np.int32)
+        if len(term) <= MAX_GRAM:
+            return self._postings.get(term, np.empty(0, dtype=np.int32))
+
+        lists = []
+        for gram in _grams(term, MAX_GRAM):
+            rows = self._postings.get(gram)
+            if rows is None:
+                return np.empty(0, dtype=np.int32)
+            lists.append(rows)
+
+        # Intersect the shortest lists first so the candidate set shrinks quickly
+        lists.sort(key=len)
+        candidates = lists[0]
+        for rows in lists[1:]:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+            if not len(candidates):
+                break
+
+        names = self.lower_names
+        return np.array([row for row in candidates.tolist() if term in names[row]], dtype=np.int32)
+
+    def mask(self, term):
+        """Return a boolean array that is True for every row whose name contains term."""
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self.contains(term)] = True
+        return mask
+
+    def prefix(self, prefix, limit=None):
+        """
+        Find the rows whose name, or any word in it, starts with prefix.
+
+        :param prefix: Text the name or word must start with, ignoring case.
+        :param limit: Maximum number of rows to return.
+        :return: List of row numbers, full-name matches first, each in alphabetical order.
+        """
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+
+        rows = []
+        seen = set()
+        for keys, key_rows in ((self._name_keys, self._name_rows), (self._word_keys, self._word_rows)):
+            i = bisect_left(keys, prefix)
+            while i < len(keys) and keys[i].startswith(prefix):
+                row = key_rows[i]
+                if row not in seen:
+                    seen.add(row)
+                    rows.append(row)
+                    if len(rows) == limit:
+                        return rows
+                i += 1
+        return rows
+
+    def suggest(self, term, limit=10):
+        """
+        Rank names for autocompletion: prefix matches first, then other substring matches.
+
+        :param term: Text typed so far.
+        :param limit: Maximum number of rows to return.
+        :return: List of row numbers.
+        """
+        rows = self.prefix(term, limit)
+        if len(rows) < limit:
+            seen = set(rows)
+            for row in self.contains(term).tolist():
+                if row not in seen:
+                    rows.append(row)
+                    if len(rows) == limit:
+                        break
+        return rows
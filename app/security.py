@@ -0,0 +1,97 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords with a configurable method, on a bounded worker pool.
+
+    The method is any werkzeug method string, e.g. "scrypt:32768:8:1" or
+    "pbkdf2:sha256:600000", so the cost parameters can be tuned without code
+    changes. hashlib's scrypt and PBKDF2 release the GIL, so the pool runs the
+    key derivations in parallel with the rest of the process, while its size caps
+    how many run at once. Requests beyond max_pending wait up to timeout seconds
+    for a slot and then fail with HashingBusy instead of piling up.
+    """
+
+    def __init__(self, method='scrypt', salt_length=16, workers=None, max_pending=None, timeout=10.0):
+        self._executor = None
+        self.configure(method, salt_length, workers, max_pending, timeout)
+
+    def configure(self, method='scrypt', salt_length=16, workers=None, max_pending=None, timeout=10.0):
+        """
+        Apply new settings, replacing the worker pool.
+
+        :param method: werkzeug hash method string used for new hashes.
+        :param salt_length: Salt length for new hashes.
+        :param workers: Worker threads; 0 hashes on the calling thread. Defaults to the CPU count.
+        :param max_pending: Hashes running or queued at once; defaults to four per worker.
+        :param timeout: Seconds to wait for a free slot before raising HashingBusy.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or max(self.workers, 1) * 4
+        self.timeout = timeout
+        self._prefix = None
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = (ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                          if self.workers else None)
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HashingBusy('Too many password checks in progress.')
+        try:
+            if self._executor is None:
+                return func(*args)
+            return self._executor.submit(func, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if the hash was made with a different method or cost than the configured one."""
+        if self._prefix is None:
+            # werkzeug fills in default costs, e.g. "scrypt" is stored as "scrypt:32768:8:1"
+            self._prefix = generate_password_hash('', self.method, 1).split('$', 1)[0] + '$'
+        return not password_hash.startswith(self._prefix)
+
+
+password_hasher = PasswordHasher()
+
+
+def init_security(app):
+    """
+    Configure the shared password hasher from the app config.
+
+    PASSWORD_HASH_METHOD and PASSWORD_SALT_LENGTH control new hashes,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING and PASSWORD_HASH_TIMEOUT the pool.
+    """
+    app.config.setdefault('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+    app.config.setdefault('PASSWORD_HASH_WORKERS', None)
+    app.config.setdefault('PASSWORD_HASH_MAX_PENDING', None)
+    app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10.0)
+
+    password_hasher.configure(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        salt_length=app.config['PASSWORD_SALT_LENGTH'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
@@ -0,0 +1,35 @@
+// Suggest foods from the Fineli catalog as the user types into a name field.
+// url is the autocomplete endpoint; onPick is called with the chosen food, or null
+// when the text no longer matches one.
+function fineliAutocomplete(url, input, datalist, onPick) {
+    var suggestions = {};
+    var pending = null;
+
+    input.addEventListener('input', function () {
+        var food = suggestions[input.value];
+        onPick(food || null);
+        if (food) {
+            return;
+        }
+
+        clearTimeout(pending);
+        pending = setTimeout(function () {
+            var term = input.value.trim();
+            if (term.length < 2) {
+                return;
+            }
+            fetch(url + "?q=" + encodeURIComponent(term))
+                .then(function (response) { return response.json(); })
+                .then(function (foods) {
+                    suggestions = {};
+                    datalist.innerHTML = '';
+                    foods.forEach(function (food) {
+                        suggestions[food.name] = food;
+                        var option = document.createElement('option');
+                        option.value = food.name;
+                        datalist.appendChild(option);
+                    });
+                });
+        }, 150);
+    });
+}
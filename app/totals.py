@@ -0,0 +1,177 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, delete, event, func, inspect, insert, select, union_all, update
+from sqlalchemy.orm import Session
+
+from app.models import DailyTotals, FoodEntry, FoodEntryArchive
+
+# Columns of DailyTotals maintained from FoodEntry, in delta order
+TOTAL_COLUMNS = ('calories', 'protein', 'fat', 'carbs', 'entry_count')
+MACROS = TOTAL_COLUMNS[:-1]
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _current_values(entry):
+    return entry.user_id, _day(entry.date), [getattr(entry, name) or 0 for name in MACROS]
+
+
+def _committed_values(entry):
+    # Values as they were in the database before this flush
+    state = inspect(entry)
+
+    def committed(name):
+        history = state.attrs[name].history
+        if history.deleted:
+            return history.deleted[0]
+        if history.unchanged:
+            return history.unchanged[0]
+        return getattr(entry, name)
+
+    return committed('user_id'), _day(committed('date')), [committed(name) or 0 for name in MACROS]
+
+
+def _add_delta(deltas, values, sign):
+    user_id, day, macros = values
+    if day is None:
+        return
+    delta = deltas[(user_id, day)]
+    for i, value in enumerate(macros):
+        delta[i] += sign * value
+    delta[-1] += sign
+
+
+_totals = DailyTotals.__table__
+
+# Fallback for databases without an upsert, prepared once so every call reuses it
+_update_totals = (
+    update(_totals)
+    .where(_totals.c.user_id == bindparam('key_user_id'), _totals.c.date == bindparam('key_date'))
+    .values({name: _totals.c[name] + bindparam(f'delta_{name}') for name in TOTAL_COLUMNS})
+)
+_insert_totals = insert(_totals)
+
+# Upsert statements per dialect name, None where the dialect has none
+_upserts = {}
+
+
+def _upsert_totals(dialect_name):
+    if dialect_name in _upserts:
+        return _upserts[dialect_name]
+
+    statement = None
+    if dialect_name in ('sqlite', 'postgresql'):
+        if dialect_name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(_totals)
+        statement = statement.on_conflict_do_update(
+            index_elements=[_totals.c.user_id, _totals.c.date],
+            set_={name: _totals.c[name] + statement.excluded[name] for name in TOTAL_COLUMNS})
+    elif dialect_name in ('mysql', 'mariadb'):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        statement = dialect_insert(_totals)
+        statement = statement.on_duplicate_key_update(
+            {name: _totals.c[name] + statement.inserted[name] for name in TOTAL_COLUMNS})
+
+    _upserts[dialect_name] = statement
+    return statement
+
+
+def apply_daily_deltas(connection, deltas):
+    """
+    Add per-day changes to the daily_totals table.
+
+    All days go in with one executemany INSERT ... ON CONFLICT DO UPDATE, whatever
+    the number of days, so two transactions creating the same day at once both add
+    their change instead of one failing on the primary key. Databases without an
+    upsert update each day and insert the days that had no row.
+
+    :param connection: Connection taking part in the caller's transaction.
+    :param deltas: Mapping of (user_id, date) to a list of changes in TOTAL_COLUMNS order.
+    """
+    changed = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not changed:
+        return
+
+    upsert = _upsert_totals(connection.dialect.name)
+    if upsert is not None:
+        connection.execute(upsert, [
+            dict(zip(TOTAL_COLUMNS, delta), user_id=user_id, date=day) for (user_id, day), delta in changed.items()
+        ])
+        return
+
+    inserts = []
+    for (user_id, day), delta in changed.items():
+        params = {f'delta_{name}': change for name, change in zip(TOTAL_COLUMNS, delta)}
+        if not connection.execute(_update_totals, dict(params, key_user_id=user_id, key_date=day)).rowcount:
+            inserts.append(dict(zip(TOTAL_COLUMNS, delta), user_id=user_id, date=day))
+    if inserts:
+        connection.execute(_insert_totals, inserts)
+
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Make sure the previous value of each tracked attribute is loaded before it is
+# overwritten, even when the entry was expired, so edits can subtract it again
+for _name in ('user_id', 'date', *MACROS):
+    event.listen(getattr(FoodEntry, _name), 'set', _load_old_value, active_history=True)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_daily_totals(session, flush_context):
+    # Runs inside the flush, so the totals are written in the same transaction as the entries
+    deltas = defaultdict(lambda: [0] * len(TOTAL_COLUMNS))
+
+    for obj in session.new:
+        if isinstance(obj, FoodEntry):
+            _add_delta(deltas, _current_values(obj), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, FoodEntry):
+            _add_delta(deltas, _committed_values(obj), -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, FoodEntry) and session.is_modified(obj, include_collections=False):
+            _add_delta(deltas, _committed_values(obj), -1)
+            _add_delta(deltas, _current_values(obj), 1)
+
+    if deltas:
+        apply_daily_deltas(session.connection(), deltas)
+
+
+def recompute_daily_totals(session, user_id=None):
+    """
+    Rebuild daily_totals from food_entry and food_entry_archive with one bulk INSERT ... SELECT.
+
+    :param session: Session to run the statements in; the caller commits.
+    :param user_id: Only rebuild this user's rows if given.
+    :return: Number of daily rows written.
+    """
+    totals = DailyTotals.__table__
+
+    def logged(table):
+        rows = select(table.c.user_id, table.c.date, *(table.c[name] for name in MACROS)).where(table.c.date.is_not(None))
+        return rows if user_id is None else rows.where(table.c.user_id == user_id)
+
+    entries = union_all(logged(FoodEntry.__table__), logged(FoodEntryArchive.__table__)).subquery()
+    source = select(
+        entries.c.user_id,
+        entries.c.date,
+        *(func.sum(entries.c[name]) for name in MACROS),
+        func.count(),
+    ).group_by(entries.c.user_id, entries.c.date)
+
+    clear = delete(totals)
+    if user_id is not None:
+        clear = clear.where(totals.c.user_id == user_id)
+
+    session.execute(clear)
+    result = session.execute(insert(totals).from_select(['user_id', 'date', *TOTAL_COLUMNS], source))
+    return result.rowcount
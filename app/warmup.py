@@ -0,0 +1,64 @@
+import logging
+import time
+
+from app import db
+from app.catalog import food_catalog
+from app.jobs import job_runner
+
+logger = logging.getLogger(__name__)
+
+# High-protein queries run while warming up, so their results are cached before
+# the first request; the default page and the name ordering are the most common
+WARMUP_QUERIES = [
+    {'min_protein_ratio': '0.1', 'sort_by': 'protein_to_calories', 'search_term': ''},
+    {'min_protein_ratio': '0.1', 'sort_by': 'name', 'search_term': ''},
+]
+
+
+def warm_up(app):
+    """
+    Load everything that can be shared between worker processes.
+
+    Meant to run once in the server's master process before it forks, so the
+    workers inherit the catalog, its indexes, the cached default queries and the
+    compiled templates instead of building their own copies. Does not touch the
+    database, because connections must not be shared across a fork.
+
+    :param app: Flask application.
+    :return: Seconds spent.
+    """
+    from werkzeug.datastructures import MultiDict
+
+    from app.routes import query_high_protein
+
+    start = time.perf_counter()
+    table = food_catalog.get()
+    for params in WARMUP_QUERIES:
+        query_high_protein(table, MultiDict(params))
+
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    elapsed = time.perf_counter() - start
+    logger.info('Warmed up the catalog (%d foods), %d queries and the templates in %.2f s',
+                len(table), len(WARMUP_QUERIES), elapsed)
+    return elapsed
+
+
+def warm_up_worker(app):
+    """
+    Prepare a freshly forked worker before it accepts requests.
+
+    Drops any connection inherited from the master, opens this worker's first
+    database connection (which also sets the SQLite PRAGMAs), checks that the
+    catalog is current and starts the worker's job runner.
+
+    :param app: Flask application.
+    """
+    with app.app_context():
+        # Pooled connections must not be shared with the parent process
+        db.engine.dispose(close=False)
+        with db.engine.connect() as connection:
+            connection.exec_driver_sql('SELECT 1')
+    food_catalog.get()
+    job_runner.start()
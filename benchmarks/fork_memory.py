@@ -0,0 +1,110 @@
+"""
+Compare the memory of forked workers that inherit a preloaded catalog with workers
+that each load their own copy.
+
+Run from the repository root:
+
+    python -m benchmarks.fork_memory --workers 4
+    python -m benchmarks.fork_memory --workers 4 --source xlsx
+
+This mimics a prefork server with os.fork(), without needing one installed. In
+"preload" mode the parent loads the catalog, builds its indexes and runs the
+warm-up queries before forking, as wsgi.py does under gunicorn's preload_app. In
+"per-worker" mode every child does that itself after the fork. Each child then
+serves a few queries and reports its memory from /proc. PSS divides shared pages
+between the processes using them, so the totals show the real footprint.
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+
+from app.catalog import FoodCatalog
+from app.data_utils import FoodTable, load_food_data
+from app.memory import process_memory
+
+QUERIES = [(0.1, 'protein_to_calories'), (0.1, 'name'), (0.2, 'protein_to_calories')]
+
+
+def _serve(catalog):
+    """Work a worker does for requests: catalog lookups, queries and a name search."""
+    table = catalog.get()
+    for ratio, sort_by in QUERIES:
+        table.protein_index.records(table.protein_index.query(ratio, sort_by)[:200])
+    table.search_index.contains('kana')
+    table.nutrient_query.run(table.nutrient_query.parse(['fiber>=3'], ['-fiber']), 20)
+
+
+def _fork_worker(catalog, load_in_child, barrier):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        if load_in_child:
+            catalog.get()
+        _serve(catalog)
+
+        # Measure once every worker is loaded, and stay alive until all have measured
+        barrier.wait()
+        with os.fdopen(write_fd, 'w') as pipe:
+            pipe.write(json.dumps(process_memory()))
+        barrier.wait()
+        os._exit(0)
+
+    os.close(write_fd)
+    return pid, read_fd
+
+
+def run(mode, workers, source):
+    """
+    Fork workers for one mode and collect their memory.
+
+    :return: Dictionary with the parent's and every worker's memory in MB, and the totals.
+    """
+    if source == 'xlsx':
+        catalog = FoodCatalog(loader=lambda file_path, digest: FoodTable.from_frame(load_food_data(file_path)))
+    else:
+        catalog = FoodCatalog()
+
+    if mode == 'preload':
+        catalog.get()
+        _serve(catalog)
+        gc.collect()
+        gc.freeze()
+
+    barrier = multiprocessing.Barrier(workers)
+    children = [_fork_worker(catalog, mode == 'per-worker', barrier) for _ in range(workers)]
+    reports = []
+    for pid, read_fd in children:
+        with os.fdopen(read_fd) as pipe:
+            reports.append(json.loads(pipe.read()))
+        os.waitpid(pid, 0)
+    parent = process_memory()
+    gc.unfreeze()
+
+    def mb(value):
+        return round(value / 1024 / 1024, 1)
+
+    return {
+        'parent': {key: mb(value) for key, value in parent.items() if key in ('rss', 'pss')},
+        'workers': [{key: mb(value) for key, value in report.items() if key in ('rss', 'pss', 'private_dirty')}
+                    for report in reports],
+        'total_worker_pss_mb': mb(sum(report.get('pss', 0) for report in reports)),
+        'total_worker_private_dirty_mb': mb(sum(report.get('private_dirty', 0) for report in reports)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='Worker processes to fork.')
+    parser.add_argument('--source', choices=['snapshot', 'xlsx'], default='snapshot',
+                        help='Load the catalog from the snapshot or by parsing the workbook.')
+    args = parser.parse_args()
+
+    results = {mode: run(mode, args.workers, args.source) for mode in ('per-worker', 'preload')}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
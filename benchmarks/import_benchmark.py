@@ -0,0 +1,84 @@
+"""
+Measure food log import and export throughput against a temporary SQLite database.
+
+Run from the repository root:
+
+    python -m benchmarks.import_benchmark --rows 100000
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from app import create_app, db
+from app.food_log_io import CSV_FIELDS, import_food_entries, iter_csv_rows, iter_export_csv
+from app.models import DailyTotals, User
+
+
+def make_csv(rows, days=3 * 365, seed=1):
+    """Build an in-memory CSV food log spread over the given number of days."""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(CSV_FIELDS)
+    for i in range(rows):
+        writer.writerow([
+            (start + timedelta(days=rng.randrange(days))).isoformat(),
+            f'Food {i % 500}',
+            round(rng.uniform(50, 900), 1),
+            round(rng.uniform(0, 60), 1),
+            round(rng.uniform(0, 40), 1),
+            round(rng.uniform(0, 120), 1),
+        ])
+    return text.getvalue().encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000, help='Rows in the generated file.')
+    parser.add_argument('--batch-size', type=int, default=None, help='Rows per INSERT.')
+    args = parser.parse_args()
+
+    payload = make_csv(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db')})
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', password_hash='-')
+            db.session.add(user)
+            db.session.commit()
+
+            options = {'batch_size': args.batch_size} if args.batch_size else {}
+            start = time.perf_counter()
+            result = import_food_entries(db.session, user.id, iter_csv_rows(io.BytesIO(payload)), **options)
+            import_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            exported = sum(len(chunk) for chunk in iter_export_csv(db.session, user.id))
+            export_seconds = time.perf_counter() - start
+
+            days = DailyTotals.query.filter_by(user_id=user.id).count()
+
+    print(json.dumps({
+        'rows': args.rows,
+        'file_bytes': len(payload),
+        'imported': result.imported,
+        'skipped': result.skipped,
+        'daily_totals_rows': days,
+        'import_seconds': round(import_seconds, 3),
+        'import_rows_per_second': round(result.imported / import_seconds),
+        'export_seconds': round(export_seconds, 3),
+        'export_bytes': exported,
+        'export_rows_per_second': round(result.imported / export_seconds),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Measure request latency while the snapshot is rebuilt inline and as a background job.
+
+Run from the repository root:
+
+    python -m benchmarks.job_latency
+
+The inline mode rebuilds the snapshot on a thread of the serving process, as a
+request handler would. The job mode queues a rebuild_snapshot job, which parses
+the workbook in a separate process.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from app import create_app, db
+from app.catalog import food_catalog
+from app.data_utils import FOOD_DATA_PATH
+from app.jobs import FINISHED, _build_snapshot, job_runner
+from app.models import Job, User
+
+from benchmarks.load_test import PASSWORD, summarize
+
+
+def request_loop(client, until):
+    """Issue high-protein API requests back to back until until() is true, return the durations."""
+    timings = []
+    while not until():
+        start = time.perf_counter()
+        client.get('/api/high_protein', query_string={'min_protein_ratio': '0.1', 'search_term': 'kana'}).get_data()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--idle-seconds', type=float, default=3.0, help='Seconds measured without background work.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db'),
+            'WTF_CSRF_ENABLED': False,
+            'JOB_POLL_SECONDS': 0.2,
+        })
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+
+        client = app.test_client()
+        client.post('/login', data={'email': 'bench@example.com', 'password': PASSWORD})
+        food_catalog.get()
+        results = {}
+
+        deadline = time.perf_counter() + args.idle_seconds
+        start = time.perf_counter()
+        results['idle'] = summarize(request_loop(client, lambda: time.perf_counter() > deadline),
+                                    time.perf_counter() - start)
+
+        thread = threading.Thread(target=_build_snapshot, args=(FOOD_DATA_PATH, os.path.join(tmp, 'inline')))
+        start = time.perf_counter()
+        thread.start()
+        results['inline_rebuild'] = summarize(request_loop(client, lambda: not thread.is_alive()),
+                                              time.perf_counter() - start)
+
+        with app.app_context():
+            job_id = job_runner.submit('rebuild_snapshot', {'output': os.path.join(tmp, 'job')}).id
+
+        # Look the job up every so often, not after every request
+        checked = {'at': 0.0, 'finished': False}
+
+        def job_finished():
+            if time.perf_counter() - checked['at'] > 0.25:
+                checked['at'] = time.perf_counter()
+                with app.app_context():
+                    checked['finished'] = db.session.get(Job, job_id).status in FINISHED
+            return checked['finished']
+
+        start = time.perf_counter()
+        results['job_rebuild'] = summarize(request_loop(client, job_finished), time.perf_counter() - start)
+        with app.app_context():
+            results['job_rebuild']['job_status'] = db.session.get(Job, job_id).status
+            db.engine.dispose()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+"""
+Benchmark and load-test the app in process against a seeded SQLite database.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test --output results.json
+    python -m benchmarks.load_test --compare results.json
+
+The micro mode times the food data functions directly. The e2e mode drives /login,
+/home, /log_food and /high_protein through Flask test clients from concurrent
+threads. Results are written as JSON; --compare reports endpoints and functions
+whose p50 got slower than a previous run by more than --threshold percent.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+
+from app import create_app, db
+from app.catalog import food_catalog
+from app.data_utils import get_high_protein_options, load_food_data, load_food_table
+from app.models import FoodEntry, User
+from app.totals import recompute_daily_totals
+
+PASSWORD = 'benchmark-password'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(timings, elapsed=None, errors=0):
+    """Summarize a list of durations in seconds as milliseconds, plus throughput."""
+    timings = sorted(timings)
+    summary = {
+        'count': len(timings),
+        'errors': errors,
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3) if timings else None,
+        'p50_ms': round(percentile(timings, 0.50) * 1000, 3) if timings else None,
+        'p90_ms': round(percentile(timings, 0.90) * 1000, 3) if timings else None,
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3) if timings else None,
+        'max_ms': round(timings[-1] * 1000, 3) if timings else None,
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(timings) / elapsed, 1)
+    return summary
+
+
+def time_calls(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def seed_database(users, months, entries_per_day, seed=1):
+    """
+    Create users and months of food entries with bulk inserts, then rebuild the daily totals.
+
+    All users share one password hash so seeding does not spend minutes in the KDF.
+    """
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    db.session.execute(insert(User.__table__), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash,
+         'daily_calorie_goal': 2000, 'daily_protein_goal': 150, 'daily_fat_goal': 70, 'daily_carbs_goal': 250}
+        for i in range(users)
+    ])
+
+    today = date.today()
+    days = months * 30
+    batch = []
+    total = 0
+    for user_id in range(1, users + 1):
+        for offset in range(days):
+            day = today - timedelta(days=offset)
+            for _ in range(entries_per_day):
+                batch.append({
+                    'user_id': user_id, 'date': day, 'name': f'Food {rng.randrange(500)}',
+                    'calories': rng.randint(50, 900), 'protein': rng.randint(0, 60),
+                    'fat': rng.randint(0, 40), 'carbs': rng.randint(0, 120),
+                })
+            if len(batch) >= 10000:
+                db.session.execute(insert(FoodEntry.__table__), batch)
+                total += len(batch)
+                batch.clear()
+    if batch:
+        db.session.execute(insert(FoodEntry.__table__), batch)
+        total += len(batch)
+
+    recompute_daily_totals(db.session)
+    db.session.commit()
+    return total
+
+
+def run_micro(repeat, parse_workbook):
+    """Time the catalog and query functions without going through Flask."""
+    results = {}
+
+    if parse_workbook:
+        results['load_food_data_xlsx'] = time_calls(load_food_data, 1)
+
+    results['load_food_table'] = time_calls(load_food_table, repeat)
+
+    table = load_food_table()
+    results['build_indexes'] = time_calls(table.build_indexes, 3)
+
+    df = table.to_frame()
+    results['get_high_protein_options'] = time_calls(lambda: get_high_protein_options(df, 0.1), repeat)
+    results['protein_index_query_records'] = time_calls(
+        lambda: table.protein_index.records(table.protein_index.query(0.1)), repeat)
+    results['protein_index_query_all_by_name'] = time_calls(
+        lambda: table.protein_index.query(0.0, 'name'), repeat)
+    results['search_index_contains'] = time_calls(lambda: table.search_index.contains('broileri'), repeat)
+    results['meal_planner_suggest'] = time_calls(
+        lambda: table.meal_planner.suggest({'calories': 900, 'protein': 60, 'fat': 30, 'carbs': 100}), repeat)
+    return results
+
+
+def _login(client, user_index):
+    return client.post('/login', data={'email': f'user{user_index}@example.com', 'password': PASSWORD})
+
+
+def _scenarios(search_terms):
+    """Requests issued by the e2e clients, keyed by the name used in the results."""
+    return {
+        '/login': lambda client, user_index, rng: _login(client, user_index),
+        '/home': lambda client, user_index, rng: client.get('/home'),
+        '/log_food': lambda client, user_index, rng: client.post('/log_food', data={
+            'name': f'Food {rng.randrange(500)}', 'calories_per_100g': rng.randint(50, 500),
+            'protein_per_100g': rng.randint(0, 30), 'fat_per_100g': rng.randint(0, 30),
+            'carbs_per_100g': rng.randint(0, 80), 'amount': rng.randint(50, 300),
+        }),
+        '/high_protein': lambda client, user_index, rng: client.get('/high_protein', query_string={
+            'min_protein_ratio': rng.choice(['0.05', '0.1', '0.15']),
+            'sort_by': rng.choice(['protein_to_calories', 'name']),
+            'search_term': rng.choice(search_terms),
+        }),
+    }
+
+
+def run_e2e(app, users, clients, requests_per_client, seed=1):
+    """
+    Drive the endpoints from concurrent threads, each with its own logged-in test client.
+
+    The /login scenario logs in again with the same client, which exercises the
+    password check and session handling just like a fresh login.
+    """
+    scenarios = _scenarios(['', '', 'kana', 'juusto', 'maito'])
+    timings = {name: [] for name in scenarios}
+    errors = {name: 0 for name in scenarios}
+    lock = threading.Lock()
+
+    # Warm the catalog outside of the measured requests
+    food_catalog.get()
+
+    def client_loop(client_number):
+        rng = random.Random(seed + client_number)
+        user_index = client_number % users
+        client = app.test_client()
+        _login(client, user_index)
+        local_timings = {name: [] for name in scenarios}
+        local_errors = {name: 0 for name in scenarios}
+
+        for _ in range(requests_per_client):
+            name = rng.choice(list(scenarios))
+            start = time.perf_counter()
+            try:
+                response = scenarios[name](client, user_index, rng)
+                response.get_data()
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            local_timings[name].append(time.perf_counter() - start)
+            if failed:
+                local_errors[name] += 1
+
+        with lock:
+            for name in scenarios:
+                timings[name].extend(local_timings[name])
+                errors[name] += local_errors[name]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(client_loop, range(clients)))
+    elapsed = time.perf_counter() - start
+
+    results = {name: summarize(timings[name], elapsed, errors[name]) for name in scenarios}
+    results['all'] = summarize([t for values in timings.values() for t in values], elapsed, sum(errors.values()))
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Return messages for every p50 that is more than threshold percent slower than the baseline."""
+    regressions = []
+    for section in ('micro', 'e2e'):
+        for name, stats in current.get(section, {}).items():
+            before = baseline.get(section, {}).get(name)
+            if not before or not before.get('p50_ms') or stats.get('p50_ms') is None:
+                continue
+            change = (stats['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100
+            if change > threshold:
+                regressions.append(f'{section} {name}: p50 {before["p50_ms"]} ms -> {stats["p50_ms"]} ms (+{change:.0f}%)')
+    return regressions
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mode', choices=['micro', 'e2e', 'all'], default='all')
+    parser.add_argument('--users', type=int, default=50, help='Seeded users.')
+    parser.add_argument('--months', type=int, default=12, help='Months of history per user.')
+    parser.add_argument('--entries-per-day', type=int, default=5, help='Food entries per user and day.')
+    parser.add_argument('--clients', type=int, default=8, help='Concurrent e2e clients.')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per e2e client.')
+    parser.add_argument('--repeat', type=int, default=50, help='Calls per micro-benchmark.')
+    parser.add_argument('--parse-workbook', action='store_true', help='Also time parsing resultset.xlsx.')
+    parser.add_argument('--output', help='Write the results to this JSON file.')
+    parser.add_argument('--compare', help='Previous results file to check for regressions.')
+    parser.add_argument('--threshold', type=float, default=20.0, help='Allowed p50 slowdown in percent.')
+    args = parser.parse_args()
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': vars(args),
+        },
+    }
+
+    if args.mode in ('micro', 'all'):
+        results['micro'] = run_micro(args.repeat, args.parse_workbook)
+
+    if args.mode in ('e2e', 'all'):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app({
+                'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'benchmark.db'),
+                'WTF_CSRF_ENABLED': False,
+            })
+            with app.app_context():
+                db.create_all()
+                start = time.perf_counter()
+                entries = seed_database(args.users, args.months, args.entries_per_day)
+                results['meta']['seed'] = {'entries': entries, 'seconds': round(time.perf_counter() - start, 2)}
+
+            results['e2e'] = run_e2e(app, args.users, args.clients, args.requests)
+
+            with app.app_context():
+                db.engine.dispose()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    print(output)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for message in regressions:
+            print('REGRESSION', message)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Compare logging a meal one food entry at a time with logging it as a saved meal.
+
+Run from the repository root:
+
+    python -m benchmarks.meal_benchmark --items 8 --meals 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import date
+
+from sqlalchemy import event
+
+from app import create_app, db
+from app.meals import log_meal, save_meal
+from app.models import FoodEntry, SavedMeal, User
+
+
+def make_items(count):
+    """Ingredients with made-up values, as parse_meal_items() returns them."""
+    return [
+        {'position': i, 'food_id': None, 'name': f'Ingredient {i}', 'grams': 100.0,
+         'calories': 100.0 + i, 'protein': 5.0, 'fat': 3.0, 'carbs': 12.0}
+        for i in range(count)
+    ]
+
+
+def log_per_item(user_id, items, day):
+    # What logging a meal took before: one entry, one commit per ingredient
+    for item in items:
+        db.session.add(FoodEntry(user_id=user_id, date=day, name=item['name'], calories=item['calories'],
+                                 protein=item['protein'], fat=item['fat'], carbs=item['carbs']))
+        db.session.commit()
+
+
+def log_saved(meal_id, day):
+    meal = db.session.get(SavedMeal, meal_id)
+    log_meal(db.session, meal, day)
+    db.session.commit()
+
+
+def measure(meals, func):
+    """Run func once per meal, counting SQL statements and commits."""
+    counts = {'statements': 0, 'commits': 0}
+
+    def count_statement(*args):
+        counts['statements'] += 1
+
+    def count_commit(*args):
+        counts['commits'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    event.listen(db.engine, 'commit', count_commit)
+    start = time.perf_counter()
+    try:
+        for _ in range(meals):
+            func()
+    finally:
+        elapsed = time.perf_counter() - start
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+        event.remove(db.engine, 'commit', count_commit)
+    return {
+        'meals_per_second': round(meals / elapsed, 1),
+        'ms_per_meal': round(elapsed / meals * 1000, 3),
+        'statements_per_meal': round(counts['statements'] / meals, 1),
+        'commits_per_meal': round(counts['commits'] / meals, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=8, help='Ingredients per meal.')
+    parser.add_argument('--meals', type=int, default=200, help='Meals logged per mode.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'bench.db')})
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@example.com', password_hash='-')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+            items = make_items(args.items)
+            meal = save_meal(db.session, user_id, 'Breakfast', items)
+            db.session.commit()
+            meal_id = meal.id
+            day = date.today()
+
+            results = {
+                'per_item': measure(args.meals, lambda: log_per_item(user_id, items, day)),
+                'saved_meal': measure(args.meals, lambda: log_saved(meal_id, day)),
+            }
+            db.engine.dispose()
+
+    print(json.dumps({'items_per_meal': args.items, 'meals': args.meals, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
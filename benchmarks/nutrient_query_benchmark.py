@@ -0,0 +1,123 @@
+"""
+Time nutrient queries over the whole catalog: the vectorized query engine against
+equivalent pandas filtering and a row-by-row Python scan.
+
+Run from the repository root:
+
+    python -m benchmarks.nutrient_query_benchmark
+"""
+import argparse
+import json
+import operator
+import time
+
+import numpy as np
+
+from app.data_utils import load_food_table
+from app.nutrient_query import NAME
+
+# (where, sort) pairs in the syntax of the /api/foods/query parameters
+QUERIES = [
+    ('protein/kcal>=0.1', '-protein/kcal'),
+    ('fiber>=3, fat/kcal<=0.05', '-fiber, name'),
+    ('sodium<120, protein>=15', '-protein, sodium'),
+    ('sugars<=5, saturated_fat<=1.5, kcal<=150', 'kcal'),
+    ('vitamin_c>=20', '-vitamin_c/kcal, name'),
+    ('', '-iron'),
+]
+
+PY_OPERATORS = {'>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt, '=': operator.eq,
+                '!=': operator.ne}
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def pandas_query(df, query):
+    """The same query with pandas column operations, as a reference for the results."""
+    def values(expression):
+        series = df[expression.numerator]
+        if expression.denominator is not None:
+            series = (series / df[expression.denominator]).replace([np.inf, -np.inf], np.nan)
+        return series
+
+    mask = np.ones(len(df), dtype=bool)
+    for expression, op, value in query.predicates:
+        series = values(expression)
+        mask &= PY_OPERATORS[op](series, value).to_numpy() & series.notna().to_numpy()
+
+    keys = {}
+    ascending = []
+    for i, (key, descending) in enumerate(query.sort + [(NAME, False)]):
+        keys[f'k{i}'] = df['Name'] if key is NAME else values(key)
+        ascending.append(not descending)
+    ordered = df.assign(**keys)[mask].sort_values(list(keys), ascending=ascending, na_position='last', kind='stable')
+    return ordered.index.to_numpy()
+
+
+def python_query(records, query):
+    """Row-by-row evaluation over a list of dictionaries, the approach the engine avoids."""
+    def value(record, expression):
+        numerator = record[expression.numerator]
+        if expression.denominator is None:
+            return numerator
+        denominator = record[expression.denominator]
+        return numerator / denominator if denominator else float('nan')
+
+    matches = [
+        record for record in records
+        if all(PY_OPERATORS[op](value(record, expression), target) for expression, op, target in query.predicates)
+    ]
+    for key, descending in reversed(query.sort):
+        if key is NAME:
+            matches.sort(key=lambda record: record['Name'], reverse=descending)
+        else:
+            matches.sort(key=lambda record: (np.isnan(value(record, key)), value(record, key)), reverse=descending)
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='Calls per measurement.')
+    parser.add_argument('--limit', type=int, default=20, help='Rows kept by the top-k measurement.')
+    args = parser.parse_args()
+
+    table = load_food_table()
+    table.build_indexes()
+    engine = table.nutrient_query
+    df = table.to_frame()
+    column_names = list(table.columns)
+    records = df.to_dict(orient='records')
+
+    results = []
+    for where, sort in QUERIES:
+        query = engine.parse([where], [sort])
+
+        rows = engine.run(query)
+        assert np.array_equal(rows, pandas_query(df, query)), str(query)
+        assert np.array_equal(engine.run(query, args.limit), rows[:args.limit]), str(query)
+
+        full = time_per_call(lambda: engine.run(query), args.repeat)
+        top_k = time_per_call(lambda: engine.run(query, args.limit), args.repeat)
+        frame = time_per_call(lambda: pandas_query(df, query), args.repeat)
+        scan = time_per_call(lambda: python_query(records, query), max(args.repeat // 10, 1))
+
+        results.append({
+            'query': str(query),
+            'matches': len(rows),
+            'engine_us': round(full * 1e6, 1),
+            f'engine_top{args.limit}_us': round(top_k * 1e6, 1),
+            'pandas_us': round(frame * 1e6, 1),
+            'python_rows_us': round(scan * 1e6, 1),
+            'speedup_vs_pandas': round(frame / full, 1),
+        })
+
+    print(json.dumps({'foods': len(table), 'nutrients': len(column_names), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Measure logins per second and dashboard latency while logins run concurrently.
+
+Run from the repository root:
+
+    python -m benchmarks.password_benchmark
+    python -m benchmarks.password_benchmark --methods scrypt:16384:8:1 pbkdf2:sha256:600000
+
+Each hash method is run twice: "inline" hashes on the request thread without a
+concurrency limit, as before the hashing pool existed, and "pool" uses the
+configured worker pool. Login clients log in and out in a loop while browse
+clients request /home, so the output shows both login throughput and how much
+the other requests suffer.
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import create_app, db
+from app.models import User
+from benchmarks.load_test import summarize
+
+PASSWORD = 'benchmark-password'
+
+MODES = {
+    'inline': {'PASSWORD_HASH_WORKERS': 0, 'PASSWORD_HASH_MAX_PENDING': 1_000_000},
+    'pool': {},
+}
+
+
+def run(method, mode, login_clients, browse_clients, seconds):
+    """
+    Run login and browse clients against a fresh database for a fixed time.
+
+    :return: Dictionary with the login and /home latency summaries.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'passwords.db'),
+            'WTF_CSRF_ENABLED': False,
+            'PASSWORD_HASH_METHOD': method,
+            **MODES[mode],
+        })
+        users = login_clients + browse_clients
+        with app.app_context():
+            db.create_all()
+            for i in range(users):
+                user = User(username=f'user{i}', email=f'user{i}@example.com')
+                user.set_password(PASSWORD)
+                db.session.add(user)
+            db.session.commit()
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        timings = {'login': [], 'home': []}
+        errors = {'login': 0, 'home': 0}
+
+        def login_loop(number):
+            client = app.test_client()
+            data = {'email': f'user{number}@example.com', 'password': PASSWORD}
+            local_timings, local_errors = [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = client.post('/login', data=data)
+                local_timings.append(time.perf_counter() - start)
+                if response.status_code != 302:
+                    local_errors += 1
+                client.get('/logout')
+            with lock:
+                timings['login'].extend(local_timings)
+                errors['login'] += local_errors
+
+        def browse_loop(number):
+            client = app.test_client()
+            client.post('/login', data={'email': f'user{login_clients + number}@example.com', 'password': PASSWORD})
+            local_timings, local_errors = [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = client.get('/home')
+                local_timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    local_errors += 1
+            with lock:
+                timings['home'].extend(local_timings)
+                errors['home'] += local_errors
+
+        with ThreadPoolExecutor(max_workers=login_clients + browse_clients) as executor:
+            futures = [executor.submit(login_loop, i) for i in range(login_clients)]
+            futures += [executor.submit(browse_loop, i) for i in range(browse_clients)]
+            time.sleep(seconds)
+            stop.set()
+            for future in futures:
+                future.result()
+
+        with app.app_context():
+            db.engine.dispose()
+
+    return {name: summarize(timings[name], seconds, errors[name]) for name in timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=['scrypt', 'pbkdf2:sha256:600000'],
+                        help='werkzeug hash methods to compare.')
+    parser.add_argument('--login-clients', type=int, default=8, help='Threads logging in and out.')
+    parser.add_argument('--browse-clients', type=int, default=4, help='Threads requesting /home.')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run.')
+    args = parser.parse_args()
+
+    results = {
+        method: {mode: run(method, mode, args.login_clients, args.browse_clients, args.seconds) for mode in MODES}
+        for method in args.methods
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
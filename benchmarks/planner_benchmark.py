@@ -0,0 +1,57 @@
+"""
+Measure meal planner latency over the full Fineli catalog.
+
+Run from the repository root:
+
+    python -m benchmarks.planner_benchmark
+"""
+import argparse
+import json
+import random
+import time
+
+from app.data_utils import load_food_table
+
+# Latency the planner is expected to stay under, per suggestion request
+BUDGET_MS = 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500, help='Number of random gaps to plan for.')
+    parser.add_argument('--count', type=int, default=3, help='Foods per suggestion.')
+    args = parser.parse_args()
+
+    table = load_food_table()
+    start = time.perf_counter()
+    table.build_indexes()
+    build_seconds = time.perf_counter() - start
+    planner = table.meal_planner
+
+    rng = random.Random(1)
+    timings = []
+    for _ in range(args.requests):
+        remaining = {
+            'calories': rng.uniform(0, 1500),
+            'protein': rng.uniform(0, 120),
+            'fat': rng.uniform(0, 60),
+            'carbs': rng.uniform(0, 200),
+        }
+        start = time.perf_counter()
+        planner.suggest(remaining, args.count)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(json.dumps({
+        'foods': len(planner.rows),
+        'index_build_seconds': round(build_seconds, 3),
+        'requests': args.requests,
+        'p50_ms': round(timings[len(timings) // 2], 3),
+        'p99_ms': round(timings[int(len(timings) * 0.99) - 1], 3),
+        'max_ms': round(timings[-1], 3),
+        'within_budget': timings[-1] < BUDGET_MS,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
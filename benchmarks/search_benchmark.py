@@ -0,0 +1,60 @@
+"""
+Compare the name search index with the linear scan it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.search_benchmark
+"""
+import argparse
+import json
+import time
+
+from app.data_utils import load_food_table
+
+TERMS = ['a', 'ka', 'kana', 'broileri', 'juusto', 'maito, rasvaton', 'xyz']
+
+
+def time_per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200, help='Calls per measurement.')
+    args = parser.parse_args()
+
+    table = load_food_table()
+    start = time.perf_counter()
+    table.build_indexes()
+    build_seconds = time.perf_counter() - start
+
+    index = table.search_index
+    records = [{'Name': str(name)} for name in table.names]
+
+    results = []
+    for term in TERMS:
+        # The filter /high_protein used to run on every request
+        scan = time_per_call(lambda: [item for item in records if term in item['Name'].lower()], args.repeat)
+        indexed = time_per_call(lambda: index.contains(term), args.repeat)
+        prefix = time_per_call(lambda: index.prefix(term, 10), args.repeat)
+
+        expected = [i for i, item in enumerate(records) if term in item['Name'].lower()]
+        assert index.contains(term).tolist() == expected, term
+
+        results.append({
+            'term': term,
+            'matches': len(expected),
+            'scan_us': round(scan * 1e6, 1),
+            'index_us': round(indexed * 1e6, 1),
+            'prefix_top10_us': round(prefix * 1e6, 1),
+            'speedup': round(scan / indexed, 1) if indexed else None,
+        })
+
+    print(json.dumps({'foods': len(table), 'index_build_seconds': round(build_seconds, 3), 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
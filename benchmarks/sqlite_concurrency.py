@@ -0,0 +1,136 @@
+"""
+Show how reads behave while other threads keep writing to the SQLite database.
+
+Run from the repository root:
+
+    python -m benchmarks.sqlite_concurrency
+
+Writer threads insert food entries in small transactions, like concurrent
+/log_food requests, while reader threads run the /home queries for the same
+users. The run is repeated with SQLite's default rollback journal and with the
+configured PRAGMAs (WAL, synchronous=NORMAL, busy timeout). The script exits
+with an error if the configured run hits any "database is locked" errors.
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.models import DailyTotals, FoodEntry
+from benchmarks.load_test import seed_database, summarize
+
+# PRAGMAs SQLite uses when nothing is configured
+DEFAULT_PRAGMAS = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT_MS': 0,
+    'SQLITE_MMAP_SIZE': 0,
+    'SQLITE_CACHE_SIZE': -2000,
+}
+
+
+def _read_home(user_id):
+    today = date.today()
+    db.session.get(DailyTotals, (user_id, today))
+    db.session.execute(select(FoodEntry).where(FoodEntry.user_id == user_id, FoodEntry.date == today)).all()
+
+
+def _write_entry(user_id, rng):
+    db.session.add(FoodEntry(
+        user_id=user_id, date=date.today(), name=f'Food {rng.randrange(500)}',
+        calories=rng.randint(50, 900), protein=rng.randint(0, 60), fat=rng.randint(0, 40), carbs=rng.randint(0, 120),
+    ))
+    db.session.commit()
+
+
+def run(overrides, users, readers, writers, seconds):
+    """
+    Seed a fresh database and run readers and writers against it for a fixed time.
+
+    :param overrides: Config values applied on top of the defaults.
+    :return: Dictionary with read and write latency summaries.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tmp, 'concurrency.db'), **overrides})
+        with app.app_context():
+            db.create_all()
+            seed_database(users, 1, 5)
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        timings = {'read': [], 'write': []}
+        errors = {'read': 0, 'write': 0}
+
+        def worker(kind, number):
+            rng = random.Random(number)
+            action = _read_home if kind == 'read' else _write_entry
+            local_timings = []
+            local_errors = 0
+            with app.app_context():
+                while not stop.is_set():
+                    user_id = rng.randint(1, users)
+                    start = time.perf_counter()
+                    try:
+                        if kind == 'read':
+                            action(user_id)
+                        else:
+                            action(user_id, rng)
+                    except OperationalError:
+                        db.session.rollback()
+                        local_errors += 1
+                    local_timings.append(time.perf_counter() - start)
+                    if kind == 'read':
+                        db.session.rollback()
+            with lock:
+                timings[kind].extend(local_timings)
+                errors[kind] += local_errors
+
+        threads = [threading.Thread(target=worker, args=('read', i)) for i in range(readers)]
+        threads += [threading.Thread(target=worker, args=('write', readers + i)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+            db.engine.dispose()
+
+    return {
+        'journal_mode': journal_mode,
+        'read': summarize(timings['read'], seconds, errors['read']),
+        'write': summarize(timings['write'], seconds, errors['write']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='Seeded users.')
+    parser.add_argument('--readers', type=int, default=8, help='Concurrent reader threads.')
+    parser.add_argument('--writers', type=int, default=4, help='Concurrent writer threads.')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration of each run.')
+    args = parser.parse_args()
+
+    results = {
+        'default': run(DEFAULT_PRAGMAS, args.users, args.readers, args.writers, args.seconds),
+        'configured': run({}, args.users, args.readers, args.writers, args.seconds),
+    }
+    print(json.dumps(results, indent=2))
+
+    configured = results['configured']
+    if configured['read']['errors'] or configured['write']['errors']:
+        raise SystemExit('The configured run hit "database is locked" errors.')
+
+
+if __name__ == '__main__':
+    main()
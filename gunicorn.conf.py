@@ -0,0 +1,46 @@
+import gc
+import logging
+import multiprocessing
+import os
+
+# Gunicorn settings, overridable through the environment
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WORKER_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WORKER_TIMEOUT', 60))
+max_requests = int(os.environ.get('MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Import wsgi.py, which builds the app and loads the catalog, once in the master
+preload_app = True
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def _megabytes(value):
+    return f'{value / 1024 / 1024:.1f} MB' if value is not None else 'n/a'
+
+
+def when_ready(server):
+    from app.memory import process_memory
+
+    # Objects created while preloading are never collected, so the garbage
+    # collector does not write to (and un-share) their pages in the workers
+    gc.collect()
+    gc.freeze()
+
+    memory = process_memory()
+    logger.info('Master %s preloaded, RSS %s, PSS %s', os.getpid(), _megabytes(memory.get('rss')),
+                _megabytes(memory.get('pss')))
+
+
+def post_worker_init(worker):
+    from app.memory import process_memory
+    from app.warmup import warm_up_worker
+
+    warm_up_worker(worker.app.wsgi())
+
+    memory = process_memory()
+    logger.info('Worker %s ready, RSS %s, PSS %s, private %s', worker.pid, _megabytes(memory.get('rss')),
+                _megabytes(memory.get('pss')), _megabytes(memory.get('private_dirty')))
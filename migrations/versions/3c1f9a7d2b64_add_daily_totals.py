@@ -0,0 +1,41 @@
+"""Add daily totals
+
+Revision ID: 3c1f9a7d2b64
+Revises: e84b40f9586a
+Create Date: 2026-10-18 14:05:12.418305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f9a7d2b64'
+down_revision = 'e84b40f9586a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_totals',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('calories', sa.Float(), nullable=False),
+    sa.Column('protein', sa.Float(), nullable=False),
+    sa.Column('fat', sa.Float(), nullable=False),
+    sa.Column('carbs', sa.Float(), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'date')
+    )
+
+    # Backfill from the entries logged so far
+    op.execute(
+        'INSERT INTO daily_totals (user_id, date, calories, protein, fat, carbs, entry_count) '
+        'SELECT user_id, date, SUM(calories), SUM(protein), SUM(fat), SUM(carbs), COUNT(*) '
+        'FROM food_entry WHERE date IS NOT NULL GROUP BY user_id, date'
+    )
+
+
+def downgrade():
+    op.drop_table('daily_totals')
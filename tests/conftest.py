@@ -0,0 +1,106 @@
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from flask_migrate import upgrade
+
+from app import create_app, db
+from app.catalog import food_catalog
+from app.data_utils import NUMERIC_COLUMNS, FoodTable
+from app.identity import reset_user_cache
+from app.models import User
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# Words the sample food names are made of, so that searches have shared prefixes and substrings
+NAME_WORDS = ('kana', 'broileri', 'juusto', 'maito', 'rasvaton', 'leipä', 'ruis', 'lohi', 'savustettu',
+              'paistettu', 'keitetty', 'tofu', 'soija', 'proteiinijauhe', 'kerma', 'ahven', 'peruna', 'mysli')
+
+
+def sample_foods(count=400, seed=1):
+    """
+    Build a DataFrame laid out like load_food_data(), with the cases the indexes must handle.
+
+    Calories and protein come from small sets of values, so many foods tie on their
+    protein ratio. Some have no calories (an infinite ratio), no calories and no
+    protein (no ratio), or missing values. A few names are repeated.
+    """
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        words = rng.sample(NAME_WORDS, rng.randint(1, 3))
+        name = words[0].capitalize() + (', ' + ' '.join(words[1:]) if len(words) > 1 else '')
+        names.append(name)
+    for i in range(0, count, 50):
+        names[i + 1] = names[i]
+
+    data = {'Id': np.arange(1, count + 1) * 3, 'Name': names}
+    for column in NUMERIC_COLUMNS:
+        data[column] = [np.nan] * count
+    for i in range(count):
+        data['Calories'][i] = rng.choice([0.0, 50.0, 100.0, 100.0, 100.0, 250.0, 400.0, np.nan])
+        data['Protein'][i] = rng.choice([0.0, 5.0, 10.0, 10.0, 25.0, 3.3, np.nan])
+        data['Fat'][i] = rng.choice([0.0, 1.5, 10.0, 30.0, np.nan])
+        data['Carbs'][i] = rng.choice([0.0, 5.0, 40.0, 70.0])
+        data['Fiber'][i] = rng.choice([0.0, 1.0, 3.0, 3.0, 8.0, np.nan])
+        data['Sodium'][i] = rng.uniform(0, 800) if rng.random() < 0.8 else np.nan
+    return pd.DataFrame(data)
+
+
+@pytest.fixture
+def app(tmp_path):
+    # A fresh SQLite database per test, built by the migrations as in production
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        'JOB_WORKERS': 0,
+    })
+    with app.app_context():
+        upgrade(directory=MIGRATIONS)
+    # Users are cached per process, and every test database starts again at id 1
+    reset_user_cache()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def user(app):
+    """Id of a user with the default goals and the password "password"."""
+    with app.app_context():
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app, user):
+    """Test client logged in as the user fixture."""
+    client = app.test_client()
+    client.post('/login', data={'email': 'alice@example.com', 'password': 'password'})
+    return client
+
+
+@pytest.fixture
+def food_table():
+    table = FoodTable.from_frame(sample_foods())
+    table.build_indexes()
+    return table
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch, food_table):
+    """Serve the sample foods from the shared catalog instead of the Fineli workbook."""
+    workbook = tmp_path / 'foods.xlsx'
+    workbook.write_bytes(b'sample foods')
+    monkeypatch.setattr(food_catalog, 'file_path', str(workbook))
+    monkeypatch.setattr(food_catalog, '_loader', lambda file_path, digest: food_table)
+    food_catalog.invalidate()
+    yield food_table
+    food_catalog.invalidate()
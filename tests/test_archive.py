@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app import db
+from app.archive import ARCHIVE_BATCH_SIZE, ENTRY_COLUMNS, archive_cutoff, archive_food_entries
+from app.models import DailyTotals, FoodEntry, FoodEntryArchive, User
+from app.totals import recompute_daily_totals
+
+CUTOFF = date(2026, 1, 1)
+
+
+def entry_rows(user_id, count, first_day, days):
+    return [{'user_id': user_id, 'date': first_day + timedelta(days=i % days), 'name': f'Ruoka {i}',
+             'calories': 100 + i % 37, 'protein': i % 11 * 0.5, 'fat': i % 7 * 0.25, 'carbs': i % 13}
+            for i in range(count)]
+
+
+def table_rows(model):
+    table = model.__table__
+    return sorted(db.session.execute(select(*(table.c[name] for name in ENTRY_COLUMNS))).all())
+
+
+def totals():
+    return sorted(db.session.execute(select(DailyTotals.__table__)).all())
+
+
+@pytest.fixture
+def logged(app, user):
+    """Entries of two users on both sides of CUTOFF, with their daily totals; yields the user ids."""
+    with app.app_context():
+        other = User(username='bob', email='bob@example.com', password_hash='x')
+        db.session.add(other)
+        db.session.flush()
+
+        # More than two batches of old entries, so the last batch is a partial one
+        rows = (entry_rows(user, ARCHIVE_BATCH_SIZE * 2 + 201, CUTOFF - timedelta(days=30), 30)
+                + entry_rows(user, 40, CUTOFF, 10) + entry_rows(other.id, 3, CUTOFF - timedelta(days=1), 1))
+        db.session.execute(insert(FoodEntry.__table__), rows)
+        recompute_daily_totals(db.session)
+        db.session.commit()
+        yield user, other.id
+
+
+def test_archive_cutoff():
+    assert archive_cutoff(30, date(2026, 3, 31)) == date(2026, 3, 1)
+
+
+@pytest.mark.parametrize('batch_size', [7, ARCHIVE_BATCH_SIZE, 1201, 5000])
+def test_old_entries_move_to_the_archive(logged, batch_size):
+    before = table_rows(FoodEntry)
+    old = [row for row in before if row.date < CUTOFF]
+
+    assert archive_food_entries(db.session, CUTOFF, batch_size) == len(old) == 1204
+    assert table_rows(FoodEntryArchive) == old
+    assert table_rows(FoodEntry) == [row for row in before if row.date >= CUTOFF]
+
+
+def test_batches_cross_the_boundary(logged, monkeypatch):
+    commits = []
+    monkeypatch.setattr(db.session, 'commit', lambda: commits.append(FoodEntry.query.count()))
+
+    archive_food_entries(db.session, CUTOFF)
+
+    # 1201 entries of the first user take three batches, the other user's three entries one
+    assert [1244 - count for count in commits] == [500, 1000, 1201, 1204]
+
+
+def test_totals_are_unchanged_by_archiving(logged):
+    before = totals()
+    archive_food_entries(db.session, CUTOFF)
+    db.session.expire_all()
+    assert totals() == before
+
+    recompute_daily_totals(db.session)
+    db.session.commit()
+    assert totals() == before
+
+
+def test_archiving_again_moves_nothing(logged):
+    archive_food_entries(db.session, CUTOFF)
+    archived = table_rows(FoodEntryArchive)
+
+    assert archive_food_entries(db.session, CUTOFF) == 0
+    assert table_rows(FoodEntryArchive) == archived
+
+
+def test_progress_is_reported_per_user(logged):
+    calls = []
+    archive_food_entries(db.session, CUTOFF, progress=lambda *args: calls.append(args))
+    assert calls == [(1, 2, 1201), (2, 2, 1204)]
@@ -0,0 +1,150 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+
+from app.catalog import FoodCatalog, food_catalog, query_cache
+from app.data_utils import FoodTable
+from conftest import sample_foods
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / 'foods.xlsx'
+    path.write_bytes(b'first version')
+    return path
+
+
+@pytest.fixture
+def loads():
+    """Digests the catalog's loader was called with."""
+    return []
+
+
+@pytest.fixture
+def catalog(workbook, loads):
+    def loader(file_path, digest):
+        loads.append(digest)
+        return FoodTable.from_frame(sample_foods(count=50, seed=len(loads)))
+
+    return FoodCatalog(str(workbook), loader)
+
+
+def set_mtime(path, step):
+    # Filesystem timestamps can be coarser than the time between two writes in a test
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + step * 1_000_000_000))
+
+
+def counters(catalog):
+    stats = catalog.stats()
+    return stats['hits'], stats['misses'], stats['loads']
+
+
+def test_first_access_loads_and_later_ones_hit(catalog, workbook, loads):
+    assert catalog.stats()['loaded'] is False
+    assert catalog.version is None
+
+    table = catalog.get()
+    assert catalog.get() is table
+    assert catalog.get() is table
+
+    assert loads == [hashlib.sha256(b'first version').hexdigest()]
+    assert catalog.version == loads[0][:16]
+    assert table.version == catalog.version
+    assert counters(catalog) == (2, 1, 1)
+    assert catalog.stats()['loaded'] is True
+
+
+def test_touched_file_with_the_same_contents_is_not_reloaded(catalog, workbook, loads):
+    table = catalog.get()
+    version = catalog.version
+
+    set_mtime(workbook, 1)
+    assert catalog.get() is table
+    assert catalog.get() is table
+
+    assert len(loads) == 1
+    assert catalog.version == version
+    assert counters(catalog) == (2, 1, 1)
+
+
+def test_edited_file_is_reloaded(catalog, workbook, loads):
+    table = catalog.get()
+    version = catalog.version
+
+    workbook.write_bytes(b'second version')
+    set_mtime(workbook, 1)
+    reloaded = catalog.get()
+
+    assert reloaded is not table
+    assert loads[-1] == hashlib.sha256(b'second version').hexdigest()
+    assert catalog.version == loads[-1][:16] != version
+    assert reloaded.version == catalog.version
+    assert counters(catalog) == (0, 2, 2)
+    assert catalog.get() is reloaded
+
+
+def test_edit_that_keeps_the_mtime_is_not_noticed(catalog, workbook, loads):
+    # Only a changed modification time leads to hashing the file
+    table = catalog.get()
+    mtime = os.stat(workbook).st_mtime_ns
+    workbook.write_bytes(b'second version')
+    os.utime(workbook, ns=(mtime, mtime))
+
+    assert catalog.get() is table
+    assert len(loads) == 1
+
+
+def test_reload_callbacks_run_on_reload_and_invalidate(catalog, workbook):
+    calls = []
+    catalog.on_reload(lambda: calls.append(catalog.version))
+
+    catalog.get()
+    set_mtime(workbook, 1)
+    catalog.get()
+    assert len(calls) == 1
+
+    workbook.write_bytes(b'second version')
+    set_mtime(workbook, 2)
+    catalog.get()
+    assert len(calls) == 2
+    assert calls[0] != calls[1]
+
+    catalog.invalidate()
+    assert calls[-1] is None
+    assert catalog.stats()['loaded'] is False
+
+
+def test_load_timings(catalog):
+    catalog.get()
+    stats = catalog.stats()
+    assert stats['last_load_seconds'] >= 0
+    assert stats['total_load_seconds'] == stats['last_load_seconds']
+    assert stats['loaded_at'] is not None
+    assert stats['source'] == 'xlsx'
+
+
+def test_query_cache_is_cleared_when_the_shared_catalog_reloads(tmp_path, monkeypatch):
+    workbook = tmp_path / 'foods.xlsx'
+    workbook.write_bytes(b'first version')
+    monkeypatch.setattr(food_catalog, 'file_path', str(workbook))
+    monkeypatch.setattr(food_catalog, '_loader', lambda file_path, digest: FoodTable.from_frame(sample_foods(50)))
+    food_catalog.invalidate()
+
+    try:
+        food_catalog.get()
+        query_cache.set((food_catalog.version, 0.1, 'name'), np.arange(3))
+
+        # A touch keeps the cached results
+        set_mtime(workbook, 1)
+        food_catalog.get()
+        assert query_cache.stats()['size'] == 1
+
+        workbook.write_bytes(b'second version')
+        set_mtime(workbook, 2)
+        food_catalog.get()
+        assert query_cache.stats()['size'] == 0
+    finally:
+        food_catalog.invalidate()
@@ -0,0 +1,44 @@
+import threading
+
+from app import db
+
+
+def test_new_connections_use_wal_and_busy_timeout(app):
+    assert app.config['SQLITE_BUSY_TIMEOUT_MS'] > 0
+
+    with app.app_context():
+        # Two connections at once, so the second is not taken from the pool
+        with db.engine.connect() as first, db.engine.connect() as second:
+            for connection in (first, second):
+                assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+                assert connection.exec_driver_sql('PRAGMA busy_timeout').scalar() == app.config['SQLITE_BUSY_TIMEOUT_MS']
+
+
+def test_writer_waits_for_another_writer(app):
+    errors = []
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('CREATE TABLE counter (value INTEGER)')
+
+        with db.engine.connect() as holder:
+            holder.exec_driver_sql('BEGIN IMMEDIATE')
+            holder.exec_driver_sql('INSERT INTO counter VALUES (1)')
+
+            def write():
+                # Without the busy timeout this fails at once with "database is locked"
+                try:
+                    with app.app_context(), db.engine.begin() as connection:
+                        connection.exec_driver_sql('INSERT INTO counter VALUES (2)')
+                except Exception as e:
+                    errors.append(e)
+
+            writer = threading.Thread(target=write)
+            writer.start()
+            writer.join(0.2)
+            holder.commit()
+            writer.join()
+
+        assert errors == []
+        with db.engine.connect() as connection:
+            assert connection.exec_driver_sql('SELECT COUNT(*) FROM counter').scalar() == 2
@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import pytest
+
+from app import db
+from app.food_log_io import (CSV_FIELDS, MAX_REPORTED_ERRORS, import_food_entries, iter_csv_rows, iter_json_rows,
+                             parse_row)
+from app.models import DailyTotals, FoodEntry
+from app.totals import recompute_daily_totals
+
+ROWS = [
+    {'date': '2026-03-01', 'name': 'Kaurapuuro', 'calories': 300.0, 'protein': 10.0, 'fat': 5.0, 'carbs': 50.0},
+    {'date': '2026-03-01', 'name': 'Kana, "paistettu"', 'calories': 250.5, 'protein': 30.0, 'fat': 12.0, 'carbs': 0.0},
+    {'date': '2026-03-02', 'name': 'Ruisleipä, äidin', 'calories': 90.0, 'protein': 3.0, 'fat': 1.0, 'carbs': 16.0},
+    {'date': '2026-02-28', 'name': 'Rahka', 'calories': 0.1, 'protein': 0.0, 'fat': 0.0, 'carbs': 1e-6},
+]
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def upload(client, content, filename):
+    return client.post('/import', data={'file': (io.BytesIO(content), filename)},
+                       content_type='multipart/form-data')
+
+
+def daily_totals():
+    return sorted((row.user_id, row.date, round(row.calories, 6), row.entry_count)
+                  for row in DailyTotals.query.filter(DailyTotals.entry_count != 0))
+
+
+def assert_totals_match_recompute():
+    maintained = daily_totals()
+    recompute_daily_totals(db.session)
+    db.session.commit()
+    assert maintained == daily_totals()
+
+
+def exported(client):
+    reader = csv.DictReader(io.StringIO(client.get('/export.csv').get_data(as_text=True)))
+    return [{key: value if key in ('date', 'name') else float(value) for key, value in row.items()} for row in reader]
+
+
+@pytest.mark.parametrize('filename, content', [
+    ('log.csv', to_csv(ROWS)),
+    ('log.json', json.dumps(ROWS).encode()),
+    ('log.jsonl', '\n'.join(json.dumps(row) for row in ROWS).encode()),
+])
+def test_import_and_export_round_trip(app, client, filename, content):
+    response = upload(client, content, filename)
+    assert 'Imported 4 entries, skipped 0 invalid rows.' in response.get_data(as_text=True)
+
+    assert exported(client) == sorted(ROWS, key=lambda row: row['date'])
+
+    # Exporting and importing again doubles every day
+    upload(client, client.get('/export.csv').get_data(), 'again.csv')
+    with app.app_context():
+        assert FoodEntry.query.count() == 8
+        assert [row[3] for row in daily_totals()] == [2, 4, 2]
+        assert_totals_match_recompute()
+
+
+@pytest.mark.parametrize('field, value, message', [
+    ('calories', 'nan', 'calories must be a non-negative number'),
+    ('protein', 'inf', 'protein must be a non-negative number'),
+    ('fat', '-Infinity', 'fat must be a non-negative number'),
+    ('carbs', '-1', 'carbs must be a non-negative number'),
+    ('calories', '1e400', 'calories must be a non-negative number'),
+    ('protein', 'ten', 'protein must be a number'),
+    ('fat', None, 'fat must be a number'),
+    ('date', '2026-02-30', 'date must be in YYYY-MM-DD format'),
+    ('date', '01.03.2026', 'date must be in YYYY-MM-DD format'),
+    ('date', '', 'date must be in YYYY-MM-DD format'),
+    ('name', '  ', 'name is required'),
+    ('name', 'x' * 101, 'name is longer than 100 characters'),
+])
+def test_invalid_rows_are_rejected(field, value, message):
+    with pytest.raises(ValueError, match=message):
+        parse_row(dict(ROWS[0], **{field: value}))
+
+
+def test_json_rows_must_be_objects():
+    with pytest.raises(ValueError, match='expected an object'):
+        parse_row([1, 2, 3])
+
+
+def test_invalid_rows_are_skipped_and_reported(app, client):
+    rows = [dict(ROWS[0], calories='nan'), ROWS[1], dict(ROWS[2], date='2026-13-01'), dict(ROWS[3], fat='-2')]
+    text = upload(client, to_csv(rows), 'log.csv').get_data(as_text=True)
+
+    assert 'Imported 1 entries, skipped 3 invalid rows.' in text
+    # CSV rows are numbered by their line in the file, after the header
+    assert 'Row 2: calories must be a non-negative number' in text
+    assert 'Row 4: date must be in YYYY-MM-DD format' in text
+    assert 'Row 5: fat must be a non-negative number' in text
+    with app.app_context():
+        assert daily_totals() == [(1, date(2026, 3, 1), 250.5, 1)]
+
+
+def test_reported_errors_are_capped(app):
+    with app.app_context():
+        rows = enumerate([{'name': 'x'}] * (MAX_REPORTED_ERRORS + 5), start=1)
+        result = import_food_entries(db.session, 1, rows)
+    assert result.skipped == MAX_REPORTED_ERRORS + 5
+    assert len(result.errors) == MAX_REPORTED_ERRORS
+
+
+def test_csv_without_the_required_columns_is_refused(client):
+    response = upload(client, b'date,name,calories\n2026-03-01,Oats,300\n', 'log.csv')
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        assert 'protein, fat, carbs' in session['_flashes'][0][1]
+
+
+@pytest.mark.parametrize('count, batch_size, commit_every', [
+    (0, 3, 6), (1, 3, 6), (2, 3, 6), (3, 3, 6), (4, 3, 6), (6, 3, 6), (7, 3, 6), (13, 3, 6), (12, 4, 4), (9, 100, 6),
+])
+def test_batch_boundaries(app, user, count, batch_size, commit_every):
+    # Rows spread over a few days, with an invalid row every fifth line
+    rows = []
+    for i in range(count):
+        row = dict(ROWS[i % 3], date=f'2026-03-0{1 + i % 4}', name=f'Food {i}')
+        rows.append(dict(row, protein=-1) if i % 5 == 4 else row)
+    commits = []
+
+    with app.app_context():
+        result = import_food_entries(db.session, user, enumerate(rows, start=1), batch_size=batch_size,
+                                     commit_every=commit_every, on_commit=lambda r: commits.append(r.imported))
+
+        valid = [row for row in rows if row['protein'] != -1]
+        assert result.imported == len(valid)
+        assert result.skipped == count - len(valid)
+        assert sorted(entry.name for entry in FoodEntry.query) == sorted(row['name'] for row in valid)
+        assert sum(row[3] for row in daily_totals()) == len(valid)
+        assert_totals_match_recompute()
+
+    # A commit for every commit_every rows inserted, then one at the end
+    batches = len(valid) // batch_size
+    assert len(commits) == batches * batch_size // commit_every + 1
+    assert commits[-1] == len(valid)
+    assert commits == sorted(commits)
+
+
+def test_import_adds_to_the_totals_of_logged_days(app, client, user):
+    client.post('/log_food', data={'name': 'Oats', 'calories_per_100g': '350', 'protein_per_100g': '13',
+                                   'fat_per_100g': '7', 'carbs_per_100g': '60', 'amount': '100'})
+    today = datetime.utcnow().date()
+    upload(client, json.dumps([dict(ROWS[0], date=today.isoformat())]).encode(), 'log.json')
+
+    with app.app_context():
+        day = db.session.get(DailyTotals, (user, today))
+        assert day.entry_count == 2
+        assert day.calories == pytest.approx(650)
+        assert_totals_match_recompute()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64, 64 * 1024])
+@pytest.mark.parametrize('text', [
+    json.dumps(ROWS),
+    json.dumps(ROWS, indent=2),
+    '\n'.join(json.dumps(row) for row in ROWS) + '\n',
+    '﻿' + json.dumps(ROWS),
+])
+def test_json_items_split_across_chunks(text, chunk_size):
+    items = list(iter_json_rows(io.BytesIO(text.encode()), chunk_size=chunk_size))
+    assert items == list(enumerate(ROWS, start=1))
+
+
+@pytest.mark.parametrize('text', ['[{"name": "Oats"}, {"name": ', '[{"name": "Oats"}, nonsense]'])
+def test_malformed_json_is_refused(text):
+    with pytest.raises(ValueError, match='Malformed JSON after item 1'):
+        list(iter_json_rows(io.BytesIO(text.encode()), chunk_size=4))
+
+
+def test_json_buffer_is_capped():
+    # An unterminated string would otherwise keep the rest of the file in memory
+    text = '[{"name": "Oats"}, {"name": "' + 'x' * 5000
+    rows = iter_json_rows(io.BytesIO(text.encode()), chunk_size=100, max_item_chars=1000)
+    assert next(rows) == (1, {'name': 'Oats'})
+    with pytest.raises(ValueError, match='longer than 1000 characters after item 1'):
+        next(rows)
+
+
+def test_json_items_up_to_the_cap_are_read():
+    item = {'name': 'x' * 900}
+    rows = iter_json_rows(io.BytesIO(json.dumps([item, item]).encode()), chunk_size=100, max_item_chars=1000)
+    assert [row for _, row in rows] == [item, item]
+
+
+def test_csv_rows_are_numbered_by_line():
+    rows = list(iter_csv_rows(io.BytesIO(to_csv(ROWS[:2]))))
+    assert [line for line, _ in rows] == [2, 3]
+    assert rows[1][1]['name'] == 'Kana, "paistettu"'
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+QUERIES = [
+    'min_protein_ratio=0.05&sort_by=protein_to_calories',
+    'min_protein_ratio=0.05&sort_by=name',
+    'min_protein_ratio=0&sort_by=protein_to_calories&search_term=kana',
+    'min_protein_ratio=0&sort_by=name&search_term=a',
+]
+
+
+def expected_names(food_table, query):
+    params = dict(part.split('=') for part in query.split('&'))
+    rows = food_table.protein_index.query(float(params['min_protein_ratio']), params['sort_by'])
+    term = params.get('search_term')
+    if term:
+        rows = rows[food_table.search_index.mask(term)[rows]]
+    return [str(food_table.names[row]) for row in rows]
+
+
+@pytest.mark.parametrize('query', QUERIES)
+@pytest.mark.parametrize('page_size', [1, 7, 50])
+def test_cursor_pages_cover_every_row_once(client, catalog, query, page_size):
+    names = []
+    url = f'/api/high_protein?{query}&page_size={page_size}'
+    cursor = None
+    while True:
+        data = client.get(url + (f'&after={cursor}' if cursor else '')).get_json()
+        assert len(data['items']) <= page_size
+        names.extend(item['Name'] for item in data['items'])
+        cursor = data['next_cursor']
+        if cursor is None:
+            break
+
+    expected = expected_names(catalog, query)
+    assert data['total'] == len(expected)
+    assert names == expected
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_numbered_pages_match_cursor_pages(client, catalog, query):
+    names = []
+    page = 1
+    while True:
+        data = client.get(f'/api/high_protein?{query}&page_size=9&page={page}').get_json()
+        if not data['items']:
+            break
+        names.extend(item['Name'] for item in data['items'])
+        page += 1
+    assert names == expected_names(catalog, query)
+
+
+def test_results_skip_foods_without_a_ratio_and_keep_ties(client, catalog):
+    ratio = catalog.protein_index.ratio
+    data = client.get('/api/high_protein?min_protein_ratio=0&page_size=500').get_json()
+
+    assert data['total'] == int(np.count_nonzero(~np.isnan(ratio)))
+    assert data['total'] < len(catalog)
+    assert data['total'] > len(set(ratio[~np.isnan(ratio)].tolist()))
+
+
+def test_cursor_from_another_catalog_version_is_rejected(client, catalog):
+    response = client.get('/api/high_protein?min_protein_ratio=0.1&after=0123456789abcdef:5')
+    assert response.status_code == 400
+
+
+def test_cursor_is_refused_with_a_nutrient_query(client, catalog):
+    first = client.get('/api/high_protein?min_protein_ratio=0&page_size=5').get_json()
+    response = client.get(f'/api/high_protein?min_protein_ratio=0&where=fiber>=1&after={first["next_cursor"]}')
+    assert response.status_code == 400
@@ -0,0 +1,54 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db
+from app.history import EARLIEST_DAY, LATEST_DAY, resolve_range
+from app.models import FoodEntry
+
+
+def test_default_range_ends_on_the_utc_date():
+    start, end = resolve_range('week')
+    assert end == datetime.utcnow().date()
+    assert (end - start).days == 6
+
+
+@pytest.mark.parametrize('query', [
+    'period=custom&start=0001-01-01&end=0001-01-10',
+    'period=custom&start=9999-12-01&end=9999-12-31',
+    'period=week&end=9999-12-31',
+    'period=year&end=0001-02-01',
+    'period=custom&start=0001-01-03&end=0001-01-03',
+])
+def test_ranges_at_the_ends_of_the_calendar_are_rejected(client, query):
+    response = client.get(f'/api/history?{query}')
+    assert response.status_code == 400
+    assert 'between' in response.get_json()['error']
+
+
+@pytest.mark.parametrize('start, end', [
+    (EARLIEST_DAY, EARLIEST_DAY + timedelta(days=3)),
+    (LATEST_DAY - timedelta(days=3), LATEST_DAY),
+])
+def test_ranges_just_inside_the_calendar_work(client, start, end):
+    response = client.get(f'/api/history?period=custom&start={start}&end={end}')
+    assert response.status_code == 200
+    assert len(response.get_json()['days']) == 4
+
+
+def test_history_page_flashes_instead_of_failing(client):
+    response = client.get('/history?period=custom&start=0001-01-01&end=0001-01-02')
+    assert response.status_code == 200
+
+
+def test_history_includes_todays_entries(app, client, user):
+    with app.app_context():
+        db.session.add(FoodEntry(user_id=user, date=datetime.utcnow().date(), name='Oats',
+                                 calories=300, protein=10, fat=5, carbs=50))
+        db.session.commit()
+
+    data = client.get('/api/history?period=week').get_json()
+    assert data['days'][-1]['date'] == datetime.utcnow().date().isoformat()
+    assert data['days'][-1]['calories'] == 300
+    assert data['days'][-1]['calories_rolling_avg'] == 300
+    assert date.fromisoformat(data['days'][0]['date']) == datetime.utcnow().date() - timedelta(days=6)
@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from app.catalog import food_catalog, query_cache
+
+GOALS = {'calorie_goal': 1800, 'protein_goal': 140, 'fat_goal': 60, 'carbs_goal': 200}
+FOOD = {'name': 'Oats', 'calories_per_100g': '350', 'protein_per_100g': '13', 'fat_per_100g': '7',
+        'carbs_per_100g': '60', 'amount': '100'}
+
+CATALOG_PAGES = [
+    '/high_protein?min_protein_ratio=0.05&sort_by=name',
+    '/api/foods/query?where=protein>=10&sort=-protein&limit=5',
+]
+
+
+def revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def assert_private(response, max_age):
+    assert response.cache_control.private
+    assert response.cache_control.max_age == max_age
+    assert 'Cookie' in response.vary
+
+
+def test_home_is_private_and_revalidated(client):
+    response = client.get('/home')
+    assert response.status_code == 200
+    assert_private(response, 0)
+    assert response.cache_control.no_cache
+
+    etag = response.headers['ETag']
+    repeated = revalidate(client, '/home', etag)
+    assert repeated.status_code == 304
+    assert repeated.data == b''
+    assert repeated.headers['ETag'] == etag
+    assert_private(repeated, 0)
+
+
+@pytest.mark.parametrize('change', [
+    lambda client: client.post('/log_food', data=FOOD),
+    lambda client: client.post('/set_goals', data=GOALS),
+])
+def test_home_etag_changes_with_the_data(client, change):
+    etag = client.get('/home').headers['ETag']
+    change(client)
+
+    response = revalidate(client, '/home', etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert revalidate(client, '/home', response.headers['ETag']).status_code == 304
+
+
+def test_home_etag_is_per_user(app, client):
+    etag = client.get('/home').headers['ETag']
+
+    other = app.test_client()
+    other.post('/register', data={'username': 'bob', 'email': 'bob@example.com', 'password': 'secret',
+                                  'confirm_password': 'secret'})
+    other.post('/login', data={'email': 'bob@example.com', 'password': 'secret'})
+    assert revalidate(other, '/home', etag).status_code == 200
+
+
+def test_failed_log_keeps_the_etag(client):
+    etag = client.get('/home').headers['ETag']
+    client.post('/log_food', data=dict(FOOD, amount='nan'))
+    assert revalidate(client, '/home', etag).status_code == 304
+
+
+@pytest.mark.parametrize('url', CATALOG_PAGES)
+def test_catalog_pages_are_cached_for_a_while(client, catalog, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert_private(response, 300)
+    assert not response.cache_control.no_cache
+
+    repeated = revalidate(client, url, response.headers['ETag'])
+    assert repeated.status_code == 304
+    assert_private(repeated, 300)
+
+
+@pytest.mark.parametrize('url, other', [
+    (CATALOG_PAGES[0], '/high_protein?min_protein_ratio=0.07&sort_by=name'),
+    (CATALOG_PAGES[0], '/high_protein?min_protein_ratio=0.05&sort_by=name&search_term=kana'),
+    (CATALOG_PAGES[1], '/api/foods/query?where=protein>=10&sort=-protein&limit=6'),
+    (CATALOG_PAGES[1], '/api/foods/query?where=protein>=10&sort=protein&limit=5'),
+])
+def test_catalog_etag_changes_with_the_query(client, catalog, url, other):
+    etag = client.get(url).headers['ETag']
+    assert revalidate(client, other, etag).status_code == 200
+
+
+@pytest.mark.parametrize('url', CATALOG_PAGES)
+def test_catalog_etag_changes_with_the_catalog_version(client, catalog, url):
+    etag = client.get(url).headers['ETag']
+
+    with open(food_catalog.file_path, 'wb') as workbook:
+        workbook.write(b'other sample foods')
+    stat = os.stat(food_catalog.file_path)
+    os.utime(food_catalog.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    response = revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_invalid_high_protein_query_is_not_cached(client, catalog):
+    response = client.get('/high_protein?min_protein_ratio=abc')
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+@pytest.mark.parametrize('sort_by', ['', 'ratio', 'Protein_To_Calories', 'name%20'])
+def test_unknown_sort_orders_share_the_default_entry(client, catalog, sort_by):
+    url = '/high_protein?min_protein_ratio=0.05'
+    default = client.get(url + '&sort_by=protein_to_calories')
+    assert query_cache.stats()['size'] == 1
+    misses = query_cache.stats()['misses']
+
+    response = client.get(f'{url}&sort_by={sort_by}')
+    assert response.headers['ETag'] == default.headers['ETag']
+    assert revalidate(client, f'{url}&sort_by={sort_by}', default.headers['ETag']).status_code == 304
+    assert client.get(url).headers['ETag'] == default.headers['ETag']
+    assert query_cache.stats()['size'] == 1
+    assert query_cache.stats()['misses'] == misses
+
+
+def test_known_sort_orders_have_their_own_entries(client, catalog):
+    url = '/high_protein?min_protein_ratio=0.05&sort_by='
+    by_ratio = client.get(url + 'protein_to_calories')
+    by_name = client.get(url + 'name')
+
+    assert by_ratio.headers['ETag'] != by_name.headers['ETag']
+    assert query_cache.stats()['size'] == 2
+
+
+def test_api_shares_the_page_cache_entry(client, catalog):
+    client.get('/high_protein?min_protein_ratio=0.05&sort_by=name')
+    client.get('/api/high_protein?min_protein_ratio=0.05&sort_by=name')
+    client.get('/api/high_protein?min_protein_ratio=0.050&sort_by=name&search_term=%20')
+    assert query_cache.stats()['size'] == 1
@@ -0,0 +1,103 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.identity import USER_CACHE_SYNC_SECONDS, USER_CACHE_TTL, user_cache, user_changes
+from app.models import UserChange
+
+GOALS = {'calorie_goal': 1800, 'protein_goal': 140, 'fat_goal': 60, 'carbs_goal': 200}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Moves time.monotonic forward on demand, to let the next change log sync fall due."""
+    offset = [0.0]
+    monotonic = time.monotonic
+    monkeypatch.setattr(time, 'monotonic', lambda: monotonic() + offset[0])
+
+    def advance(seconds):
+        offset[0] += seconds
+    return advance
+
+
+def login(app):
+    client = app.test_client()
+    client.post('/login', data={'email': 'alice@example.com', 'password': 'password'})
+    return client
+
+
+def other_worker_keeps_its_cache(change):
+    # Another worker process keeps what it cached before the change, as set_goals
+    # only invalidates the cache of the process that handled it
+    cached = {key: value for key, (value, _, _) in user_cache._entries.items()}
+    change()
+    for key, value in cached.items():
+        user_cache.set(key, value)
+
+
+def test_goal_change_reaches_other_browsers_and_workers(app, user, clock):
+    first, second = login(app), login(app)
+    before = second.get('/home')
+    assert b'2000 kcal' in first.get('/home').data
+    assert b'2000 kcal' in before.data
+
+    other_worker_keeps_its_cache(lambda: first.post('/set_goals', data=GOALS))
+
+    clock(USER_CACHE_SYNC_SECONDS + 0.1)
+    for client in (second, first, login(app)):
+        response = client.get('/home', headers={'If-None-Match': before.headers['ETag']})
+        assert response.status_code == 200
+        assert b'1800 kcal' in response.data
+
+
+def test_stale_copies_last_at_most_one_sync_interval(app, user, clock):
+    first, second = login(app), login(app)
+    second.get('/home')
+
+    other_worker_keeps_its_cache(lambda: first.post('/set_goals', data=GOALS))
+    assert b'2000 kcal' in second.get('/home').data
+
+    clock(USER_CACHE_SYNC_SECONDS + 0.1)
+    assert b'1800 kcal' in second.get('/home').data
+
+
+def test_goal_change_is_logged_with_the_goals(app, user):
+    login(app).post('/set_goals', data=GOALS)
+    with app.app_context():
+        assert [change.user_id for change in UserChange.query] == [user]
+
+
+def test_invalid_goals_log_no_change(app, user):
+    login(app).post('/set_goals', data=dict(GOALS, fat_goal='lots'))
+    with app.app_context():
+        assert UserChange.query.count() == 0
+
+
+def test_expired_changes_are_pruned(app, user):
+    with app.app_context():
+        old = datetime.utcnow() - timedelta(seconds=USER_CACHE_TTL + 60)
+        recent = datetime.utcnow() - timedelta(seconds=USER_CACHE_TTL - 60)
+        db.session.add_all([UserChange(user_id=user, changed_at=old), UserChange(user_id=user, changed_at=recent)])
+        db.session.commit()
+
+    login(app).post('/set_goals', data=GOALS)
+    with app.app_context():
+        assert [change.changed_at >= recent for change in UserChange.query.order_by(UserChange.id)] == [True, True]
+
+
+def test_first_sync_starts_after_the_existing_changes(app, user, clock):
+    with app.app_context():
+        db.session.add_all([UserChange(user_id=user), UserChange(user_id=user)])
+        db.session.commit()
+
+    client = login(app)
+    client.get('/home')
+    assert user_changes._last_id == 2
+
+    # Nothing changed since, so the cached user keeps being used
+    hits = user_cache.stats()['hits']
+    clock(USER_CACHE_SYNC_SECONDS + 0.1)
+    client.get('/home')
+    assert user_cache.stats()['hits'] == hits + 1
@@ -0,0 +1,138 @@
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, JobRunner, _handlers, job_runner
+from app.models import Job
+
+
+def wait_for_status(app, job_id, status, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            if job.status == status:
+                return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} did not reach {status}, it is {job.status}')
+
+
+def test_runner_keeps_claiming_after_a_claim_fails(app):
+    runner = JobRunner()
+    runner.init_app(app)
+    runner.poll_interval = 0.05
+
+    claim = runner._claim
+    failures = []
+
+    def failing_claim():
+        # The first poll fails as it would with a database locked by another writer
+        if not failures:
+            failures.append(True)
+            raise OperationalError('UPDATE job', {}, sqlite3.OperationalError('database is locked'))
+        return claim()
+
+    runner._claim = failing_claim
+    runner.start(workers=1)
+
+    with app.app_context():
+        deadline = time.monotonic() + 5.0
+        while not failures and time.monotonic() < deadline:
+            time.sleep(0.01)
+        job_id = runner.submit('recompute_totals').id
+
+    job = wait_for_status(app, job_id, SUCCEEDED)
+    assert failures
+    assert job.attempts == 1
+
+
+@pytest.fixture
+def upload(tmp_path):
+    path = str(tmp_path / 'upload.csv')
+    with open(path, 'w') as stream:
+        stream.write('date,name,calories,protein,fat,carbs\n')
+    return path
+
+
+def queue_import(app, user, path, max_attempts=1):
+    with app.app_context():
+        return job_runner.submit('import_food_log', {'user_id': user, 'path': path, 'file_format': 'csv'}, user,
+                                 max_attempts=max_attempts).id
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def orphan(app, job_id, attempts):
+    # Left running by a process of this host that has exited
+    with app.app_context():
+        job = db.session.get(Job, job_id)
+        job.status, job.attempts = RUNNING, attempts
+        job.owner, job.started_at = f'{socket.gethostname()}:{exited_pid()}', datetime.utcnow()
+        db.session.commit()
+
+
+def test_orphaned_import_removes_its_upload(app, user, upload):
+    job_id = queue_import(app, user, upload)
+    orphan(app, job_id, attempts=1)
+
+    with app.app_context():
+        job_runner._requeue_orphans()
+        assert db.session.get(Job, job_id).status == FAILED
+    assert not os.path.exists(upload)
+
+
+def test_requeued_import_keeps_its_upload(app, user, upload):
+    job_id = queue_import(app, user, upload, max_attempts=2)
+    orphan(app, job_id, attempts=1)
+
+    with app.app_context():
+        job_runner._requeue_orphans()
+        assert db.session.get(Job, job_id).status == QUEUED
+    assert os.path.exists(upload)
+
+
+@pytest.mark.parametrize('max_attempts, exists', [(1, False), (2, True)])
+def test_failed_import_removes_its_upload(app, user, upload, monkeypatch, max_attempts, exists):
+    def crash(context, **params):
+        raise RuntimeError('crashed before reading the file')
+
+    monkeypatch.setitem(_handlers, 'import_food_log', crash)
+    runner = JobRunner()
+    runner.init_app(app)
+    runner._slots = threading.Semaphore(0)
+
+    job_id = queue_import(app, user, upload, max_attempts)
+    runner._run(job_id, 'import_food_log', {'user_id': user, 'path': upload, 'file_format': 'csv'}, 1, max_attempts)
+
+    with app.app_context():
+        assert db.session.get(Job, job_id).status == (QUEUED if exists else FAILED)
+    assert os.path.exists(upload) is exists
+
+
+def test_maintenance_job_status(app, user):
+    with app.app_context():
+        job_id = job_runner.submit('recompute_totals').id
+        user_job_id = job_runner.submit('recompute_totals', {'user_id': user}, user).id
+
+    client = app.test_client()
+    response = client.get(f'/api/maintenance/jobs/{job_id}')
+    assert response.status_code == 200
+    assert response.get_json()['type'] == 'recompute_totals'
+    assert response.get_json()['status'] == QUEUED
+
+    assert client.get(f'/api/maintenance/jobs/{user_job_id}').status_code == 404
+    assert client.get(f'/api/maintenance/jobs/{job_id}',
+                      environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 403
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+from app import db
+from app.models import DailyTotals, FoodEntry
+
+FORM = {'name': 'Oats', 'calories_per_100g': '370', 'protein_per_100g': '13', 'fat_per_100g': '7',
+        'carbs_per_100g': '60', 'amount': '80'}
+
+
+def test_logs_an_entry_and_its_totals(app, client):
+    response = client.post('/log_food', data=FORM)
+    assert response.status_code == 200
+
+    with app.app_context():
+        entry = FoodEntry.query.one()
+        assert entry.calories == pytest.approx(296)
+        totals = db.session.get(DailyTotals, (entry.user_id, datetime.utcnow().date()))
+        assert totals.calories == pytest.approx(296)
+        assert totals.entry_count == 1
+
+
+def assert_nothing_logged(app):
+    with app.app_context():
+        assert FoodEntry.query.count() == 0
+        assert DailyTotals.query.count() == 0
+
+
+@pytest.mark.parametrize('field', ['calories_per_100g', 'protein_per_100g', 'fat_per_100g', 'carbs_per_100g',
+                                   'amount'])
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', 'Infinity', '-1'])
+def test_rejects_values_that_are_not_finite_and_non_negative(app, client, field, value):
+    response = client.post('/log_food', data=dict(FORM, **{field: value}))
+    assert response.status_code == 302
+    assert_nothing_logged(app)
+
+
+def test_rejects_totals_that_overflow(app, client):
+    response = client.post('/log_food', data=dict(FORM, calories_per_100g='1e308', amount='1e308'))
+    assert response.status_code == 302
+    assert_nothing_logged(app)
@@ -0,0 +1,216 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from app import db
+from app.meals import ITEM_FIELDS, MAX_MEAL_ITEMS, log_meal, parse_meal_items, save_meal
+from app.models import DailyTotals, FoodEntry, SavedMeal, User
+from app.totals import MACROS, recompute_daily_totals
+
+DAY = date(2026, 3, 2)
+
+
+def form(*rows, **fields):
+    """Meal form data with one dictionary per ingredient row; missing fields are left empty."""
+    data = MultiDict(fields)
+    for row in rows:
+        for field in ITEM_FIELDS:
+            data.add(field, str(row.get(field.replace('item_', ''), '')))
+    return data
+
+
+def manual(name='Kaurapuuro', grams=250, calories=70, protein=2.5, fat=1.5, carbs=11):
+    return {'name': name, 'grams': grams, 'calories_per_100g': calories, 'protein_per_100g': protein,
+            'fat_per_100g': fat, 'carbs_per_100g': carbs}
+
+
+def totals_row(user_id, day):
+    row = db.session.get(DailyTotals, (user_id, day))
+    return None if row is None else [row.calories, row.protein, row.fat, row.carbs, row.entry_count]
+
+
+def test_manual_items_are_scaled_to_the_amount(food_table):
+    items = parse_meal_items(form(manual(), manual('Mustikka', 50, 40, 0.5, 0.5, 7)), food_table)
+
+    assert [item['position'] for item in items] == [0, 1]
+    assert items[0] == {'position': 0, 'food_id': None, 'name': 'Kaurapuuro', 'grams': 250.0,
+                        'calories': 175.0, 'protein': 6.25, 'fat': 3.75, 'carbs': 27.5}
+    assert items[1]['calories'] == 20.0
+
+
+def test_catalog_items_fill_in_blank_values(food_table):
+    row = next(row for row in range(len(food_table)) if not np.isnan(food_table.matrix[row, :4]).any())
+    food_id = int(food_table.ids[row])
+    per_100g = food_table.per_100g(row)
+
+    items = parse_meal_items(form({'food_id': food_id, 'grams': 200},
+                                  {'food_id': food_id, 'name': 'Oma nimi', 'grams': 50, 'fat_per_100g': 1}),
+                             food_table)
+
+    assert items[0]['name'] == food_table.names[row]
+    assert items[0]['food_id'] == food_id
+    assert [items[0][macro] for macro in MACROS] == pytest.approx([per_100g[macro] * 2 for macro in MACROS])
+    assert items[1]['name'] == 'Oma nimi'
+    assert items[1]['fat'] == 0.5
+    assert items[1]['calories'] == pytest.approx(per_100g['calories'] / 2)
+
+
+def test_catalog_values_fineli_does_not_report_count_as_zero(food_table):
+    row = next(row for row in range(len(food_table)) if np.isnan(food_table.columns['Protein'][row]))
+    items = parse_meal_items(form({'food_id': int(food_table.ids[row]), 'grams': 100}), food_table)
+    assert items[0]['protein'] == 0
+
+
+def test_empty_rows_are_skipped(food_table):
+    items = parse_meal_items(form({}, manual(), {}, {'food_id': 3}), food_table)
+    assert [item['name'] for item in items] == ['Kaurapuuro']
+
+
+def test_long_names_are_cut(food_table):
+    items = parse_meal_items(form(manual('x' * 150)), food_table)
+    assert items[0]['name'] == 'x' * 100
+
+
+@pytest.mark.parametrize('row, message', [
+    (dict(manual(), name=''), 'Ingredient 1: name is required'),
+    (dict(manual(), grams=''), 'Ingredient 1: amount must be a number'),
+    (dict(manual(), grams=0), 'Ingredient 1: amount must be more than 0 g'),
+    (dict(manual(), grams=-5), 'Ingredient 1: amount must be a non-negative number'),
+    (dict(manual(), grams='nan'), 'Ingredient 1: amount must be a non-negative number'),
+    (dict(manual(), calories_per_100g='inf'), 'Ingredient 1: calories per 100 g must be a non-negative number'),
+    (dict(manual(), protein_per_100g='-Infinity'), 'Ingredient 1: protein per 100 g must be a non-negative'),
+    (dict(manual(), fat_per_100g=''), 'Ingredient 1: fat per 100 g must be a number'),
+    (dict(manual(), carbs_per_100g='lots'), 'Ingredient 1: carbs per 100 g must be a number'),
+    (dict(manual(), food_id=2), 'Ingredient 1: unknown catalog food'),
+    (dict(manual(), food_id=10 ** 9), 'Ingredient 1: unknown catalog food'),
+    (dict(manual(), food_id='abc'), 'Ingredient 1: unknown catalog food'),
+    (dict(manual(), food_id=-3), 'Ingredient 1: unknown catalog food'),
+])
+def test_invalid_rows_are_rejected(food_table, row, message):
+    with pytest.raises(ValueError, match=message):
+        parse_meal_items(form(row), food_table)
+
+
+def test_rows_are_numbered_as_on_the_form(food_table):
+    with pytest.raises(ValueError, match='Ingredient 3: name is required'):
+        parse_meal_items(form(manual(), {}, dict(manual(), name='')), food_table)
+
+
+def test_meal_needs_ingredients(food_table):
+    with pytest.raises(ValueError, match='at least one ingredient'):
+        parse_meal_items(form({}, {}), food_table)
+
+
+def test_meal_ingredients_are_limited(food_table):
+    parse_meal_items(form(*[manual()] * MAX_MEAL_ITEMS), food_table)
+    with pytest.raises(ValueError, match=f'at most {MAX_MEAL_ITEMS} ingredients'):
+        parse_meal_items(form(*[manual()] * (MAX_MEAL_ITEMS + 1)), food_table)
+
+
+@pytest.fixture
+def meal(app, user, food_table):
+    """A saved meal of three ingredients, in an app context."""
+    items = parse_meal_items(form(manual(), manual('Mustikka', 50, 40, 0.5, 0.5, 7),
+                                  manual('Rahka', 125, 60, 10, 0.2, 4)), food_table)
+    with app.app_context():
+        meal = save_meal(db.session, user, 'Aamupala', items)
+        db.session.commit()
+        yield meal
+
+
+def test_saved_totals_are_the_sum_of_the_items(meal):
+    assert meal.item_count == 3
+    for macro in MACROS:
+        assert getattr(meal, macro) == pytest.approx(sum(getattr(item, macro) for item in meal.items))
+    assert [item.name for item in meal.items] == ['Kaurapuuro', 'Mustikka', 'Rahka']
+
+
+@pytest.mark.parametrize('servings', [1.0, 0.5, 2.5])
+def test_logged_totals_match_the_entries(meal, user, servings):
+    assert log_meal(db.session, meal, DAY, servings) == 3
+    db.session.commit()
+
+    entries = FoodEntry.query.filter_by(user_id=user, date=DAY).order_by(FoodEntry.id).all()
+    assert [entry.name for entry in entries] == ['Kaurapuuro', 'Mustikka', 'Rahka']
+    for entry, item in zip(entries, meal.items):
+        for macro in MACROS:
+            assert getattr(entry, macro) == pytest.approx(getattr(item, macro) * servings)
+
+    per_item = [sum(getattr(entry, macro) for entry in entries) for macro in MACROS] + [3]
+    assert totals_row(user, DAY) == pytest.approx(per_item)
+
+    # Same totals as summing the entries from scratch
+    maintained = totals_row(user, DAY)
+    recompute_daily_totals(db.session, user)
+    db.session.commit()
+    assert totals_row(user, DAY) == pytest.approx(maintained)
+
+
+def test_logging_adds_to_the_day(meal, user):
+    db.session.add(FoodEntry(user_id=user, date=DAY, name='Kahvi', calories=5, protein=0.3, fat=0, carbs=0.5))
+    db.session.commit()
+
+    log_meal(db.session, meal, DAY)
+    log_meal(db.session, meal, DAY, 2)
+    db.session.commit()
+
+    assert totals_row(user, DAY)[0] == pytest.approx(5 + meal.calories * 3)
+    assert totals_row(user, DAY)[-1] == 7
+
+
+def test_meal_without_items_logs_nothing(app, user):
+    with app.app_context():
+        meal = SavedMeal(user_id=user, name='Tyhjä')
+        db.session.add(meal)
+        db.session.commit()
+        assert log_meal(db.session, meal, DAY) == 0
+        assert totals_row(user, DAY) is None
+
+
+def test_save_and_log_through_the_pages(app, client, user, catalog):
+    response = client.post('/meals', data=form(manual(), manual('Mustikka', 50, 40, 0.5, 0.5, 7),
+                                               meal_name='Aamupala'))
+    assert response.status_code == 302
+
+    with app.app_context():
+        meal_id = SavedMeal.query.filter_by(user_id=user, name='Aamupala').one().id
+
+    assert client.post(f'/meals/{meal_id}/log', data={'servings': '2'}).status_code == 302
+    today = datetime.utcnow().date()
+    with app.app_context():
+        assert totals_row(user, today) == pytest.approx([390, 13, 8, 62, 2])
+
+
+@pytest.mark.parametrize('servings', ['0', '-1', '101', 'nan', 'inf', 'two'])
+def test_invalid_servings_are_rejected(app, client, user, meal, servings):
+    client.post(f'/meals/{meal.id}/log', data={'servings': servings})
+    with app.app_context():
+        assert FoodEntry.query.count() == 0
+
+
+def test_duplicate_meal_name_is_rejected(app, client, user, catalog):
+    client.post('/meals', data=form(manual(), meal_name='Aamupala'))
+    response = client.post('/meals', data=form(manual('Mustikka'), meal_name='Aamupala'))
+
+    assert response.status_code == 200
+    with client.session_transaction() as session:
+        assert 'already have a meal called "Aamupala"' in session['_flashes'][-1][1]
+    with app.app_context():
+        assert [item.name for item in SavedMeal.query.one().items] == ['Kaurapuuro']
+
+
+def test_other_users_meals_are_not_found(app, client, meal):
+    with app.app_context():
+        other = User(username='bob', email='bob@example.com', password_hash='x')
+        db.session.add(other)
+        db.session.commit()
+        item = {'position': 0, 'food_id': None, 'name': 'Kahvi', 'grams': 200.0, 'calories': 4.0,
+                'protein': 0.2, 'fat': 0.0, 'carbs': 0.6}
+        other_meal = save_meal(db.session, other.id, 'Aamupala', [item])
+        db.session.commit()
+        other_id = other_meal.id
+
+    assert client.post(f'/meals/{other_id}/log').status_code == 404
+    assert client.post(f'/meals/{other_id}/delete').status_code == 404
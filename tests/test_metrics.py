@@ -0,0 +1,126 @@
+import os
+
+import pytest
+
+from app import create_app, metrics
+from app.config import load_config
+
+
+@pytest.fixture
+def profiled_app(app, tmp_path):
+    app.config.update(PROFILE_REQUESTS=True, PROFILE_DIR=str(tmp_path / 'profiles'))
+
+    @app.route('/fails')
+    def fails():
+        raise RuntimeError('fails')
+
+    app.config['PROPAGATE_EXCEPTIONS'] = False
+    return app
+
+
+def profiles(app):
+    directory = app.config['PROFILE_DIR']
+    return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+
+def skipped():
+    return next((value for _, _, value in metrics.profiles_skipped.samples()), 0)
+
+
+def test_settings_are_read_from_the_environment():
+    config = load_config({'PROFILE_REQUESTS': 'yes', 'PROFILE_MIN_SECONDS': '0.25', 'PROFILE_DIR': '/tmp/prof',
+                          'OPS_ALLOWED_IPS': '10.0.0.1, 10.0.0.2,', 'OPS_TOKEN': 'secret'})
+    assert config['PROFILE_REQUESTS'] is True
+    assert config['PROFILE_MIN_SECONDS'] == 0.25
+    assert config['PROFILE_DIR'] == '/tmp/prof'
+    assert config['OPS_ALLOWED_IPS'] == ['10.0.0.1', '10.0.0.2']
+    assert config['OPS_TOKEN'] == 'secret'
+
+
+def test_defaults():
+    config = load_config({})
+    assert config['PROFILE_REQUESTS'] is False
+    assert config['PROFILE_MIN_SECONDS'] == 0.0
+    assert config['PROFILE_DIR'] is None
+    assert config['OPS_ALLOWED_IPS'] == ['127.0.0.1', '::1']
+    assert config['OPS_TOKEN'] is None
+
+
+def test_create_app_uses_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv('PROFILE_REQUESTS', '1')
+    monkeypatch.setenv('OPS_TOKEN', 'secret')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "env.db"}', 'JOB_WORKERS': 0})
+    assert app.config['PROFILE_REQUESTS'] is True
+    assert app.config['OPS_TOKEN'] == 'secret'
+
+
+@pytest.mark.parametrize('remote_addr, headers, token, status', [
+    ('127.0.0.1', {}, None, 200),
+    ('::1', {}, None, 200),
+    ('10.1.2.3', {}, None, 403),
+    ('10.1.2.3', {'Authorization': 'Bearer '}, None, 403),
+    ('10.1.2.3', {'Authorization': 'Bearer '}, '', 403),
+    ('10.1.2.3', {'Authorization': 'Bearer secret'}, 'secret', 200),
+    ('10.1.2.3', {'Authorization': 'bearer secret'}, 'secret', 200),
+    ('10.1.2.3', {'Authorization': 'Bearer wrong'}, 'secret', 403),
+    ('10.1.2.3', {'Authorization': 'Basic secret'}, 'secret', 403),
+    ('10.1.2.3', {'Authorization': 'secret'}, 'secret', 403),
+])
+def test_metrics_access(app, remote_addr, headers, token, status):
+    app.config['OPS_TOKEN'] = token
+    response = app.test_client().get('/metrics', headers=headers, environ_base={'REMOTE_ADDR': remote_addr})
+    assert response.status_code == status
+    if status == 200:
+        assert '# TYPE http_request_duration_seconds histogram' in response.get_data(as_text=True)
+
+
+def test_allowlist_is_configurable(app):
+    app.config['OPS_ALLOWED_IPS'] = ['10.1.2.3']
+    client = app.test_client()
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '10.1.2.3'}).status_code == 200
+    assert client.get('/metrics').status_code == 403
+
+
+def test_profiles_are_written(profiled_app):
+    client = profiled_app.test_client()
+    client.get('/login')
+    client.get('/login')
+
+    written = profiles(profiled_app)
+    assert len(written) == 2
+    assert all('-main.login-' in name and name.endswith('.prof') for name in written)
+    assert not metrics._profile_lock.locked()
+
+
+def test_fast_requests_are_not_kept(profiled_app):
+    profiled_app.config['PROFILE_MIN_SECONDS'] = 60.0
+    profiled_app.test_client().get('/login')
+    assert profiles(profiled_app) == []
+    assert not metrics._profile_lock.locked()
+
+
+def test_only_one_request_is_profiled_at_a_time(profiled_app):
+    before = skipped()
+    # Another thread is profiling its request
+    assert metrics._profile_lock.acquire(blocking=False)
+    try:
+        response = profiled_app.test_client().get('/login')
+        assert response.status_code == 200
+        assert profiles(profiled_app) == []
+        assert skipped() == before + 1
+        assert metrics._profile_lock.locked()
+    finally:
+        metrics._profile_lock.release()
+
+    profiled_app.test_client().get('/login')
+    assert len(profiles(profiled_app)) == 1
+    assert skipped() == before + 1
+
+
+def test_profiler_is_released_after_an_error(profiled_app):
+    client = profiled_app.test_client()
+    assert client.get('/fails').status_code == 500
+    assert not metrics._profile_lock.locked()
+
+    client.get('/login')
+    assert any('-main.login-' in name for name in profiles(profiled_app))
@@ -0,0 +1,246 @@
+import math
+import operator
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pytest
+
+from app.nutrient_query import MAX_PREDICATES, MAX_SORT_KEYS, NAME, Expression
+
+COMPARE = {'>=': operator.ge, '<=': operator.le, '>': operator.gt, '<': operator.lt, '=': operator.eq,
+           '!=': operator.ne}
+
+QUERIES = [
+    (['fiber>=3'], ['-fiber']),
+    (['protein/calories>=0.05'], ['-protein/calories']),
+    (['protein/kcal>0.1', 'fat<=10'], ['protein/calories', '-fat']),
+    (['fat/kcal<=0.05, sodium<200'], ['name']),
+    (['carbs=0'], ['-sodium', '-protein']),
+    (['fiber!=3'], ['fiber']),
+    (['calories>=0'], ['-protein/calories', 'name']),
+    ([], ['-carbs/protein']),
+    ([], []),
+]
+
+
+@pytest.fixture
+def engine(food_table):
+    return food_table.nutrient_query
+
+
+def python_values(table, expression):
+    # One row at a time: a missing value or 0/0 has no value, x/0 is infinite
+    values = []
+    for row in range(len(table)):
+        numerator = float(table.columns[expression.numerator][row])
+        if expression.denominator is None:
+            values.append(numerator)
+            continue
+        denominator = float(table.columns[expression.denominator][row])
+        if math.isnan(numerator) or math.isnan(denominator) or numerator == denominator == 0:
+            values.append(math.nan)
+        elif denominator == 0:
+            values.append(math.inf)
+        else:
+            values.append(numerator / denominator)
+    return values
+
+
+def python_select(table, query):
+    columns = [(python_values(table, expression), op, value) for expression, op, value in query.predicates]
+    return [row for row in range(len(table))
+            if all(not math.isnan(values[row]) and COMPARE[op](values[row], value) for values, op, value in columns)]
+
+
+def python_order(engine, query, rows):
+    names = [str(name) for name in engine.table.names]
+    columns = {key: python_values(engine.table, key) for key, _ in query.sort if key is not NAME}
+
+    def sort_key(row):
+        parts = []
+        for key, descending in query.sort:
+            value = names[row] if key is NAME else columns[key][row]
+            if key is NAME:
+                parts.append((0, value))
+            elif math.isnan(value):
+                # Rows without a value come last, in either direction
+                parts.append((1, 0))
+            else:
+                parts.append((0, -value if descending else value))
+        return parts + [(0, names[row])]
+
+    return sorted(rows, key=sort_key)
+
+
+@pytest.mark.parametrize('where, sort', QUERIES)
+def test_select_matches_a_row_scan(engine, where, sort):
+    query = engine.parse(where, sort)
+    assert engine.select(query).tolist() == python_select(engine.table, query)
+
+
+@pytest.mark.parametrize('where, sort', QUERIES)
+def test_order_matches_a_python_sort(engine, where, sort):
+    query = engine.parse(where, sort)
+    rows = engine.select(query)
+    ordered = engine.order(query, rows).tolist()
+
+    # Repeated names keep their table order, in both
+    assert ordered == python_order(engine, query, rows.tolist())
+
+
+@pytest.mark.parametrize('where, sort', QUERIES)
+@pytest.mark.parametrize('limit', [1, 2, 5, 17, 100, 399, 400, 1000])
+def test_top_k_matches_the_full_order(engine, where, sort, limit):
+    # The sample foods take few distinct values, so the k-th value is usually tied
+    query = engine.parse(where, sort)
+    rows = engine.select(query)
+    assert engine.order(query, rows, limit).tolist() == engine.order(query, rows)[:limit].tolist()
+
+
+def test_top_k_with_the_threshold_inside_a_tie(engine):
+    query = engine.parse([], ['-carbs'])
+    carbs = engine.values(Expression('Carbs'))
+    ties = int(np.count_nonzero(carbs == np.nanmax(carbs)))
+    assert ties > 3
+
+    rows = np.arange(len(engine.table))
+    top = engine.order(query, rows, ties - 2)
+    assert top.tolist() == engine.order(query, rows)[:ties - 2].tolist()
+    assert np.all(carbs[top] == np.nanmax(carbs))
+    names = [str(engine.table.names[row]) for row in top]
+    assert names == sorted(names)
+
+
+def test_top_k_reaching_rows_without_a_value(engine):
+    query = engine.parse([], ['-fiber'])
+    fiber = engine.values(Expression('Fiber'))
+    known = int(np.count_nonzero(~np.isnan(fiber)))
+    rows = np.arange(len(engine.table))
+
+    top = engine.order(query, rows, known + 3)
+    assert top.tolist() == engine.order(query, rows)[:known + 3].tolist()
+    assert np.isnan(fiber[top[-3:]]).all()
+
+
+def test_ratio_values_match_the_protein_index(food_table, engine):
+    values = engine.values(Expression('Protein', 'Calories'))
+    np.testing.assert_array_equal(values, food_table.protein_index.ratio)
+    assert np.isinf(values).any()
+    assert np.isnan(values).any()
+
+
+def test_ratio_values_over_rows(engine):
+    rows = np.array([5, 1, 7])
+    expression = Expression('Fat', 'Calories')
+    np.testing.assert_array_equal(engine.values(expression, rows), engine.values(expression)[rows])
+    assert engine.values(expression, rows).tolist() == pytest.approx(
+        [python_values(engine.table, expression)[row] for row in rows], nan_ok=True)
+
+
+@pytest.mark.parametrize('min_protein_ratio', ['0', '0.05', '0.2', '10'])
+def test_nutrient_query_keeps_the_foods_of_the_protein_index(client, catalog, min_protein_ratio):
+    # "where" turns the page into a nutrient query; a condition every food meets must not change the result
+    url = f'/api/high_protein?min_protein_ratio={min_protein_ratio}&page_size=500'
+    plain = client.get(url).get_json()
+    queried = client.get(url + '&where=calories>=0&order=-protein/calories').get_json()
+
+    assert queried['total'] == plain['total']
+    assert sorted(item['Name'] for item in queried['items']) == sorted(item['Name'] for item in plain['items'])
+    ratios = [item['Protein_to_Calories'] for item in queried['items']]
+    assert ratios == sorted(ratios, reverse=True)
+
+
+def test_records_keep_infinite_ratios(food_table, engine):
+    expression = Expression('Protein', 'Calories')
+    rows = np.flatnonzero(~np.isfinite(engine.values(expression)))
+    records = engine.records(rows, [expression])
+    values = [record['protein/calories'] for record in records]
+    assert math.inf in values
+    assert None in values
+    assert all(value is None or value == math.inf for value in values)
+
+
+@pytest.mark.parametrize('where, predicates', [
+    (['fiber>=3'], [('fiber', '>=', 3.0)]),
+    (['Fiber >= 3.0'], [('fiber', '>=', 3.0)]),
+    (['kcal<200;energy>10'], [('calories', '<', 200.0), ('calories', '>', 10.0)]),
+    (['fat/kcal<=.05, sodium<2e2'], [('fat/calories', '<=', 0.05), ('sodium', '<', 200.0)]),
+    (['fibre==0', 'carbohydrates!=-1'], [('fiber', '=', 0.0), ('carbs', '!=', -1.0)]),
+    (['', ' , '], []),
+])
+def test_parse_predicates(engine, where, predicates):
+    query = engine.parse(where)
+    assert [(expression.label, op, value) for expression, op, value in query.predicates] == predicates
+    assert query.sort == [(NAME, False)]
+
+
+@pytest.mark.parametrize('sort, keys', [
+    (['-fiber'], [('fiber', True)]),
+    (['name, -protein/kcal'], [('name', False), ('protein/calories', True)]),
+    (['+fat', 'NAME'], [('fat', False), ('name', False)]),
+])
+def test_parse_sort_keys(engine, sort, keys):
+    query = engine.parse([], sort)
+    assert [(key if key is NAME else key.label, descending) for key, descending in query.sort] == keys
+
+
+@pytest.mark.parametrize('where, sort, message', [
+    (['fiber>'], [], 'Invalid condition'),
+    (['fiber>=three'], [], 'Invalid condition'),
+    (['fiber>=3>2'], [], 'Invalid condition'),
+    (['fiber=>3'], [], 'Invalid condition'),
+    (['fiber>=inf'], [], 'Invalid condition'),
+    (['fiber>=nan'], [], 'Invalid condition'),
+    (['gluten>=3'], [], 'Unknown nutrient "gluten"'),
+    (['name>=3'], [], 'Unknown nutrient "name"'),
+    ([], ['--fiber'], 'Invalid sort key'),
+    ([], ['fiber/'], 'Invalid sort key'),
+    ([], ['name/fiber'], 'Unknown nutrient "name"'),
+    ([','.join(['fiber>=1'] * (MAX_PREDICATES + 1))], [], 'limited'),
+    ([], [','.join(['fiber'] * (MAX_SORT_KEYS + 1))], 'limited'),
+])
+def test_parse_rejects(engine, where, sort, message):
+    with pytest.raises(ValueError, match=message):
+        engine.parse(where, sort)
+
+
+@pytest.mark.parametrize('values, message', [
+    (['-fiber'], 'Invalid nutrient'),
+    (['fiber>=3'], 'Invalid nutrient'),
+    (['gluten'], 'Unknown nutrient'),
+])
+def test_parse_expressions_rejects(engine, values, message):
+    with pytest.raises(ValueError, match=message):
+        engine.parse_expressions(values)
+
+
+@pytest.mark.parametrize('first, second', [
+    ((['fiber>=3'], ['-fiber']), (['Fiber >= 3.0'], [' -FIBER '])),
+    ((['kcal<200,fat<=10'], []), (['calories<200.0', 'fat<=1e1'], ['name'])),
+    ((['fibre==1'], ['-energy/protein']), (['fiber=1'], ['-calories/protein'])),
+])
+def test_equivalent_queries_normalize_to_the_same_string(engine, first, second):
+    first, second = engine.parse(*first), engine.parse(*second)
+    assert str(first) == str(second)
+    assert first == second
+    assert hash(first) == hash(second)
+
+
+@pytest.mark.parametrize('first, second', [
+    ((['fiber>=3'], []), (['fiber>3'], [])),
+    ((['fiber>=3'], ['fiber']), (['fiber>=3'], ['-fiber'])),
+    ((['fiber>=3', 'fat<1'], []), (['fat<1', 'fiber>=3'], [])),
+])
+def test_different_queries_normalize_differently(engine, first, second):
+    assert str(engine.parse(*first)) != str(engine.parse(*second))
+
+
+def test_post_redirect_keeps_repeated_fields(client, catalog):
+    response = client.post('/high_protein', data={'min_protein_ratio': '0.05', 'sort_by': 'name',
+                                                  'where': ['fiber>=1', 'sodium<500'], 'order': '-fiber'})
+    assert response.status_code == 302
+
+    params = parse_qs(urlsplit(response.headers['Location']).query)
+    assert params == {'min_protein_ratio': ['0.05'], 'sort_by': ['name'], 'where': ['fiber>=1', 'sodium<500'],
+                      'order': ['-fiber']}
+    assert client.get(response.headers['Location']).status_code == 200
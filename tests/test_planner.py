@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.data_utils import NUMERIC_COLUMNS, FoodTable
+from app.planner import GRAM_STEP, MACROS, MAX_GRAMS, MIN_GRAMS, SCALE_FLOOR, MealPlanner
+
+TARGETS = [
+    {'calories': 2000, 'protein': 150, 'fat': 70, 'carbs': 250},
+    {'calories': 600, 'protein': 60, 'fat': 10, 'carbs': 40},
+    {'calories': 300, 'protein': 0, 'fat': 0, 'carbs': 80},
+    {'calories': 50, 'protein': 2, 'fat': 1, 'carbs': 5},
+    {'calories': -200, 'protein': 40, 'fat': -5, 'carbs': 0},
+]
+
+
+def table_of(foods):
+    """FoodTable of (name, calories, protein, fat, carbs) per 100 g tuples."""
+    data = {'Id': np.arange(1, len(foods) + 1), 'Name': [food[0] for food in foods]}
+    for column in NUMERIC_COLUMNS:
+        data[column] = np.nan
+    for i, column in enumerate(('Calories', 'Protein', 'Fat', 'Carbs'), start=1):
+        data[column] = [food[i] for food in foods]
+    table = FoodTable.from_frame(pd.DataFrame(data))
+    table.build_indexes()
+    return table
+
+
+def weighted_error(target, left):
+    target = np.array([max(target[name], 0.0) for name in MACROS])
+    weights = 1.0 / np.maximum(target, SCALE_FLOOR) ** 2
+    return float(weights @ (np.array([left[name] for name in MACROS]) ** 2))
+
+
+def single_food_errors(table, target):
+    # The planner's first pick, one food and one portion at a time
+    target = np.array([max(target[name], 0.0) for name in MACROS])
+    weights = 1.0 / np.maximum(target, SCALE_FLOOR) ** 2
+    errors = {}
+    for row in range(len(table)):
+        per_gram = np.array([table.columns[column][row] for column in ('Calories', 'Protein', 'Fat', 'Carbs')])
+        if not per_gram[0] > 0:
+            continue
+        per_gram = np.nan_to_num(per_gram) / 100
+        grams = float(np.sum(weights * per_gram * target) / np.sum(weights * per_gram ** 2))
+        grams = min(max(round(grams / GRAM_STEP) * GRAM_STEP, MIN_GRAMS), MAX_GRAMS)
+        errors[int(table.ids[row])] = (float(weights @ (target - grams * per_gram) ** 2), grams)
+    return errors
+
+
+@pytest.mark.parametrize('target', TARGETS)
+@pytest.mark.parametrize('count', [1, 3, 6])
+def test_suggestions_close_the_gap(food_table, target, count):
+    suggestions, left = food_table.meal_planner.suggest(target, count)
+
+    assert len(suggestions) <= count
+    assert len({item['id'] for item in suggestions}) == len(suggestions)
+    for item in suggestions:
+        assert MIN_GRAMS <= item['grams'] <= MAX_GRAMS
+        assert item['grams'] % GRAM_STEP == 0
+        row = food_table.row_for_id(item['id'])
+        assert item['name'] == food_table.names[row]
+        assert food_table.columns['Calories'][row] > 0
+
+    # Each food is eaten from what is left, and a macro never goes below zero
+    expected = {name: max(target[name], 0.0) for name in MACROS}
+    for item in suggestions:
+        expected = {name: max(expected[name] - item[name], 0.0) for name in MACROS}
+    assert left == pytest.approx(expected, abs=0.05 * (len(suggestions) + 1))
+    if suggestions:
+        assert weighted_error(target, left) < weighted_error(target, {name: max(target[name], 0) for name in MACROS})
+
+
+@pytest.mark.parametrize('target', TARGETS[:4])
+def test_first_pick_has_the_smallest_error(food_table, target):
+    suggestions, _ = food_table.meal_planner.suggest(target, 1)
+    errors = single_food_errors(food_table, target)
+
+    # Foods with the same values tie, any of them may be picked
+    error, grams = errors[suggestions[0]['id']]
+    assert error == pytest.approx(min(error for error, _ in errors.values()))
+    assert suggestions[0]['grams'] == grams
+
+
+def test_a_food_that_fits_exactly_meets_the_target():
+    table = table_of([('Puuro', 250, 25, 5, 25), ('Voi', 720, 0.5, 80, 0.5), ('Sokeri', 400, 0, 0, 100)])
+    suggestions, left = table.meal_planner.suggest({'calories': 500, 'protein': 50, 'fat': 10, 'carbs': 50})
+
+    assert [(item['name'], item['grams']) for item in suggestions] == [('Puuro', 200.0)]
+    assert left == {'calories': 0.0, 'protein': 0.0, 'fat': 0.0, 'carbs': 0.0}
+
+
+def test_two_foods_meet_a_combined_target():
+    table = table_of([('Rahka', 60, 10, 0.2, 4), ('Riisi', 350, 7, 1, 78)])
+    target = {'calories': 60 * 2 + 350 * 1.5, 'protein': 20 + 10.5, 'fat': 0.4 + 1.5, 'carbs': 8 + 117}
+    suggestions, left = table.meal_planner.suggest(target, 3)
+
+    # Greedy picks overshoot a little, but every macro ends within 10 % of its target
+    assert sorted(item['name'] for item in suggestions) == ['Rahka', 'Riisi']
+    assert all(value <= 0.1 * target[name] for name, value in left.items())
+
+
+def test_portions_are_capped():
+    table = table_of([('Sokeri', 400, 0, 0, 100)])
+    suggestions, left = table.meal_planner.suggest({'calories': 4000, 'protein': 0, 'fat': 0, 'carbs': 1000}, 1)
+
+    assert suggestions[0]['grams'] == MAX_GRAMS
+    assert left == {'calories': 4000 - 1600, 'protein': 0, 'fat': 0, 'carbs': 1000 - 400}
+
+
+def test_nothing_is_suggested_without_a_gap(food_table):
+    assert food_table.meal_planner.suggest({name: 0 for name in MACROS}) == ([], {name: 0.0 for name in MACROS})
+    assert food_table.meal_planner.suggest({name: -100 for name in MACROS})[0] == []
+
+
+def test_foods_without_calories_are_never_suggested():
+    table = table_of([('Vesi', 0, 0, 0, 0), ('Suola', np.nan, 0, 0, 0), ('Kananmuna', 140, 12, 10, 0.5)])
+    suggestions, _ = table.meal_planner.suggest({'calories': 2000, 'protein': 150, 'fat': 70, 'carbs': 250}, 3)
+    assert [item['name'] for item in suggestions] == ['Kananmuna']
+
+
+def test_excluded_rows_are_skipped(food_table):
+    target = TARGETS[1]
+    first, _ = food_table.meal_planner.suggest(target, 3)
+    excluded = [food_table.row_for_id(item['id']) for item in first]
+    second, _ = food_table.meal_planner.suggest(target, 3, exclude_rows=excluded)
+
+    assert not {item['id'] for item in first} & {item['id'] for item in second}
+
+
+def test_empty_catalog():
+    planner = MealPlanner(table_of([('Vesi', 0, 0, 0, 0)]))
+    suggestions, left = planner.suggest(TARGETS[0])
+    assert suggestions == []
+    assert left == {name: float(TARGETS[0][name]) for name in MACROS}
+
+
+def test_suggest_api_uses_the_macros_left_today(client, catalog):
+    data = client.get('/api/suggest?count=2').get_json()
+    assert data['remaining'] == {'calories': 2000, 'protein': 150, 'fat': 70, 'carbs': 250}
+    assert 1 <= len(data['suggestions']) <= 2
+    assert weighted_error(data['remaining'], data['remaining_after']) < weighted_error(data['remaining'],
+                                                                                       data['remaining'])
+
+    client.post('/log_food', data={'name': 'Oats', 'calories_per_100g': '2000', 'protein_per_100g': '150',
+                                   'fat_per_100g': '70', 'carbs_per_100g': '250', 'amount': '100'})
+    data = client.get('/api/suggest').get_json()
+    assert data['suggestions'] == []
+
+
+@pytest.mark.parametrize('count, expected', [('0', 1), ('9', 6)])
+def test_suggest_api_clamps_the_count(client, catalog, count, expected):
+    data = client.get(f'/api/suggest?count={count}').get_json()
+    assert len(data['suggestions']) <= expected
+    assert client.get('/api/suggest?count=many').status_code == 400
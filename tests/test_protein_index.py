@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app.catalog import query_cache
+from app.data_utils import get_high_protein_options
+
+THRESHOLDS = (-1.0, 0.0, 0.02, 0.05, 0.1, 0.1000001, 0.2, 0.5, 10.0)
+
+
+def baseline(food_table, min_protein_ratio, sort_by):
+    # The page before the index: filter the DataFrame, then sort the records
+    options = get_high_protein_options(food_table.to_frame(), min_protein_ratio)
+    if sort_by == 'protein_to_calories':
+        return sorted(options, key=lambda x: x['Protein_to_Calories'], reverse=True)
+    return sorted(options, key=lambda x: x['Name'])
+
+
+@pytest.mark.parametrize('min_protein_ratio', THRESHOLDS)
+def test_name_order_matches_baseline(food_table, min_protein_ratio):
+    index = food_table.protein_index
+    rows = index.query(min_protein_ratio, 'name')
+    assert index.records(rows) == baseline(food_table, min_protein_ratio, 'name')
+
+
+@pytest.mark.parametrize('min_protein_ratio', THRESHOLDS)
+def test_ratio_order_matches_baseline(food_table, min_protein_ratio):
+    index = food_table.protein_index
+    rows = index.query(min_protein_ratio, 'protein_to_calories')
+    records = index.records(rows)
+    expected = baseline(food_table, min_protein_ratio, 'protein_to_calories')
+
+    # The baseline sorts on the rounded ratio, the index on the exact one
+    assert [record['Protein_to_Calories'] for record in records] == [x['Protein_to_Calories'] for x in expected]
+    assert sorted(map(repr, records)) == sorted(map(repr, expected))
+    ratios = index.ratio[rows]
+    assert np.all(ratios[:-1] >= ratios[1:])
+
+
+def test_count_at_least_nan_matches_nothing(food_table):
+    assert food_table.protein_index.count_at_least(float('nan')) == 0
+    assert len(food_table.protein_index.query(float('nan'), 'name')) == 0
+
+
+def test_infinite_ratio_is_kept_and_sorts_first(food_table):
+    index = food_table.protein_index
+    infinite = np.flatnonzero(np.isinf(index.ratio))
+    assert len(infinite)
+
+    rows = index.query(10.0)
+    assert set(rows.tolist()) == set(infinite.tolist())
+    assert set(index.query(0.0)[:len(infinite)].tolist()) == set(infinite.tolist())
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', 'abc'])
+def test_non_finite_ratio_is_rejected(client, catalog, value):
+    response = client.get(f'/api/high_protein?min_protein_ratio={value}')
+    assert response.status_code == 400
+    assert query_cache.stats()['size'] == 0
@@ -0,0 +1,22 @@
+from sqlalchemy import select
+
+from app import db
+from app.models import FoodEntry
+from app.query_plans import check_query_plans, explain, full_scans
+
+
+def test_hot_queries_use_an_index(app):
+    with app.app_context(), db.engine.connect() as connection:
+        results = check_query_plans(connection)
+
+    assert results
+    scans = {description: scanned for description, plan, scanned in results if scanned}
+    assert scans == {}
+
+
+def test_full_scan_is_reported(app):
+    # Guards the check above against a plan format it no longer recognizes
+    with app.app_context(), db.engine.connect() as connection:
+        plan = explain(connection, select(FoodEntry.id).where(FoodEntry.name == 'Oats'))
+
+    assert full_scans(plan) == ['food_entry']
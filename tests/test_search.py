@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from app.search import NameSearchIndex
+
+TERMS = ('', 'a', 'K', 'ka', 'kan', 'kana', 'ana, b', 'leipä', 'LEIP', 'ruis', 'o', 'ett', 'savustettu',
+         'proteiinijauhe', ', ', 'ä', 'xyz', 'kanat', 'juusto, m')
+
+
+def scan_contains(names, term):
+    return [row for row, name in enumerate(names) if term.lower() in name.lower()]
+
+
+def scan_prefix(names, prefix):
+    prefix = prefix.lower()
+    if not prefix:
+        return set()
+    return {row for row, name in enumerate(names)
+            if any(word.startswith(prefix) for word in [name.lower()] + re.split(r'[^\w]+', name.lower()) if word)}
+
+
+@pytest.fixture
+def names(food_table):
+    return [str(name) for name in food_table.names]
+
+
+@pytest.mark.parametrize('term', TERMS)
+def test_contains_matches_a_substring_scan(food_table, names, term):
+    assert food_table.search_index.contains(term).tolist() == scan_contains(names, term)
+
+
+@pytest.mark.parametrize('term', TERMS)
+def test_prefix_matches_a_scan(food_table, names, term):
+    rows = food_table.search_index.prefix(term)
+
+    assert len(rows) == len(set(rows))
+    assert set(rows) == scan_prefix(names, term)
+
+    # Full-name matches come first, in alphabetical order
+    full = [row for row in rows if names[row].lower().startswith(term.lower())]
+    assert rows[:len(full)] == full
+    assert [names[row].lower() for row in full] == sorted(names[row].lower() for row in full)
+
+
+@pytest.mark.parametrize('limit', [1, 3, 10, 1000])
+def test_suggest_puts_prefix_matches_before_other_substrings(food_table, names, limit):
+    rows = food_table.search_index.suggest('ka', limit)
+    prefix = food_table.search_index.prefix('ka')
+
+    assert len(rows) == min(limit, len(scan_contains(names, 'ka')))
+    assert rows[:min(limit, len(prefix))] == prefix[:limit]
+    assert set(rows) <= set(scan_contains(names, 'ka'))
+
+
+def test_prefix_limit():
+    index = NameSearchIndex(['Kana', 'Kananmuna', 'Paistettu kana', 'Maito'])
+    assert index.prefix('kana', 2) == [0, 1]
+    assert index.prefix('kana') == [0, 1, 2]
+
+
+@pytest.mark.parametrize('limit, expected', [('0', 1), ('-5', 1), ('3', 3), ('500', 50)])
+def test_autocomplete_limit_is_clamped(client, catalog, limit, expected):
+    response = client.get(f'/foods/autocomplete?q=a&limit={limit}')
+    assert response.status_code == 200
+    assert len(response.get_json()) == expected
+
+
+def test_autocomplete_rejects_a_limit_that_is_not_an_integer(client, catalog):
+    assert client.get('/foods/autocomplete?q=a&limit=ten').status_code == 400
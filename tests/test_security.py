@@ -0,0 +1,158 @@
+import threading
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.models import User
+from app.security import HashingBusy, PasswordHasher, password_hasher
+
+
+def flashed(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.get('_flashes', [])]
+
+
+REGISTRATION = {'username': 'bob', 'email': 'bob@example.com', 'password': 'secret', 'confirm_password': 'secret'}
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_hash_and_verify(workers):
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=workers)
+    password_hash = hasher.hash('secret')
+
+    assert password_hash.startswith('pbkdf2:sha256:1000$')
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.verify(password_hash, 'Secret')
+
+
+@pytest.mark.parametrize('workers', [0, 1])
+def test_busy_pool_times_out(workers):
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=workers, max_pending=1, timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    def occupy():
+        started.set()
+        release.wait(5)
+
+    thread = threading.Thread(target=hasher._run, args=(occupy,))
+    thread.start()
+    try:
+        assert started.wait(5)
+        with pytest.raises(HashingBusy):
+            hasher.hash('secret')
+    finally:
+        release.set()
+        thread.join()
+
+    # The slot is free again once the first hash is done
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+
+def test_slot_is_released_when_hashing_fails():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, max_pending=1, timeout=0.05)
+    with pytest.raises(ValueError):
+        hasher._run(int, 'not a number')
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+
+@pytest.mark.parametrize('method, stored, expected', [
+    ('pbkdf2:sha256:1000', 'pbkdf2:sha256:1000', False),
+    ('pbkdf2:sha256:2000', 'pbkdf2:sha256:1000', True),
+    ('pbkdf2:sha256:1000', 'scrypt', True),
+    ('scrypt', 'scrypt:32768:8:1', False),
+    ('scrypt', 'scrypt:16384:8:1', True),
+    ('scrypt:32768:8:1', 'scrypt', False),
+])
+def test_needs_rehash(method, stored, expected):
+    hasher = PasswordHasher(method, workers=0)
+    assert hasher.needs_rehash(generate_password_hash('secret', stored)) is expected
+
+
+def test_old_hash_is_replaced_at_login(app, user):
+    with app.app_context():
+        row = db.session.get(User, user)
+        row.password_hash = generate_password_hash('password', 'pbkdf2:sha256:500')
+        db.session.commit()
+
+    response = app.test_client().post('/login', data={'email': 'alice@example.com', 'password': 'password'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        password_hash = db.session.get(User, user).password_hash
+        assert password_hash.startswith('pbkdf2:sha256:1000$')
+        assert password_hasher.verify(password_hash, 'password')
+
+
+def test_login_succeeds_when_the_rehash_is_busy(app, user, monkeypatch):
+    with app.app_context():
+        row = db.session.get(User, user)
+        old_hash = row.password_hash = generate_password_hash('password', 'pbkdf2:sha256:500')
+        db.session.commit()
+
+    def busy(password):
+        raise HashingBusy()
+
+    monkeypatch.setattr(password_hasher, 'hash', busy)
+    response = app.test_client().post('/login', data={'email': 'alice@example.com', 'password': 'password'})
+    assert response.status_code == 302
+
+    with app.app_context():
+        assert db.session.get(User, user).password_hash == old_hash
+
+
+def test_current_hash_is_kept_at_login(app, user):
+    with app.app_context():
+        old_hash = db.session.get(User, user).password_hash
+
+    app.test_client().post('/login', data={'email': 'alice@example.com', 'password': 'password'})
+    with app.app_context():
+        assert db.session.get(User, user).password_hash == old_hash
+
+
+def test_busy_login_returns_503(app, user, monkeypatch):
+    def busy(password_hash, password):
+        raise HashingBusy()
+
+    monkeypatch.setattr(password_hasher, 'verify', busy)
+    client = app.test_client()
+    response = client.post('/login', data={'email': 'alice@example.com', 'password': 'password'})
+    assert response.status_code == 503
+    assert flashed(client) == ['The server is busy. Please try again in a moment.']
+
+
+def test_busy_registration_returns_503(app, monkeypatch):
+    def busy(password):
+        raise HashingBusy()
+
+    monkeypatch.setattr(password_hasher, 'hash', busy)
+    response = app.test_client().post('/register', data=REGISTRATION)
+    assert response.status_code == 503
+    with app.app_context():
+        assert User.query.count() == 0
+
+
+def test_registration(app):
+    response = app.test_client().post('/register', data=REGISTRATION)
+    assert response.status_code == 302
+
+    with app.app_context():
+        row = User.query.filter_by(email='bob@example.com').one()
+        assert row.username == 'bob'
+        assert password_hasher.verify(row.password_hash, 'secret')
+
+
+@pytest.mark.parametrize('changes, taken', [
+    ({'email': 'alice@example.com'}, 'That email is taken.'),
+    ({'username': 'alice'}, 'That username is taken.'),
+    ({'username': 'alice', 'email': 'alice@example.com'}, 'That username is taken.'),
+])
+def test_duplicate_registration_is_refused(app, user, changes, taken):
+    client = app.test_client()
+    response = client.post('/register', data=dict(REGISTRATION, **changes))
+
+    assert response.status_code == 200
+    assert flashed(client) == ['A user with this username or email already exists. Please choose another.']
+    assert taken.encode() in response.data
+    with app.app_context():
+        assert User.query.count() == 1
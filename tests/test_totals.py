@@ -0,0 +1,157 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from app import totals
+from app.models import DailyTotals, FoodEntry, User
+from app.totals import apply_daily_deltas, recompute_daily_totals
+
+DAY = date(2026, 3, 2)
+
+
+def daily_totals():
+    # Days whose entries were all removed keep a row of zeros until the next recompute
+    return sorted(
+        (row.user_id, row.date, round(row.calories, 6), round(row.protein, 6), round(row.fat, 6),
+         round(row.carbs, 6), row.entry_count)
+        for row in DailyTotals.query.filter(DailyTotals.entry_count != 0)
+    )
+
+
+def assert_matches_recompute():
+    maintained = daily_totals()
+    recompute_daily_totals(db.session)
+    db.session.commit()
+    assert maintained == daily_totals()
+
+
+def entry(user_id, day=DAY, calories=100.0, protein=10.0, fat=5.0, carbs=12.5):
+    return FoodEntry(user_id=user_id, date=day, name='Food', calories=calories, protein=protein, fat=fat, carbs=carbs)
+
+
+@pytest.fixture(params=['upsert', 'fallback'])
+def users(app, request, monkeypatch):
+    """Two user ids, with the totals written by the dialect's upsert or by the generic fallback."""
+    monkeypatch.setattr(totals, '_upserts', {'sqlite': None} if request.param == 'fallback' else {})
+    with app.app_context():
+        rows = [User(username=name, email=f'{name}@example.com', password_hash='x') for name in ('a', 'b')]
+        db.session.add_all(rows)
+        db.session.commit()
+        yield [row.id for row in rows]
+
+
+def test_inserts(users):
+    first, second = users
+    db.session.add_all([entry(first), entry(first, calories=250), entry(second), entry(first, DAY + timedelta(1))])
+    db.session.commit()
+    db.session.add(entry(first, protein=3))
+    db.session.commit()
+
+    assert_matches_recompute()
+    assert db.session.get(DailyTotals, (first, DAY)).entry_count == 3
+
+
+def test_updates(users):
+    first, _ = users
+    entries = [entry(first), entry(first), entry(first, DAY + timedelta(1))]
+    db.session.add_all(entries)
+    db.session.commit()
+
+    entries[0].calories = 400
+    entries[1].date = DAY - timedelta(1)
+    entries[2].protein = 0
+    db.session.commit()
+
+    assert_matches_recompute()
+    assert db.session.get(DailyTotals, (first, DAY - timedelta(1))).entry_count == 1
+
+
+def test_update_of_an_expired_entry(users):
+    first, _ = users
+    db.session.add(entry(first))
+    db.session.commit()
+
+    # Loaded again from the database, so the hook has to fetch the old values
+    db.session.expire_all()
+    db.session.get(FoodEntry, 1).fat = 50
+    db.session.commit()
+
+    assert_matches_recompute()
+
+
+def test_deletes(users):
+    first, second = users
+    entries = [entry(first), entry(first, calories=30), entry(second)]
+    db.session.add_all(entries)
+    db.session.commit()
+
+    db.session.delete(entries[0])
+    db.session.delete(entries[2])
+    db.session.commit()
+
+    assert db.session.get(DailyTotals, (second, DAY)).entry_count == 0
+    assert_matches_recompute()
+
+
+def test_user_reassignment(users):
+    first, second = users
+    entries = [entry(first), entry(first, calories=70)]
+    db.session.add_all(entries)
+    db.session.commit()
+
+    entries[1].user_id = second
+    db.session.commit()
+
+    assert_matches_recompute()
+    assert db.session.get(DailyTotals, (second, DAY)).calories == 70
+
+
+def test_entries_without_a_date_are_not_counted(users):
+    first, _ = users
+    db.session.add_all([entry(first, day=None), entry(first)])
+    db.session.commit()
+
+    assert_matches_recompute()
+
+
+def test_deltas_add_up_on_new_and_existing_days(users):
+    first, second = users
+    deltas = {(first, DAY): [1.0, 2.0, 3.0, 4.0, 1], (second, DAY): [5.0, 0.0, 0.0, 0.0, 1]}
+    apply_daily_deltas(db.session.connection(), deltas)
+    apply_daily_deltas(db.session.connection(), deltas)
+    apply_daily_deltas(db.session.connection(), {(first, DAY): [0, 0, 0, 0, 0]})
+    db.session.commit()
+
+    assert daily_totals() == [(first, DAY, 2.0, 4.0, 6.0, 8.0, 2), (second, DAY, 10.0, 0.0, 0.0, 0.0, 2)]
+
+
+def test_recompute_only_one_user(users):
+    first, second = users
+    db.session.add_all([entry(first), entry(second)])
+    db.session.commit()
+    db.session.execute(DailyTotals.__table__.delete())
+    db.session.commit()
+
+    assert recompute_daily_totals(db.session, first) == 1
+    db.session.commit()
+    assert [row[0] for row in daily_totals()] == [first]
+
+
+@pytest.mark.parametrize('name, dialect, clause', [
+    ('sqlite', sqlite.dialect(), 'ON CONFLICT (user_id, date) DO UPDATE'),
+    ('postgresql', postgresql.dialect(), 'ON CONFLICT (user_id, date) DO UPDATE'),
+    ('mysql', mysql.dialect(), 'ON DUPLICATE KEY UPDATE'),
+])
+def test_upsert_statement_per_dialect(monkeypatch, name, dialect, clause):
+    monkeypatch.setattr(totals, '_upserts', {})
+    statement = totals._upsert_totals(name)
+    sql = str(statement.compile(dialect=dialect))
+    assert clause in sql
+    assert 'calories = (daily_totals.calories + ' in sql
+
+
+def test_no_upsert_for_other_dialects(monkeypatch):
+    monkeypatch.setattr(totals, '_upserts', {})
+    assert totals._upsert_totals('oracle') is None
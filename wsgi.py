@@ -0,0 +1,8 @@
+from app import create_app
+from app.warmup import warm_up
+
+# Production entry point, e.g. "gunicorn -c gunicorn.conf.py wsgi:app". With
+# preload_app the app is built and warmed up once in the master process, and the
+# workers share its catalog pages copy-on-write.
+app = create_app()
+warm_up(app)